@@ -0,0 +1,322 @@
+# 2_data_collection/firestore_bulk.py
+
+import collections
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from google.api_core import exceptions as google_exceptions
+
+# Helpers for loading large volumes of data into Firestore from the scripts in
+# this folder. JSON files are parsed one item at a time (never loaded whole),
+# and writes are committed in batches of up to 500 (Firestore's per-batch
+# limit) from a pool of worker threads, with retries and backoff on transient
+# errors and periodic progress lines instead of one print per document.
+# delete_collection() clears a collection the same way, paging through
+# document names only, and can resume after an interruption.
+
+MAX_BATCH_WRITES = 500 # Firestore's limit on writes per batch commit
+
+# Errors worth retrying: contention, timeouts, throttling and brief outages
+RETRYABLE_ERRORS = (
+    google_exceptions.Aborted,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.GatewayTimeout,
+    google_exceptions.InternalServerError,
+    google_exceptions.ResourceExhausted,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.TooManyRequests,
+    ConnectionError,
+)
+
+
+def iter_json_items(path, read_size=64 * 1024):
+    """
+    Yield the items of a JSON file one at a time, reading it in blocks of
+    read_size characters. A top-level array yields its elements; otherwise
+    every top-level value is yielded in turn (so NDJSON files work too).
+    Raises json.JSONDecodeError on malformed input, after the items before it.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as f:
+        buffer, pos, eof = "", 0, False
+        in_array = None
+
+        def read_more():
+            nonlocal buffer, pos, eof
+            block = f.read(read_size)
+            eof = not block
+            buffer, pos = buffer[pos:] + block, 0
+
+        while True:
+            # Skip whitespace (and the commas between array elements)
+            separators = " \t\r\n," if in_array else " \t\r\n"
+            while True:
+                while pos < len(buffer) and buffer[pos] in separators:
+                    pos += 1
+                if pos < len(buffer) or eof:
+                    break
+                read_more()
+            if pos >= len(buffer):
+                return
+            if in_array is None:
+                in_array = buffer[pos] == '['
+                if in_array:
+                    pos += 1
+                continue
+            if in_array and buffer[pos] == ']':
+                return
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                read_more() # The item continues past the end of the buffer
+                continue
+            if end == len(buffer) and not eof:
+                read_more() # A number or literal may have been cut off; decode it again
+                continue
+            yield item
+            pos = end
+
+
+class ChunkedWriter:
+    """
+    Commits queued writes in batches of up to chunk_size from `workers` threads.
+
+    set() and delete() queue a write; each full chunk is handed to the pool, and
+    at most 2 * workers chunks are in flight at once so memory stays bounded
+    however much is queued. A commit that fails with a transient error is
+    retried up to max_retries times with exponential backoff (batch commits are
+    atomic and these writes are idempotent, so a retry is safe); other failures
+    count the chunk as failed. Progress is printed every report_every seconds.
+    close() commits the remainder and waits for everything to finish.
+    """
+
+    def __init__(self, db, chunk_size=MAX_BATCH_WRITES, workers=8, max_retries=5, backoff=0.5,
+                 label="documents", report_every=5.0):
+        self.db = db
+        self.chunk_size = max(1, min(int(chunk_size), MAX_BATCH_WRITES))
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.label = label
+        self.report_every = report_every
+        self.written = 0
+        self.failed = 0
+        self.retries = 0
+        self.errors = [] # The first few commit errors, for the summary
+        self._chunk = []
+        self._submitted = 0 # Chunks handed to the pool so far, numbered in order
+        self._committed = set() # Numbers of chunks committed out of order
+        self._committed_through = 0 # Every chunk numbered below this has committed
+        self._on_commit = collections.deque() # (chunk count, callback) in queueing order
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bulk-writer")
+        self._slots = threading.BoundedSemaphore(2 * workers)
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._last_report = self._started
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def set(self, doc_ref, data, merge=False):
+        self._queue(("set", doc_ref, data, merge))
+
+    def delete(self, doc_ref):
+        self._queue(("delete", doc_ref, None, False))
+
+    def _queue(self, write):
+        self._chunk.append(write)
+        if len(self._chunk) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """Hand the queued writes to the pool (blocks while too many chunks are in flight)."""
+        chunk, self._chunk = self._chunk, []
+        if chunk:
+            self._slots.acquire()
+            future = self._pool.submit(self._commit, chunk, self._submitted)
+            self._submitted += 1
+            future.add_done_callback(lambda _: self._slots.release())
+
+    def after_commit(self, callback):
+        """
+        Call callback() once every write queued so far has committed. Callbacks
+        run in queueing order on the worker that completes their last commit, and
+        never past a chunk that failed.
+        """
+        needed = self._submitted + (1 if self._chunk else 0)
+        with self._lock:
+            if needed > self._committed_through:
+                self._on_commit.append((needed, callback))
+                return
+        callback()
+
+    def close(self):
+        """Commit everything queued, wait for it and print a summary."""
+        self.flush()
+        self._pool.shutdown(wait=True)
+        self.report(final=True)
+        return self
+
+    @property
+    def rate(self):
+        """Writes committed per second so far."""
+        return self.written / max(time.monotonic() - self._started, 1e-9)
+
+    def report(self, final=False):
+        prefix = "Done" if final else "Progress"
+        retried = f", {self.retries} retried commits" if self.retries else ""
+        print(f"  {prefix}: {self.written} {self.label} committed, {self.failed} failed{retried} ({self.rate:.0f}/s)")
+        for error in (self.errors if final else []):
+            print(f"    Commit error: {error}")
+
+    def _commit(self, chunk, number):
+        for attempt in range(self.max_retries + 1):
+            try:
+                batch = self.db.batch()
+                for op, doc_ref, data, merge in chunk:
+                    if op == "set":
+                        batch.set(doc_ref, data, merge=merge)
+                    else:
+                        batch.delete(doc_ref)
+                batch.commit()
+                break
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    self._record_failure(chunk, e)
+                    return
+                with self._lock:
+                    self.retries += 1
+                # Exponential backoff with jitter so the workers do not retry in lockstep
+                time.sleep(self.backoff * 2 ** attempt * random.uniform(0.5, 1.0))
+            except Exception as e:
+                self._record_failure(chunk, e)
+                return
+        with self._lock:
+            self.written += len(chunk)
+            self._committed.add(number)
+            while self._committed_through in self._committed:
+                self._committed.remove(self._committed_through)
+                self._committed_through += 1
+            # Still under the lock, so progress callbacks never run out of order
+            while self._on_commit and self._on_commit[0][0] <= self._committed_through:
+                self._on_commit.popleft()[1]()
+            due = time.monotonic() - self._last_report >= self.report_every
+            if due:
+                self._last_report = time.monotonic()
+        if due:
+            self.report()
+
+    def _record_failure(self, chunk, error):
+        with self._lock:
+            self.failed += len(chunk)
+            if len(self.errors) < 5:
+                self.errors.append(str(error))
+
+
+class Checkpoint:
+    """Small JSON file of {key: value} progress markers (a no-op when path is None)."""
+
+    def __init__(self, path):
+        self.path = path
+        self._values = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self._values = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Warning: Ignoring unreadable checkpoint {path}: {e}")
+
+    def get(self, key):
+        return self._values.get(key)
+
+    def set(self, key, value):
+        if value is None:
+            self._values.pop(key, None)
+        else:
+            self._values[key] = value
+        if not self.path:
+            return
+        if not self._values: # Nothing left to resume
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            return
+        # Write a temporary file and rename it so an interruption never leaves a torn checkpoint
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._values, f)
+        os.replace(tmp_path, self.path)
+
+
+def collection_path(coll_ref):
+    """Full path of a collection, e.g. 'requests' or 'users/abc/notes'."""
+    parent = coll_ref.parent
+    return f"{parent.path}/{coll_ref.id}" if parent is not None else coll_ref.id
+
+
+def _delete_pages(coll_ref, writer, page_size, recursive, cursor=None, on_page=None):
+    """
+    Queue a delete for every document of coll_ref after document id `cursor`.
+    Pages are read in document-name order with an empty field mask, so no
+    document bodies are fetched. on_page(last id) is called after each page.
+    """
+    while True:
+        query = coll_ref.select([]).order_by("__name__").limit(page_size)
+        if cursor is not None:
+            query = query.start_after({"__name__": cursor})
+        docs = list(query.stream())
+        if not docs:
+            return
+        for doc in docs:
+            if recursive:
+                for subcollection in doc.reference.collections():
+                    _delete_pages(subcollection, writer, page_size, recursive)
+            writer.delete(doc.reference)
+        cursor = docs[-1].id
+        if on_page:
+            on_page(cursor)
+
+
+def delete_collection(db, coll_ref, page_size=1000, workers=8, max_retries=5, recursive=False,
+                      checkpoint_path=None, report_every=5.0):
+    """
+    Delete every document of a collection in parallel batch commits.
+    recursive: also delete the subcollections of each document (one extra
+        listing call per document, so only ask for it when they exist).
+    checkpoint_path: file recording, per collection, the last page whose deletes
+        (and those of every earlier page) have committed. A run
+        that was interrupted continues after it, then sweeps the collection once
+        from the start for anything whose delete had not landed.
+    Returns the number of documents deleted.
+    """
+    checkpoint = Checkpoint(checkpoint_path)
+    key = collection_path(coll_ref)
+    resumed_from = checkpoint.get(key)
+    if resumed_from is not None:
+        print(f"Resuming delete of {key} after document '{resumed_from}'.")
+
+    def run(cursor, checkpointed):
+        with ChunkedWriter(db, workers=workers, max_retries=max_retries, label=f"deletes in {key}",
+                           report_every=report_every) as writer:
+            on_page = None
+            if checkpointed:
+                # The page is only recorded once its deletes have committed, not when they are queued
+                on_page = lambda last_id: writer.after_commit(lambda: checkpoint.set(key, last_id))
+            _delete_pages(coll_ref, writer, page_size, recursive, cursor, on_page)
+        return writer
+
+    writer = run(resumed_from, True)
+    deleted, failed = writer.written, writer.failed
+    if resumed_from is not None or failed:
+        sweep = run(None, False)
+        deleted, failed = deleted + sweep.written, sweep.failed
+    if not failed:
+        checkpoint.set(key, None)
+    return deleted
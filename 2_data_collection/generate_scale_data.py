@@ -0,0 +1,256 @@
+# 2_data_collection/generate_scale_data.py
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import sys
+
+import numpy as np
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+backend_dir = os.path.abspath(os.path.join(script_dir, '../code_1/backend'))
+sys.path.insert(0, backend_dir)
+from matching_ai import KNOWN_SKILLS
+from storage import SQLiteStorage
+
+# Synthetic volunteers and requests at realistic scale, for measuring matching
+# and the list endpoints. Everything is drawn from one seed, so a given seed
+# and set of parameters always produces the same data:
+#   - Disaster sites are placed at random in a region; volunteers and requests
+#     cluster around them (requests tightly, volunteers more loosely, plus a
+#     share of volunteers spread over the whole region).
+#   - Skills follow a Zipf-like distribution over KNOWN_SKILLS, so a few skills
+#     are common and the rest are rare.
+#   - A configurable share of volunteers is available.
+#   - Timestamps span the incident: volunteers sign up throughout, requests
+#     surge early and tail off.
+# Output is NDJSON (one document per line, the shape stored in Firestore, and
+# accepted by iter_json_items; requests.ndjson can also be posted to
+# /requests/bulk, which keeps each request's coordinates, but there is no bulk
+# endpoint for volunteers), a columnar .npz for
+# benchmarks (see load_columns) and/or a SQLite store the API can serve directly
+# (STORAGE_BACKEND=sqlite, see storage.py).
+
+DEFAULT_REGION = (29.0, 34.0, -100.0, -94.0) # (min lat, max lat, min lon, max lon): North/Central Texas
+KM_PER_DEGREE = 111.32
+DEFAULT_START = datetime.datetime(2025, 4, 5, tzinfo=datetime.timezone.utc)
+
+
+def _rngs(seed):
+    """Independent generators for sites, volunteers and requests (so changing one count leaves the rest alone)."""
+    return [np.random.default_rng(child) for child in np.random.SeedSequence(seed).spawn(3)]
+
+def skill_weights(skew, n_skills=len(KNOWN_SKILLS)):
+    """Zipf-like probabilities over KNOWN_SKILLS, in list order: p(rank r) ~ 1 / r**skew."""
+    weights = 1.0 / np.arange(1, n_skills + 1) ** skew
+    return weights / weights.sum()
+
+def make_sites(rng, n_sites, region=DEFAULT_REGION):
+    """Disaster sites: centres, relative sizes (weights) and spreads in km."""
+    min_lat, max_lat, min_lon, max_lon = region
+    return {
+        'latitude': rng.uniform(min_lat, max_lat, n_sites),
+        'longitude': rng.uniform(min_lon, max_lon, n_sites),
+        'weight': rng.dirichlet(np.full(n_sites, 0.8)), # A few large sites, several small ones
+        'spread_km': rng.lognormal(np.log(10.0), 0.5, n_sites),
+    }
+
+def _clustered_points(rng, n, sites, spread_scale=1.0):
+    """n points, each normally scattered around a site chosen by site weight."""
+    site = rng.choice(len(sites['weight']), size=n, p=sites['weight'])
+    spread = sites['spread_km'][site] * spread_scale
+    lat = sites['latitude'][site] + rng.normal(0.0, 1.0, n) * spread / KM_PER_DEGREE
+    lon_km_per_degree = KM_PER_DEGREE * np.cos(np.radians(lat))
+    lon = sites['longitude'][site] + rng.normal(0.0, 1.0, n) * spread / lon_km_per_degree
+    return lat, lon
+
+def _skill_sets(rng, n, weights, mean_extra):
+    """One list of distinct skill names per row: 1 + Poisson(mean_extra) skills drawn by weight."""
+    counts = np.minimum(1 + rng.poisson(mean_extra, n), len(weights))
+    # Weighted sampling without replacement: order skills by Exponential(1) / weight keys
+    keys = rng.exponential(1.0, (n, len(weights))) / weights
+    order = np.argsort(keys, axis=1)
+    return [[KNOWN_SKILLS[j] for j in order[i, :counts[i]]] for i in range(n)]
+
+def generate_volunteers(n, sites, rng, availability_ratio=0.6, skill_skew=1.2, background_share=0.1,
+                        region=DEFAULT_REGION, start=DEFAULT_START, duration_hours=72.0):
+    """Columns for n volunteers: id, name, latitude, longitude, skills, availability, created_at (epoch s)."""
+    lat, lon = _clustered_points(rng, n, sites, spread_scale=3.0)
+    background = rng.random(n) < background_share # Volunteers who live away from every site
+    min_lat, max_lat, min_lon, max_lon = region
+    lat[background] = rng.uniform(min_lat, max_lat, background.sum())
+    lon[background] = rng.uniform(min_lon, max_lon, background.sum())
+    created_at = start.timestamp() + rng.uniform(0.0, duration_hours * 3600, n)
+    return {
+        'id': np.array([f"vol-{i:07d}" for i in range(n)]),
+        'name': np.array([f"Volunteer {i}" for i in range(n)]),
+        'latitude': lat,
+        'longitude': lon,
+        'skills': _skill_sets(rng, n, skill_weights(skill_skew), mean_extra=0.8),
+        'availability': rng.random(n) < availability_ratio,
+        'created_at': created_at.astype(np.int64),
+    }
+
+def generate_requests(m, sites, rng, skill_skew=1.2, start=DEFAULT_START, duration_hours=72.0):
+    """Columns for m requests: id, name, type, description, latitude, longitude, required_skills, created_at."""
+    lat, lon = _clustered_points(rng, m, sites)
+    weights = skill_weights(skill_skew)
+    types = rng.choice(len(KNOWN_SKILLS), size=m, p=weights)
+    # Most requests need only their type; some name an extra skill
+    extra = [[KNOWN_SKILLS[j]] if want else [] for j, want in
+             zip(rng.choice(len(KNOWN_SKILLS), size=m, p=weights), rng.random(m) < 0.3)]
+    # Requests surge right after the incident starts and tail off (exponential, cut at its end)
+    offsets = np.minimum(rng.exponential(duration_hours * 3600 / 4, m), duration_hours * 3600)
+    return {
+        'id': np.array([f"req-{i:07d}" for i in range(m)]),
+        'name': np.array([f"Request {i}" for i in range(m)]),
+        'type': np.array([KNOWN_SKILLS[j] for j in types]),
+        'description': np.array([f"Synthetic {KNOWN_SKILLS[j].lower()} request" for j in types]),
+        'latitude': lat,
+        'longitude': lon,
+        'required_skills': extra,
+        'created_at': (start.timestamp() + offsets).astype(np.int64),
+    }
+
+def generate(n_volunteers, n_requests, seed=0, n_sites=8, availability_ratio=0.6, skill_skew=1.2,
+             region=DEFAULT_REGION, start=DEFAULT_START, duration_hours=72.0):
+    """(volunteer columns, request columns), deterministic for a given seed and parameters."""
+    site_rng, volunteer_rng, request_rng = _rngs(seed)
+    sites = make_sites(site_rng, n_sites, region)
+    volunteers = generate_volunteers(n_volunteers, sites, volunteer_rng, availability_ratio, skill_skew,
+                                     region=region, start=start, duration_hours=duration_hours)
+    requests = generate_requests(n_requests, sites, request_rng, skill_skew, start=start,
+                                 duration_hours=duration_hours)
+    return volunteers, requests
+
+# --- Output ---
+def _iso(epoch_seconds):
+    return datetime.datetime.fromtimestamp(int(epoch_seconds), tz=datetime.timezone.utc).isoformat()
+
+def volunteer_records(columns):
+    """Volunteer documents in the Firestore shape (location map, boolean availability)."""
+    for i in range(len(columns['id'])):
+        yield {
+            'id': str(columns['id'][i]),
+            'name': str(columns['name'][i]),
+            'skills': columns['skills'][i],
+            'availability': bool(columns['availability'][i]),
+            'location': {'latitude': float(columns['latitude'][i]), 'longitude': float(columns['longitude'][i])},
+            'createdAt': _iso(columns['created_at'][i]),
+        }
+
+def request_records(columns):
+    """Request documents in the Firestore shape (as written by populate_database.py)."""
+    for i in range(len(columns['id'])):
+        yield {
+            'id': str(columns['id'][i]),
+            'name': str(columns['name'][i]),
+            'type': str(columns['type'][i]),
+            'description': str(columns['description'][i]),
+            'required_skills': columns['required_skills'][i],
+            'latitude': float(columns['latitude'][i]),
+            'longitude': float(columns['longitude'][i]),
+            'createdAt': _iso(columns['created_at'][i]),
+        }
+
+def write_ndjson(path, records):
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+            count += 1
+    return count
+
+def write_storage(storage, volunteers, requests, version, chunk_size=500):
+    """
+    Write volunteer and request documents (createdAt as a timestamp, as in
+    Firestore) into a Storage, plus the meta/volunteers version marker.
+    """
+    def writes():
+        for collection, records in [('volunteers', volunteer_records(volunteers)),
+                                    ('requests', request_records(requests))]:
+            for record in records:
+                record['createdAt'] = datetime.datetime.fromisoformat(record['createdAt'])
+                yield ('set', storage.document(collection, record['id']), record)
+        yield ('set', storage.document('meta', 'volunteers'), {'version': version})
+
+    async def run():
+        chunk = []
+        for write in writes():
+            chunk.append(write)
+            if len(chunk) >= chunk_size:
+                await storage.commit(chunk)
+                chunk = []
+        if chunk:
+            await storage.commit(chunk)
+
+    asyncio.run(run())
+
+def _ragged(lists):
+    """Encode a list of skill-name lists as (codes, offsets) over KNOWN_SKILLS."""
+    lengths = np.fromiter((len(names) for names in lists), dtype=np.int64, count=len(lists))
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    codes = np.fromiter((KNOWN_SKILLS.index(name) for names in lists for name in names), dtype=np.int16,
+                        count=int(offsets[-1]))
+    return codes, offsets
+
+def _unragged(codes, offsets, names):
+    return [[str(names[c]) for c in codes[offsets[i]:offsets[i + 1]]] for i in range(len(offsets) - 1)]
+
+def write_npz(path, columns, skills_key):
+    """Columnar file: every column as an array, with the skill lists stored as codes + offsets."""
+    arrays = {key: value for key, value in columns.items() if key != skills_key}
+    arrays[f'{skills_key}_codes'], arrays[f'{skills_key}_offsets'] = _ragged(columns[skills_key])
+    arrays['skill_names'] = np.array(KNOWN_SKILLS)
+    np.savez(path, **arrays)
+
+def load_columns(path):
+    """
+    Read a file written by write_npz back into columns, in the dict form that
+    extract_features_volunteers / extract_features_requests accept.
+    """
+    with np.load(path) as data:
+        columns = {key: data[key] for key in data.files if key != 'skill_names'}
+        names = data['skill_names']
+    for key in [key[:-len('_codes')] for key in list(columns) if key.endswith('_codes')]:
+        columns[key] = _unragged(columns.pop(f'{key}_codes'), columns.pop(f'{key}_offsets'), names)
+    return columns
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic volunteers and requests at scale.")
+    parser.add_argument('--volunteers', type=int, default=10000)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--sites', type=int, default=8, help="Number of disaster sites to cluster around")
+    parser.add_argument('--availability', type=float, default=0.6, help="Share of volunteers who are available")
+    parser.add_argument('--skill-skew', type=float, default=1.2, help="Zipf exponent of the skill frequencies")
+    parser.add_argument('--hours', type=float, default=72.0, help="Length of the incident")
+    parser.add_argument('--format', choices=['ndjson', 'npz', 'both', 'sqlite'], default='both',
+                        help="'sqlite' writes local_store.sqlite3 for STORAGE_BACKEND=sqlite")
+    parser.add_argument('--out-dir', default=os.path.join(script_dir, 'scale_data'))
+    args = parser.parse_args(argv)
+
+    volunteers, requests = generate(args.volunteers, args.requests, seed=args.seed, n_sites=args.sites,
+                                    availability_ratio=args.availability, skill_skew=args.skill_skew,
+                                    duration_hours=args.hours)
+    os.makedirs(args.out_dir, exist_ok=True)
+    if args.format in ('ndjson', 'both'):
+        for name, records in [('volunteers', volunteer_records(volunteers)), ('requests', request_records(requests))]:
+            path = os.path.join(args.out_dir, f'{name}.ndjson')
+            print(f"Wrote {write_ndjson(path, records)} {name} to {path}")
+    if args.format in ('npz', 'both'):
+        for name, columns, skills_key in [('volunteers', volunteers, 'skills'), ('requests', requests, 'required_skills')]:
+            path = os.path.join(args.out_dir, f'{name}.npz')
+            write_npz(path, columns, skills_key)
+            print(f"Wrote {len(columns['id'])} {name} to {path}")
+    if args.format == 'sqlite':
+        path = os.path.join(args.out_dir, 'local_store.sqlite3')
+        storage = SQLiteStorage(path)
+        write_storage(storage, volunteers, requests, version=f"synthetic:{args.seed}:{args.volunteers}")
+        storage.close()
+        print(f"Wrote {args.volunteers} volunteers and {args.requests} requests to {path}")
+
+if __name__ == "__main__":
+    main()
@@ -12,8 +12,18 @@ from google.cloud import firestore
 # IMPORT Python's datetime
 from datetime import datetime, timezone # Import timezone as well
 
+from firestore_bulk import ChunkedWriter, delete_collection, iter_json_items
+
 # --- Configuration ---
 CLEAR_COLLECTIONS_BEFORE_POPULATING = True # Set to False to append data instead of replacing
+LOAD_CHUNK_SIZE = int(os.getenv("LOAD_CHUNK_SIZE", "500")) # Writes per batch commit (at most 500)
+LOAD_WORKERS = int(os.getenv("LOAD_WORKERS", "8")) # Batch commits in flight at once
+LOAD_MAX_RETRIES = int(os.getenv("LOAD_MAX_RETRIES", "5")) # Retries of a commit that failed transiently
+CLEAR_PAGE_SIZE = int(os.getenv("CLEAR_PAGE_SIZE", "1000")) # Document names read per page when clearing
+CLEAR_SUBCOLLECTIONS = os.getenv("CLEAR_SUBCOLLECTIONS", "0") == "1" # Also delete documents' subcollections
+# Lets an interrupted clear pick up where it stopped (removed once a clear completes)
+CLEAR_CHECKPOINT_PATH = os.getenv("CLEAR_CHECKPOINT_PATH",
+                                  os.path.join(os.path.dirname(os.path.abspath(__file__)), ".clear_checkpoint.json"))
 
 # --- Firebase Admin SDK Setup (for credentials only) ---
 try:
@@ -64,39 +74,120 @@ except Exception as e:
 
 # --- Helper Functions ---
 def clear_collection(coll_ref):
-    """Deletes all documents in a given collection."""
-    docs = coll_ref.stream()
-    deleted_count = 0
-    for doc in docs:
-        doc.reference.delete()
-        deleted_count += 1
+    """Deletes all documents in a given collection (in parallel batches; see firestore_bulk.py)."""
+    deleted_count = delete_collection(db, coll_ref, page_size=CLEAR_PAGE_SIZE, workers=LOAD_WORKERS,
+                                      max_retries=LOAD_MAX_RETRIES, recursive=CLEAR_SUBCOLLECTIONS,
+                                      checkpoint_path=CLEAR_CHECKPOINT_PATH)
     print(f"Deleted {deleted_count} documents from {coll_ref.id}.")
 
-def load_json_data(filename):
-    """Loads data from a JSON file located in code_1/assets/json_files/."""
+def json_file_path(filename):
+    """Path of a JSON file in code_1/assets/json_files/."""
     script_dir = os.path.dirname(os.path.abspath(__file__))
     # Correct path relative to this script to find code_1/assets/json_files
     project_root = os.path.abspath(os.path.join(script_dir, '..'))
-    json_dir = os.path.join(project_root, 'code_1', 'assets', 'json_files')
-    filepath = os.path.join(json_dir, filename)
+    return os.path.join(project_root, 'code_1', 'assets', 'json_files', filename)
+
+def iter_json_data(filename):
+    """Yields the items of a JSON file in code_1/assets/json_files/ one at a time (stream-parsed)."""
+    filepath = json_file_path(filename)
     try:
-        with open(filepath, 'r', encoding='utf-8') as f: # Specify encoding
-            data = json.load(f)
-            if isinstance(data, list):
-                print(f"Successfully loaded {len(data)} items from {filename}.")
-                return data
-            else:
-                print(f"Warning: Expected a list in {filename}, but found {type(data)}. Returning empty list.")
-                return []
+        yield from iter_json_items(filepath)
     except FileNotFoundError:
-        print(f"Warning: JSON file not found at {filepath}. Returning empty list.")
-        return []
+        print(f"Warning: JSON file not found at {filepath}. Skipping it.")
     except json.JSONDecodeError as e:
-        print(f"Error reading or parsing {filepath}: {e}. Returning empty list.")
-        return []
+        print(f"Error reading or parsing {filepath}: {e}. Skipping the rest of the file.")
     except Exception as e:
-        print(f"An unexpected error occurred loading {filepath}: {e}. Returning empty list.")
-        return []
+        print(f"An unexpected error occurred loading {filepath}: {e}. Skipping the rest of the file.")
+
+def load_json_file(writer, filename, coll_ref, to_doc):
+    """
+    Queues one document per valid item of a JSON file on `writer`.
+    to_doc(item) returns (document id or None, data), or None for an invalid item.
+    Returns (valid, invalid) counts.
+    """
+    valid = invalid = 0
+    for i, item in enumerate(iter_json_data(filename)):
+        doc = to_doc(item) if isinstance(item, dict) else None
+        if doc is None:
+            invalid += 1
+            if invalid <= 3: # Show a few examples, not every bad item
+                print(f"    -> INVALID: Skipping item {i} due to missing fields: {item}")
+            continue
+        doc_id, doc_data = doc
+        writer.set(coll_ref.document(doc_id) if doc_id else coll_ref.document(), doc_data)
+        valid += 1
+    print(f"--- {filename}: {valid} valid items queued, {invalid} skipped ---")
+    return valid, invalid
+
+# --- JSON Item Mappings ---
+# Each returns (document id or None for an auto-id, document data), or None if the item is invalid.
+def resource_doc(item):
+    doc_data = {
+        "name": item.get("name"),
+        "location": item.get("location"),
+        "quantity": item.get("quantity"),
+        "timestamp": datetime.now(timezone.utc) # Use datetime
+    }
+    if doc_data["name"] and doc_data["location"] and doc_data["quantity"] is not None:
+        return None, doc_data
+    return None
+
+def request_doc(item):
+    doc_data = {
+        "name": item.get("name"),
+        "type": item.get("type"),
+        "description": item.get("description"),
+        "latitude": item.get("latitude"),
+        "longitude": item.get("longitude"),
+        "timestamp": datetime.now(timezone.utc) # Use datetime
+    }
+    if (doc_data["name"] and doc_data["type"] and doc_data["description"] and
+        doc_data["latitude"] is not None and doc_data["longitude"] is not None):
+        return None, doc_data
+    return None
+
+def donation_doc(item):
+    doc_data = {
+         "name": item.get("name"),
+         "type": item.get("type"),
+         "detail": item.get("detail"),
+         "timestamp": datetime.now(timezone.utc) # Use datetime
+     }
+    if doc_data["name"] and doc_data["type"] and doc_data["detail"]:
+        return None, doc_data
+    return None
+
+def alert_doc(item):
+    doc_id = item.get('id') # Use 'id' from JSON if available (though not present in your example)
+    # --- FIX FIELD MAPPING HERE ---
+    doc_data = {
+        # Map 'alertDescription' from JSON to 'message' in Firestore
+        "message": item.get('alertDescription', 'No description provided'),
+        # Map 'alertTitle' from JSON to 'severity' in Firestore (or use a default)
+        "severity": item.get('alertTitle', 'Unknown'),
+        # Keep adding the timestamp during population
+        "timestamp": datetime.now(timezone.utc)
+        # Optionally add location if needed later:
+        # "location": item.get('alertLocation')
+    }
+    # --- END FIX ---
+    # Basic validation example (now checks the mapped message)
+    if doc_data["message"] != 'No description provided':
+        return doc_id, doc_data
+    return None
+
+def user_doc(item):
+    doc_data = {
+         "email": item.get("email"),
+         "name": item.get("name"),
+         "userType": item.get("userType", "donor"), # Default to 'donor' if missing
+         "createdAt": datetime.now(timezone.utc) # Use datetime
+     }
+    if doc_data["email"] and doc_data["name"]:
+        # Use email as document ID for users if appropriate, otherwise auto-generate
+        # return doc_data["email"], doc_data
+        return None, doc_data # Using auto-generated ID for now
+    return None
 
 # --- Main Population Logic ---
 def populate():
@@ -112,7 +203,8 @@ def populate():
     else:
         print("CLEAR_COLLECTIONS_BEFORE_POPULATING is False. Appending data.")
 
-    batch = db.batch()
+    # Writes are committed in chunks by a pool of workers (see firestore_bulk.py)
+    writer = ChunkedWriter(db, chunk_size=LOAD_CHUNK_SIZE, workers=LOAD_WORKERS, max_retries=LOAD_MAX_RETRIES)
     total_added = 0
     items_processed = 0 # Add counter for processed items
 
@@ -131,149 +223,40 @@ def populate():
         }
         # Add sample volunteers
         for doc_id, data in volunteers_data.items():
-            doc_ref = volunteers_ref.document(doc_id)
-            batch.set(doc_ref, data)
+            writer.set(volunteers_ref.document(doc_id), data)
             total_added += 1
         # Add sample requests
         for doc_id, data in requests_data.items():
-            doc_ref = requests_ref.document(doc_id)
-            batch.set(doc_ref, data)
+            writer.set(requests_ref.document(doc_id), data)
             total_added += 1
         print(f"Added {len(volunteers_data)} sample volunteers and {len(requests_data)} sample requests.")
 
         # --- 2. Load and Add Data from JSON Files ---
         print("\n--- Loading data from JSON files ---")
+        json_files = [
+            ("resources.json", resources_ref, resource_doc),
+            ("current_requests.json", requests_ref, request_doc),
+            ("donations.json", donations_ref, donation_doc),
+            ("emergency_alerts.json", alerts_ref, alert_doc),
+            ("users.json", users_ref, user_doc),
+        ]
+        for filename, coll_ref, to_doc in json_files:
+            valid, invalid = load_json_file(writer, filename, coll_ref, to_doc)
+            items_processed += valid + invalid
+            total_added += valid
 
-        # Resources
-        json_resources = load_json_data("resources.json")
-        print(f"--- Processing resources.json ({len(json_resources)} items) ---")
-        for i, item in enumerate(json_resources):
-            items_processed += 1
-            print(f"  Resource item {i}: {item}")
-            doc_data = {
-                "name": item.get("name"),
-                "location": item.get("location"),
-                "quantity": item.get("quantity"),
-                "timestamp": datetime.now(timezone.utc) # Use datetime
-            }
-            if doc_data["name"] and doc_data["location"] and doc_data["quantity"] is not None:
-                print(f"    -> VALID: Adding {doc_data['name']}")
-                doc_ref = resources_ref.document()
-                batch.set(doc_ref, doc_data)
-                total_added += 1
-            else:
-                print(f"    -> INVALID: Skipping item {i} due to missing fields.")
-
-        # Requests
-        json_requests = load_json_data("current_requests.json")
-        print(f"--- Processing current_requests.json ({len(json_requests)} items) ---")
-        for i, item in enumerate(json_requests):
-            items_processed += 1
-            print(f"  Request item {i}: {item}")
-            doc_data = {
-                "name": item.get("name"),
-                "type": item.get("type"),
-                "description": item.get("description"),
-                "latitude": item.get("latitude"),
-                "longitude": item.get("longitude"),
-                "timestamp": datetime.now(timezone.utc) # Use datetime
-            }
-            if (doc_data["name"] and doc_data["type"] and doc_data["description"] and
-                doc_data["latitude"] is not None and doc_data["longitude"] is not None):
-                print(f"    -> VALID: Adding {doc_data['name']}")
-                doc_ref = requests_ref.document()
-                batch.set(doc_ref, doc_data)
-                total_added += 1
-            else:
-                print(f"    -> INVALID: Skipping item {i} due to missing fields.")
-
-        # Donations
-        json_donations = load_json_data("donations.json")
-        print(f"--- Processing donations.json ({len(json_donations)} items) ---")
-        for i, item in enumerate(json_donations):
-            items_processed += 1
-            print(f"  Donation item {i}: {item}")
-            doc_data = {
-                 "name": item.get("name"),
-                 "type": item.get("type"),
-                 "detail": item.get("detail"),
-                 "timestamp": datetime.now(timezone.utc) # Use datetime
-             }
-            if doc_data["name"] and doc_data["type"] and doc_data["detail"]:
-                print(f"    -> VALID: Adding {doc_data['name']}")
-                doc_ref = donations_ref.document()
-                batch.set(doc_ref, doc_data)
-                total_added += 1
-            else:
-                print(f"    -> INVALID: Skipping item {i} due to missing fields.")
-
-        # Alerts
-        # Use existing load_json_data function and correct filename
-        alerts_list = load_json_data('emergency_alerts.json')
-        if alerts_list: # Check if the list is not None and not empty
-            print(f"--- Processing emergency_alerts.json ({len(alerts_list)} items) ---") # Add count here
-            for i, item in enumerate(alerts_list): # Iterate with index
-                items_processed += 1 # Increment processed items
-                doc_id = item.get('id') # Use 'id' from JSON if available (though not present in your example)
-
-                # --- FIX FIELD MAPPING HERE ---
-                doc_data = {
-                    # Map 'alertDescription' from JSON to 'message' in Firestore
-                    "message": item.get('alertDescription', 'No description provided'),
-                    # Map 'alertTitle' from JSON to 'severity' in Firestore (or use a default)
-                    "severity": item.get('alertTitle', 'Unknown'),
-                    # Keep adding the timestamp during population
-                    "timestamp": datetime.now(timezone.utc)
-                    # Optionally add location if needed later:
-                    # "location": item.get('alertLocation')
-                }
-                # --- END FIX ---
+        # --- 3. Commit the remaining chunks ---
+        print(f"\nProcessed {items_processed} items from JSON files.")
+        print(f"Committing {total_added} total documents (including samples) in chunks of {writer.chunk_size}...")
+        writer.close()
 
-                # Basic validation example (now checks the mapped message)
-                if doc_data["message"] != 'No description provided':
-                    print(f"  Alert item {i}: {item}") # Print item being processed
-                    print(f"    -> VALID Alert: {doc_id or '(auto-id)'} - {doc_data['message'][:30]}...")
-                    if doc_id:
-                        doc_ref = alerts_ref.document(doc_id) # Use alerts_ref
-                    else:
-                        doc_ref = alerts_ref.document() # Use alerts_ref
-                    batch.set(doc_ref, doc_data)
-                    total_added += 1 # Increment total added
-                else:
-                    print(f"  Alert item {i}: {item}") # Print invalid item
-                    print(f"    -> INVALID Alert data (missing alertDescription): {item}")
+        # --- 4. Bump the volunteers version marker ---
+        # The backend reuses its volunteer index (and on-disk snapshot) until this changes
+        db.collection('meta').document('volunteers').set({'version': firestore.Increment(1)}, merge=True)
+        if writer.failed:
+            print(f"Firestore populated with errors: {writer.failed} documents were not written.")
         else:
-            # Message updated for clarity
-            print("  Skipping alerts (file empty, not found, or invalid).")
-
-
-        # Users
-        json_users = load_json_data("users.json")
-        print(f"--- Processing users.json ({len(json_users)} items) ---")
-        for i, item in enumerate(json_users):
-            items_processed += 1
-            print(f"  User item {i}: {item}")
-            doc_data = {
-                 "email": item.get("email"),
-                 "name": item.get("name"),
-                 "userType": item.get("userType", "donor"), # Default to 'donor' if missing
-                 "createdAt": datetime.now(timezone.utc) # Use datetime
-             }
-            if doc_data["email"] and doc_data["name"]:
-                print(f"    -> VALID: Adding {doc_data['name']}")
-                # Use email as document ID for users if appropriate, otherwise auto-generate
-                # doc_ref = users_ref.document(doc_data["email"])
-                doc_ref = users_ref.document() # Using auto-generated ID for now
-                batch.set(doc_ref, doc_data)
-                total_added += 1
-            else:
-                print(f"    -> INVALID: Skipping item {i} due to missing fields.")
-
-        # --- 3. Commit Batch ---
-        print(f"\nProcessed {items_processed} items from JSON files.")
-        print(f"Committing batch of {total_added} total documents (including samples)...")
-        batch.commit()
-        print("Firestore populated successfully.")
+            print("Firestore populated successfully.")
 
     except Exception as e:
         print(f"Error during Firestore population: {e}")
@@ -0,0 +1,67 @@
+# 3_basic_function_testing/api_app.py
+# The backend app on the in-memory storage backend, for offline endpoint tests
+# (no Firebase, no server). Import this module before anything imports main.
+
+import atexit
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'code_1', 'backend'))
+sys.path.insert(0, BACKEND_DIR)
+
+_scratch = tempfile.mkdtemp(prefix="api-tests-")
+os.environ.update({
+    "STORAGE_BACKEND": "memory",
+    "MATCH_SNAPSHOT_PATH": os.path.join(_scratch, "volunteer_index.snapshot"),
+    "GEOCODE_CACHE_PATH": ":memory:",
+    "TRACE_SAMPLE_RATE": "0",
+    "VOLUNTEER_POLL_INTERVAL": "3600",
+})
+
+from fastapi.testclient import TestClient
+
+import main
+from response_cache import ResponseCache
+
+# One client (and event loop) for the whole session, so background work started by a
+# request (matching jobs, write batches) keeps running between requests
+client = TestClient(main.app)
+client.__enter__()
+atexit.register(client.__exit__, None, None, None)
+
+
+def reset():
+    """Empty every collection and the response cache, and resync the volunteer store."""
+    raw = main.storage._target
+    with raw._lock:
+        raw._collections.clear()
+        raw._indexes.clear()
+    main.response_cache = ResponseCache(ttl=main.RESPONSE_CACHE_TTL)
+    sync_volunteers()
+
+def run(coro):
+    """Run a coroutine on the client's event loop (where main's storage and coalescer live)."""
+    return client.portal.call(lambda: coro)
+
+def put(collection, doc_id, data):
+    """Store one document directly (bypassing the API)."""
+    run(main.storage.commit([("set", main.storage.document(collection, doc_id), data)]))
+
+def sync_volunteers():
+    """Bump the volunteers version marker and bring the matching index up to date."""
+    meta = main.storage.get_sync("meta", "volunteers")
+    version = (meta.to_dict().get("version", 0) if meta.exists else 0) + 1
+    put("meta", "volunteers", {"version": version})
+    main.volunteer_store.index(wait=5)
+    main.volunteer_store.sync()
+
+def add_volunteers(volunteers):
+    """Store {id: volunteer} and make them matchable."""
+    for volunteer_id, data in volunteers.items():
+        put("volunteers", volunteer_id, data)
+    sync_volunteers()
+
+def volunteer(lat, lon, skill='Medical', available=True):
+    return {'name': f'{skill} {lat},{lon}', 'skills': [skill], 'availability': available,
+            'location': {'latitude': lat, 'longitude': lon}}
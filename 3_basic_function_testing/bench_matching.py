@@ -0,0 +1,202 @@
+# 3_basic_function_testing/bench_matching.py
+# Offline benchmarks for the matching_ai pipeline: no Firebase, no network.
+
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import scipy
+import sklearn
+from sklearn.neighbors import NearestNeighbors
+from sklearn.preprocessing import StandardScaler
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.abspath(os.path.join(TEST_DIR, '..', 'code_1', 'backend')))
+sys.path.insert(0, os.path.abspath(os.path.join(TEST_DIR, '..', '2_data_collection')))
+
+import generate_scale_data as gen
+from matching_ai import VolunteerIndex, build_feature_matrix, extract_features_requests
+
+# Sweeps volunteer counts (and query batch sizes) over synthetic data from
+# generate_scale_data and reports, per phase, the best wall time of `repeat`
+# runs and the peak memory allocated during one extra traced run (tracing
+# slows the code, so that run is not timed). Phases:
+#   features           build_feature_matrix over the volunteer dicts
+#   scaler_fit         StandardScaler fit + transform of the (densified) matrix
+#   nn_fit             NearestNeighbors fit on the scaled matrix
+#   index_build        VolunteerIndex.from_volunteers (what the app keeps instead of the three above)
+#   request_features   extract_features_requests for one batch of requests
+#   nn_kneighbors      scaler.transform + NearestNeighbors.kneighbors for the batch
+#   index_kneighbors   VolunteerIndex.kneighbors, exact
+#   index_kneighbors_geo  VolunteerIndex.kneighbors with the geo stage (geo tree built beforehand)
+# Results are written as JSON; --baseline compares a run against a stored one
+# and exits with status 1 if any phase got slower than the tolerance allows.
+#
+# Run: python 3_basic_function_testing/bench_matching.py --volunteers 100 10000 1000000 --batches 1 256
+
+RESULTS_FORMAT = 1
+DEFAULT_VOLUNTEERS = [100, 1000, 10000, 100000, 1000000]
+DEFAULT_BATCHES = [1, 16, 256]
+DEFAULT_RESULTS_DIR = os.path.join(TEST_DIR, 'benchmark_results')
+GEO_RADIUS_KM = 50.0
+GEO_CANDIDATES = 500
+REPEAT_LIMIT = 100000 # Counts at or above this run each phase once (a run takes seconds)
+NOISE_FLOOR_SECONDS = 0.002 # Slowdowns smaller than this are never reported as regressions
+
+
+def measure(fn, repeat=3, memory=True):
+    """(result of the last call, best seconds over `repeat` calls, peak MiB of one traced call or None)."""
+    best = float('inf')
+    for _ in range(max(1, repeat)):
+        gc.collect()
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    peak = None
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            fn()
+            peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        finally:
+            tracemalloc.stop()
+    return result, best, peak
+
+def run_benchmarks(volunteer_counts, batch_sizes, k=3, seed=0, repeat=3, memory=True, report=None):
+    """List of {"phase", "volunteers", "batch", "seconds", "peak_mib"} results (batch is None for fitting phases)."""
+    results = []
+
+    def record(phase, n, batch, fn, repeats):
+        value, seconds, peak = measure(fn, repeats, memory)
+        row = {'phase': phase, 'volunteers': n, 'batch': batch, 'seconds': seconds,
+               'peak_mib': None if peak is None else round(peak, 3)}
+        results.append(row)
+        if report:
+            report(row)
+        return value
+
+    max_batch = max(batch_sizes)
+    for n in volunteer_counts:
+        repeats = repeat if n < REPEAT_LIMIT else 1
+        volunteer_columns, request_columns = gen.generate(n, max_batch, seed=seed)
+        volunteers = list(gen.volunteer_records(volunteer_columns))
+        requests = list(gen.request_records(request_columns))
+        del volunteer_columns
+
+        X, _ = record('features', n, None, lambda: build_feature_matrix(volunteers), repeats)
+        scaler = StandardScaler()
+        Xs = record('scaler_fit', n, None, lambda: scaler.fit_transform(X.toarray()), repeats)
+        nn = record('nn_fit', n, None, lambda: NearestNeighbors(n_neighbors=min(k, n)).fit(Xs), repeats)
+        index = record('index_build', n, None, lambda: VolunteerIndex.from_volunteers(volunteers), repeats)
+        index.kneighbors(extract_features_requests(requests[:1]), k, GEO_RADIUS_KM, GEO_CANDIDATES) # Builds the geo tree
+
+        for batch in batch_sizes:
+            Q = record('request_features', n, batch, lambda: extract_features_requests(requests[:batch]), repeats)
+            record('nn_kneighbors', n, batch, lambda: nn.kneighbors(scaler.transform(Q)), repeats)
+            record('index_kneighbors', n, batch, lambda: index.kneighbors(Q, k), repeats)
+            record('index_kneighbors_geo', n, batch,
+                   lambda: index.kneighbors(Q, k, radius_km=GEO_RADIUS_KM, max_candidates=GEO_CANDIDATES), repeats)
+        del volunteers, X, Xs, nn, index
+        gc.collect()
+    return results
+
+def environment():
+    """What the numbers depend on, stored with every run."""
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'scipy': scipy.__version__,
+        'sklearn': sklearn.__version__,
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+    }
+
+def save_results(path, results, config):
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'format': RESULTS_FORMAT,
+            'created': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'environment': environment(),
+            'config': config,
+            'results': results,
+        }, f, indent=2)
+
+def load_results(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if data.get('format') != RESULTS_FORMAT:
+        raise ValueError(f"{path}: unsupported results format {data.get('format')}")
+    return data
+
+def _key(row):
+    return row['phase'], row['volunteers'], row['batch']
+
+def compare(results, baseline, tolerance=0.25, noise_floor=NOISE_FLOOR_SECONDS):
+    """
+    (comparisons, regressions) of results against baseline results, matched by
+    (phase, volunteers, batch). A regression is a phase that took more than
+    (1 + tolerance) times its baseline time and at least noise_floor longer.
+    """
+    stored = {_key(row): row for row in baseline}
+    comparisons, regressions = [], []
+    for row in results:
+        base = stored.get(_key(row))
+        if base is None:
+            continue
+        ratio = row['seconds'] / max(base['seconds'], 1e-12)
+        entry = dict(row, baseline_seconds=base['seconds'], ratio=ratio)
+        comparisons.append(entry)
+        if ratio > 1 + tolerance and row['seconds'] - base['seconds'] >= noise_floor:
+            regressions.append(entry)
+    return comparisons, regressions
+
+def _format_row(row):
+    batch = '-' if row['batch'] is None else row['batch']
+    peak = '' if row['peak_mib'] is None else f"{row['peak_mib']:10.1f} MiB"
+    return f"{row['volunteers']:>9} {batch:>6}  {row['phase']:<22} {row['seconds'] * 1000:11.2f} ms {peak}"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the matching_ai pipeline offline.")
+    parser.add_argument('--volunteers', type=int, nargs='+', default=DEFAULT_VOLUNTEERS)
+    parser.add_argument('--batches', type=int, nargs='+', default=DEFAULT_BATCHES, help="Requests per kneighbors call")
+    parser.add_argument('--k', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3, help=f"Timed runs per phase (1 from {REPEAT_LIMIT} volunteers)")
+    parser.add_argument('--no-memory', action='store_true', help="Skip the traced run that measures peak memory")
+    parser.add_argument('--out', help="Results file (default: benchmark_results/matching-<time>.json)")
+    parser.add_argument('--baseline', help="Stored results file to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed slowdown before a phase counts as a regression")
+    args = parser.parse_args(argv)
+
+    print(f"{'volunteers':>9} {'batch':>6}  {'phase':<22} {'time':>14} {'peak':>14}")
+    results = run_benchmarks(args.volunteers, args.batches, k=args.k, seed=args.seed, repeat=args.repeat,
+                             memory=not args.no_memory, report=lambda row: print(_format_row(row), flush=True))
+    out = args.out or os.path.join(DEFAULT_RESULTS_DIR,
+                                   f"matching-{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    save_results(out, results, {'k': args.k, 'seed': args.seed, 'repeat': args.repeat})
+    print(f"Results written to {out}")
+
+    if args.baseline:
+        comparisons, regressions = compare(results, load_results(args.baseline)['results'], args.tolerance)
+        print(f"\nAgainst {args.baseline} ({len(comparisons)} matching phases):")
+        for entry in comparisons:
+            flag = "  REGRESSION" if entry in regressions else ""
+            print(f"{_format_row(entry)}  x{entry['ratio']:.2f} of {entry['baseline_seconds'] * 1000:.2f} ms{flag}")
+        if regressions:
+            print(f"{len(regressions)} phase(s) slower than the baseline by more than {args.tolerance:.0%}.")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
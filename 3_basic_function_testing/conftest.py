@@ -0,0 +1,13 @@
+# 3_basic_function_testing/conftest.py
+# Loaded by pytest before any test module, so whatever a test imports (main, matching_ai,
+# load_test) keeps its on-disk state in a scratch directory instead of code_1/backend.
+
+import atexit
+import os
+import shutil
+import tempfile
+
+_scratch = tempfile.mkdtemp(prefix="backend-tests-")
+atexit.register(shutil.rmtree, _scratch, ignore_errors=True)
+os.environ["MATCH_SNAPSHOT_PATH"] = os.path.join(_scratch, "volunteer_index.snapshot")
+os.environ["GEOCODE_CACHE_PATH"] = ":memory:"
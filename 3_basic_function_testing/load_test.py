@@ -0,0 +1,307 @@
+# 3_basic_function_testing/load_test.py
+# HTTP load generator for the backend: mixed scenario profiles against a local server.
+
+import argparse
+import asyncio
+import collections
+import contextlib
+import datetime
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import numpy as np
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.abspath(os.path.join(TEST_DIR, '..', 'code_1', 'backend'))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.abspath(os.path.join(TEST_DIR, '..', '2_data_collection')))
+
+import generate_scale_data as gen
+from matching_ai import KNOWN_SKILLS
+from storage import SQLiteStorage
+
+# Drives the API with a weighted mix of calls (a profile) for a fixed duration
+# and reports latency percentiles, throughput and error rate per route.
+#   - Closed loop (default): --concurrency clients, each sending its next call
+#     as soon as the previous one returns; measures the throughput ceiling.
+#   - Open loop (--rate R): calls arrive at R per second (Poisson), whatever the
+#     server's speed, with at most --concurrency in flight. Latency is measured
+#     from each call's scheduled time, so queueing behind a slow server counts.
+# Without --url a server is started locally (uvicorn main:app) on a SQLite
+# stand-in datastore seeded with synthetic volunteers, requests and alerts
+# (STORAGE_BACKEND=sqlite, see storage.py), so no Firebase project is touched.
+# Calls in the first --warmup seconds are sent but not counted.
+#
+# Run: python 3_basic_function_testing/load_test.py --profile surge --concurrency 64 --duration 30
+
+Call = collections.namedtuple("Call", ["route", "method", "url", "kwargs", "on_done"])
+
+
+class Workload:
+    """Ids and revalidation state shared by the calls of one run."""
+
+    def __init__(self, request_ids, rng):
+        self.request_ids = list(request_ids)
+        self.created_ids = [] # Requests created during the run (polled by the surge profile)
+        self.etags = {}
+        self.rng = rng
+
+    def request_id(self):
+        return self.request_ids[self.rng.randrange(len(self.request_ids))]
+
+    def recent_request_id(self):
+        if self.created_ids:
+            return self.created_ids[self.rng.randrange(max(0, len(self.created_ids) - 100), len(self.created_ids))]
+        return self.request_id()
+
+    def on_created(self, response):
+        if response.status_code == 201:
+            self.created_ids.append(response.json()["id"])
+
+    def conditional_get(self, route, url):
+        """GET that revalidates with the ETag of the previous response, as a polling client does."""
+        def remember(response):
+            if response.headers.get("etag"):
+                self.etags[url] = response.headers["etag"]
+        headers = {"If-None-Match": self.etags[url]} if url in self.etags else {}
+        return Call(route, "GET", url, {"headers": headers}, remember)
+
+# --- Calls ---
+def create_request(w):
+    skill = KNOWN_SKILLS[min(int(w.rng.expovariate(0.5)), len(KNOWN_SKILLS) - 1)]
+    payload = {"name": "Load test request", "description": f"Need {skill.lower()}", "type": skill,
+               "required_skills": [], "location": "Dallas, TX", "urgency": "high"} # The frontend's payload
+    return Call("POST /requests", "POST", "/requests", {"json": payload}, w.on_created)
+
+def poll_request(w):
+    return Call("GET /requests/{id}", "GET", f"/requests/{w.recent_request_id()}", {}, None)
+
+def match_request(w):
+    return Call("GET /match/{id}", "GET", f"/match/{w.request_id()}", {}, None)
+
+def match_batch(w):
+    ids = [w.request_id() for _ in range(16)]
+    return Call("POST /match/batch", "POST", "/match/batch", {"json": {"requests": ids, "k": 3}}, None)
+
+def poll_alerts(w):
+    return w.conditional_get("GET /alerts", "/alerts?limit=50")
+
+def list_requests(w):
+    return Call("GET /requests", "GET", "/requests?limit=100", {}, None)
+
+def list_resources(w):
+    return w.conditional_get("GET /resources", "/resources?limit=100")
+
+# Profiles: (weight, call) mixes modelled on what clients do in each situation
+PROFILES = {
+    # Help requests pour in; submitters poll their request until it is matched
+    "surge": [(6, create_request), (3, poll_request), (1, match_request)],
+    # Many app clients polling the alert feed (mostly answered 304 from the cache)
+    "alert-polling": [(8, poll_alerts), (1, list_requests), (1, list_resources)],
+    # A dispatcher re-matching open requests one by one and in batches
+    "rematch": [(7, match_request), (3, match_batch)],
+    "mixed": [(3, create_request), (2, poll_request), (4, poll_alerts), (2, match_request),
+              (1, match_batch), (1, list_requests), (1, list_resources)],
+}
+
+
+class Stats:
+    """Latencies and outcomes per route."""
+
+    def __init__(self):
+        self.latencies = collections.defaultdict(list)
+        self.statuses = collections.defaultdict(collections.Counter)
+        self.errors = collections.Counter()
+
+    def record(self, route, seconds, status, ok):
+        self.latencies[route].append(seconds)
+        self.statuses[route][status] += 1
+        if not ok:
+            self.errors[route] += 1
+
+    def summary(self, elapsed):
+        """{route: {...}} plus an "ALL" row; latencies in milliseconds, throughput in calls per second."""
+        def row(latencies, errors, statuses):
+            ms = np.asarray(latencies) * 1000
+            p50, p95, p99 = np.percentile(ms, [50, 95, 99]) if ms.size else (np.nan,) * 3
+            return {
+                "requests": int(ms.size),
+                "throughput": ms.size / elapsed if elapsed > 0 else 0.0,
+                "error_rate": errors / ms.size if ms.size else 0.0,
+                "p50_ms": float(p50), "p95_ms": float(p95), "p99_ms": float(p99),
+                "max_ms": float(ms.max()) if ms.size else float("nan"),
+                "statuses": {str(status): count for status, count in sorted(statuses.items(), key=str)},
+            }
+        routes = {route: row(self.latencies[route], self.errors[route], self.statuses[route])
+                  for route in sorted(self.latencies)}
+        total = collections.Counter()
+        for statuses in self.statuses.values():
+            total.update(statuses)
+        routes["ALL"] = row([s for latencies in self.latencies.values() for s in latencies],
+                            sum(self.errors.values()), total)
+        return routes
+
+
+async def run_load(client, profile, request_ids, duration, concurrency=16, rate=None, warmup=0.0, seed=0):
+    """
+    Run `profile` (a name from PROFILES or a list of (weight, call) pairs)
+    through `client` (an httpx.AsyncClient) for warmup + duration seconds.
+    Returns (Stats, measured seconds).
+    """
+    mix = PROFILES[profile] if isinstance(profile, str) else profile
+    weights = [weight for weight, _ in mix]
+    calls = [call for _, call in mix]
+    rng = random.Random(seed)
+    workload = Workload(request_ids, rng)
+    stats = Stats()
+    start = time.perf_counter()
+    measure_from = start + warmup
+    end = measure_from + duration
+
+    def next_call():
+        return rng.choices(calls, weights)[0](workload)
+
+    async def issue(call, scheduled):
+        try:
+            response = await client.request(call.method, call.url, **call.kwargs)
+            status, ok = response.status_code, response.status_code < 400
+            if call.on_done:
+                call.on_done(response)
+        except httpx.HTTPError as e:
+            status, ok = type(e).__name__, False
+        if scheduled >= measure_from:
+            stats.record(call.route, time.perf_counter() - scheduled, status, ok)
+
+    if rate is None:
+        async def client_loop():
+            while time.perf_counter() < end:
+                await issue(next_call(), time.perf_counter())
+        await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    else:
+        slots = asyncio.Semaphore(concurrency)
+        tasks = set()
+
+        async def limited(call, scheduled):
+            async with slots:
+                await issue(call, scheduled)
+
+        scheduled = start
+        while scheduled < end:
+            await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+            task = asyncio.create_task(limited(next_call(), scheduled))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            scheduled += rng.expovariate(rate)
+        await asyncio.gather(*tasks)
+    return stats, max(time.perf_counter() - measure_from, 1e-9)
+
+# --- Local server ---
+def seed_store(path, n_volunteers, n_requests, n_alerts=500, seed=0):
+    """SQLite stand-in datastore with synthetic volunteers, requests and alerts; returns the request ids."""
+    volunteers, requests = gen.generate(n_volunteers, n_requests, seed=seed)
+    storage = SQLiteStorage(path)
+    gen.write_storage(storage, volunteers, requests, version=f"load-test:{seed}:{n_volunteers}")
+    severities = ["low", "medium", "high"]
+    alerts = [("set", storage.document("alerts", f"alert-{i:05d}"),
+               {"title": f"Alert {i}", "message": "Synthetic alert", "severity": severities[i % 3],
+                "createdAt": gen.DEFAULT_START + datetime.timedelta(minutes=i)}) for i in range(n_alerts)]
+    asyncio.run(storage.commit(alerts))
+    storage.close()
+    return [str(request_id) for request_id in requests["id"]]
+
+@contextlib.contextmanager
+def local_server(data_dir, port, workers=1, ready_timeout=120.0, env=None):
+    """Start uvicorn main:app on the SQLite store in data_dir and yield its URL once /ready answers 200."""
+    server_env = dict(os.environ, STORAGE_BACKEND="sqlite",
+                      STORAGE_SQLITE_PATH=os.path.join(data_dir, "local_store.sqlite3"),
+                      MATCH_SNAPSHOT_PATH=os.path.join(data_dir, "volunteer_index.snapshot"), **(env or {}))
+    process = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+                                "--workers", str(workers), "--log-level", "warning"],
+                               cwd=BACKEND_DIR, env=server_env)
+    url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + ready_timeout
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f"Server exited with status {process.returncode}")
+            try:
+                if httpx.get(f"{url}/ready", timeout=2).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Server not ready after {ready_timeout:.0f}s")
+            time.sleep(0.5)
+        yield url
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+# --- Report ---
+def print_report(profile, summary, elapsed, mode):
+    print(f"\nProfile '{profile}', {mode}, {elapsed:.1f}s measured")
+    print(f"{'route':<22} {'calls':>8} {'calls/s':>9} {'errors':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}  statuses")
+    for route, row in summary.items():
+        statuses = " ".join(f"{status}:{count}" for status, count in row["statuses"].items())
+        print(f"{route:<22} {row['requests']:>8} {row['throughput']:>9.1f} {row['error_rate']:>8.2%} "
+              f"{row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f}  {statuses}")
+
+async def _run_profiles(url, profiles, request_ids, args):
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    results = {}
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=args.timeout) as client:
+        for profile in profiles:
+            stats, elapsed = await run_load(client, profile, request_ids, args.duration, args.concurrency,
+                                            args.rate, args.warmup, args.seed)
+            mode = (f"open loop at {args.rate:g}/s (max {args.concurrency} in flight)" if args.rate
+                    else f"closed loop, {args.concurrency} clients")
+            summary = stats.summary(elapsed)
+            print_report(profile, summary, elapsed, mode)
+            results[profile] = {"mode": mode, "seconds": elapsed, "routes": summary}
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the backend with mixed scenario profiles.")
+    parser.add_argument('--profile', choices=sorted(PROFILES) + ['all'], default='mixed')
+    parser.add_argument('--duration', type=float, default=30.0, help="Measured seconds per profile")
+    parser.add_argument('--warmup', type=float, default=5.0, help="Seconds sent but not counted, per profile")
+    parser.add_argument('--concurrency', type=int, default=32, help="Clients (closed loop) or max calls in flight (open loop)")
+    parser.add_argument('--rate', type=float, help="Arrivals per second (open loop); default is closed loop")
+    parser.add_argument('--timeout', type=float, default=30.0, help="Per-call timeout in seconds")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--url', help="Test a running server instead of starting one (seeded with "
+                                      "generate_scale_data --format sqlite for the request ids to exist)")
+    parser.add_argument('--port', type=int, default=8011)
+    parser.add_argument('--server-workers', type=int, default=1, help="uvicorn worker processes of the local server")
+    parser.add_argument('--volunteers', type=int, default=20000, help="Volunteers seeded into the local store")
+    parser.add_argument('--requests', type=int, default=2000, help="Requests seeded into the local store")
+    parser.add_argument('--out', help="Also write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    profiles = sorted(PROFILES) if args.profile == 'all' else [args.profile]
+    if args.url:
+        request_ids = [f"req-{i:07d}" for i in range(args.requests)] # Ids written by generate_scale_data
+        results = asyncio.run(_run_profiles(args.url, profiles, request_ids, args))
+    else:
+        with tempfile.TemporaryDirectory(prefix="load-test-") as data_dir:
+            print(f"Seeding {args.volunteers} volunteers and {args.requests} requests...")
+            request_ids = seed_store(os.path.join(data_dir, "local_store.sqlite3"), args.volunteers,
+                                     args.requests, seed=args.seed)
+            with local_server(data_dir, args.port, args.server_workers) as url:
+                results = asyncio.run(_run_profiles(url, profiles, request_ids, args))
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump({"config": vars(args), "profiles": results}, f, indent=2)
+        print(f"\nResults written to {args.out}")
+
+if __name__ == "__main__":
+    main()
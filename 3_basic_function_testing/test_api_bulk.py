@@ -0,0 +1,142 @@
+# 3_basic_function_testing/test_api_bulk.py
+# Offline endpoint tests for the NDJSON bulk endpoints, on the in-memory storage backend.
+
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from api_app import add_volunteers, client, main, reset, volunteer
+
+NDJSON = {'Content-Type': 'application/x-ndjson'}
+
+
+def post_bulk(path, body, params=None):
+    """POST an NDJSON body (bytes, or an iterator of byte chunks); returns the parsed result lines."""
+    response = client.post(path, content=body, params=params, headers=NDJSON)
+    assert response.status_code == 200, response.text
+    return [json.loads(line) for line in response.text.splitlines()]
+
+def ndjson(*records):
+    return b''.join((record if isinstance(record, bytes) else json.dumps(record).encode()) + b'\n' for record in records)
+
+def stored(collection):
+    return {doc.id: doc.to_dict() for doc in main.storage._target.stream_sync(collection)}
+
+@pytest.fixture(autouse=True)
+def empty_store():
+    reset()
+
+
+# --- Validation and result lines ---
+def test_partial_failures_are_reported_per_line():
+    lines = post_bulk('/donations/bulk', ndjson(
+        {'name': 'Canned food', 'detail': 'qty: 40'},
+        b'',
+        {'detail': 'no name'},
+        b'{"name": "Water", ',
+        b'["a", "list"]',
+        {'name': 'Blankets', 'detail': 7},
+        {'name': 'Tents'},
+    ))
+    assert [(line['line'], line['status']) for line in lines] == [(1, 201), (3, 400), (4, 400), (5, 400), (6, 400), (7, 201)]
+    assert 'Missing required donation data' in lines[1]['error']
+    assert lines[3]['error'] == 'Each line must be a JSON object'
+    assert lines[4]['error'] == 'Invalid record'
+    donations = stored('donations')
+    assert set(donations) == {lines[0]['id'], lines[5]['id']}
+    assert donations[lines[0]['id']]['quantity'] == 40
+
+def test_failed_writes_are_reported(monkeypatch):
+    set_doc = main.write_coalescer.set
+
+    async def flaky(doc_ref, data):
+        if data['name'] == 'Broken':
+            raise RuntimeError("write rejected")
+        return await set_doc(doc_ref, data)
+
+    monkeypatch.setattr(main.write_coalescer, 'set', flaky)
+    lines = post_bulk('/resources/bulk', ndjson({'name': 'Cots', 'quantity': 5}, {'name': 'Broken', 'quantity': 1}))
+    assert [line['status'] for line in lines] == [201, 500]
+    assert lines[1] == {'line': 2, 'status': 500, 'error': 'Failed to create record'}
+    assert list(stored('resources')) == [lines[0]['id']]
+
+def test_records_are_written_in_chunks(monkeypatch):
+    monkeypatch.setattr(main, 'BULK_CHUNK_SIZE', 2)
+    # Lines split across body chunks are put back together
+    body = ndjson(*({'name': f'Item {i}', 'quantity': i} for i in range(5)))
+    chunks = iter([body[:7], body[7:30], body[30:31], body[31:]])
+    lines = post_bulk('/resources/bulk', chunks)
+    assert [line['line'] for line in lines] == [1, 2, 3, 4, 5]
+    assert sorted(data['name'] for data in stored('resources').values()) == [f'Item {i}' for i in range(5)]
+
+def test_bulk_requires_ndjson():
+    response = client.post('/resources/bulk', json={'name': 'Cots', 'quantity': 5})
+    assert response.status_code == 415
+    assert stored('resources') == {}
+
+# --- Limits ---
+def test_oversized_body_is_refused_up_front(monkeypatch):
+    monkeypatch.setattr(main, 'BULK_MAX_BYTES', 50)
+    body = ndjson(*({'name': f'Item {i}', 'quantity': i} for i in range(5)))
+    response = client.post('/resources/bulk', content=body, headers=NDJSON)
+    assert response.status_code == 413
+    assert stored('resources') == {}
+
+def test_limits_stop_a_streamed_upload(monkeypatch):
+    body = ndjson(*({'name': f'Item {i}', 'quantity': i} for i in range(5)))
+    monkeypatch.setattr(main, 'BULK_MAX_RECORDS', 3)
+    lines = post_bulk('/resources/bulk', body)
+    assert [line['status'] for line in lines] == [201, 201, 201, 413]
+    assert lines[-1]['line'] == 4 and '3 records' in lines[-1]['error']
+    assert len(stored('resources')) == 3
+
+    # Without a Content-Length the byte limit is checked as the body arrives
+    reset()
+    monkeypatch.setattr(main, 'BULK_MAX_RECORDS', 100)
+    monkeypatch.setattr(main, 'BULK_MAX_BYTES', len(body) - 1)
+    lines = post_bulk('/resources/bulk', iter([body[:len(body) // 2], body[len(body) // 2:]]))
+    assert lines[-1]['status'] == 413 and 'bytes' in lines[-1]['error']
+    assert all(line['status'] == 201 for line in lines[:-1])
+    assert len(stored('resources')) == len(lines) - 1
+
+# --- /requests/bulk ---
+REQUEST = {'name': 'First aid', 'description': 'Sprained ankle', 'type': 'Medical'}
+
+def test_bulk_requests_are_matched_with_their_coordinates():
+    add_volunteers({
+        'dallas-medic': volunteer(32.78, -96.80, 'Medical'),
+        'nyc-medic': volunteer(40.71, -74.00, 'Medical'),
+    })
+    lines = post_bulk('/requests/bulk', ndjson(
+        dict(REQUEST, latitude=40.7, longitude=-74.0),
+        dict(REQUEST, latitude=32.8, longitude=-96.8),
+        dict(REQUEST, latitude=91, longitude=0),
+        dict(REQUEST, latitude='north', longitude=0),
+        dict(REQUEST, latitude=32.8),
+    ), params={'match': 1})
+    created, matched = lines[:5], lines[5:]
+    assert [line['status'] for line in created] == [201, 201, 400, 400, 400]
+    assert all(line['error'] == 'Invalid latitude/longitude' for line in created[2:])
+    ids = [created[0]['id'], created[1]['id']]
+    assert matched == [{'id': request_id, 'matchStatus': 'complete'} for request_id in ids]
+
+    requests = stored('requests')
+    assert requests[ids[0]]['latitude'] == 40.7 and requests[ids[0]]['longitude'] == -74.0
+    # Each request's nearest volunteer comes first
+    assert [requests[request_id]['matches'][0]['location']['latitude'] for request_id in ids] == [40.71, 32.78]
+
+def test_bulk_requests_without_match_are_skipped():
+    lines = post_bulk('/requests/bulk', ndjson(REQUEST, {'name': 'No type'}))
+    assert [line['status'] for line in lines] == [201, 400]
+    assert stored('requests')[lines[0]['id']]['matchStatus'] == 'skipped'
+
+def test_single_request_keeps_its_coordinates():
+    response = client.post('/requests', json=dict(REQUEST, latitude=32.8, longitude=-96.8))
+    assert response.status_code == 201
+    assert stored('requests')[response.json()['id']]['latitude'] == 32.8
+    response = client.post('/requests', json=dict(REQUEST, longitude=-96.8))
+    assert response.status_code == 400 and response.json()['error'] == 'Invalid latitude/longitude'
@@ -0,0 +1,159 @@
+# 3_basic_function_testing/test_api_listing.py
+# Offline endpoint tests for the list endpoints, on the in-memory storage backend.
+
+import base64
+import datetime
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from api_app import client, main, put, reset
+
+T0 = datetime.datetime(2024, 5, 1, 12, 0, tzinfo=datetime.timezone.utc)
+
+
+def add_resources(created):
+    """Store resources r0, r1, ... with the given createdAt values (datetimes, or None)."""
+    for i, created_at in enumerate(created):
+        put('resources', f'r{i}', {'name': f'Item {i}', 'quantity': i, 'createdAt': created_at})
+
+def all_pages(path, limit):
+    """Ids of every page of a list endpoint, followed through X-Next-Cursor."""
+    pages, cursor = [], None
+    while True:
+        params = {'limit': limit} if cursor is None else {'limit': limit, 'cursor': cursor}
+        response = client.get(path, params=params)
+        assert response.status_code == 200
+        pages.append([item['id'] for item in response.json()])
+        cursor = response.headers.get('x-next-cursor')
+        if cursor is None:
+            return pages
+        assert len(pages) < 100, "cursor does not advance"
+
+@pytest.fixture(autouse=True)
+def empty_store():
+    reset()
+
+
+# --- Pagination ---
+def test_pages_are_newest_first_and_end_without_a_cursor():
+    add_resources([T0 + datetime.timedelta(minutes=i) for i in range(5)])
+    assert all_pages('/resources', 2) == [['r4', 'r3'], ['r2', 'r1'], ['r0']]
+    # A page that ends exactly at the last document has no cursor either
+    assert all_pages('/resources', 5) == [['r4', 'r3', 'r2', 'r1', 'r0']]
+    assert all_pages('/resources', 10) == [['r4', 'r3', 'r2', 'r1', 'r0']]
+
+def test_ties_on_created_at_are_paged_by_id():
+    add_resources([T0] * 5)
+    pages = all_pages('/resources', 2)
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert sum(pages, []) == ['r4', 'r3', 'r2', 'r1', 'r0'] # No document skipped or repeated
+
+def test_documents_without_a_timestamp_page_through():
+    add_resources([T0, None, T0 + datetime.timedelta(minutes=1), None])
+    pages = all_pages('/resources', 1)
+    assert sum(pages, []) == ['r2', 'r0', 'r3', 'r1'] # Null createdAt sorts last
+    assert main.decode_cursor(main.encode_cursor(main.storage.get_sync('resources', 'r3'))) == (None, 'r3')
+
+@pytest.mark.parametrize('cursor', ['not-a-cursor', base64.urlsafe_b64encode(b'["yesterday", "r1"]').decode(),
+                                    base64.urlsafe_b64encode(b'[null, 7]').decode(), ''])
+def test_invalid_cursors_are_rejected(cursor):
+    add_resources([T0])
+    response = client.get('/resources', params={'cursor': cursor} if cursor else {'cursor': '%%%'})
+    assert response.status_code == 400
+    assert response.json()['error'] == 'Invalid cursor'
+
+def test_limit_is_validated_and_clamped(monkeypatch):
+    add_resources([T0 + datetime.timedelta(minutes=i) for i in range(5)])
+    monkeypatch.setattr(main, 'MAX_PAGE_SIZE', 3)
+    response = client.get('/resources', params={'limit': 1000})
+    assert len(response.json()) == 3 and 'x-next-cursor' in response.headers
+    monkeypatch.setattr(main, 'DEFAULT_PAGE_SIZE', 2)
+    assert len(client.get('/resources').json()) == 2
+    for limit in ('0', '-1', 'ten'):
+        assert client.get('/resources', params={'limit': limit}).status_code == 400, limit
+
+# --- Streaming ---
+NDJSON = {'Accept': 'application/x-ndjson'}
+
+def test_streams_match_the_paged_listing():
+    add_resources([T0 + datetime.timedelta(minutes=i % 3) for i in range(7)] + [None])
+    paged = []
+    for page in all_pages('/resources', 3):
+        paged.extend(page)
+    listed = client.get('/resources', params={'limit': 100}).json()
+    assert [item['id'] for item in listed] == paged
+
+    response = client.get('/resources', headers=NDJSON)
+    assert response.headers['content-type'].startswith('application/x-ndjson')
+    assert [json.loads(line) for line in response.text.splitlines()] == listed
+    response = client.get('/resources', params={'stream': 1})
+    assert response.json() == listed
+
+    # A cursor is honoured
+    cursor = client.get('/resources', params={'limit': 3}).headers['x-next-cursor']
+    assert client.get('/resources', params={'stream': 1, 'cursor': cursor}).json() == listed[3:]
+
+def test_empty_streams_are_valid():
+    assert client.get('/resources', params={'stream': 1}).json() == []
+    assert client.get('/resources', headers=NDJSON).text == ''
+
+def test_failed_stream_is_detectable(monkeypatch):
+    add_resources([T0 + datetime.timedelta(minutes=i) for i in range(3)])
+    stream = main.storage.stream
+
+    async def failing(*args, **kwargs):
+        n = 0
+        async for doc in stream(*args, **kwargs):
+            if n == 2:
+                raise RuntimeError("backend went away")
+            n += 1
+            yield doc
+
+    monkeypatch.setattr(main.storage, 'stream', failing)
+    lines = [json.loads(line) for line in client.get('/resources', headers=NDJSON).text.splitlines()]
+    assert [line.get('id') for line in lines[:2]] == ['r2', 'r1']
+    assert lines[2:] == [{'error': 'Failed to retrieve resources'}]
+
+    text = client.get('/resources', params={'stream': 1}).text
+    assert text.startswith('[') and '"r1"' in text
+    with pytest.raises(ValueError): # The array is left unclosed
+        json.loads(text)
+
+# --- Conditional requests and invalidation ---
+def test_unchanged_page_revalidates_with_304():
+    add_resources([T0, T0 + datetime.timedelta(minutes=1)])
+    first = client.get('/resources')
+    etag = first.headers['etag']
+    assert first.headers['cache-control'] == 'no-cache'
+
+    for header in (etag, f'W/{etag}', f'"other", {etag}', '*'):
+        response = client.get('/resources', headers={'If-None-Match': header})
+        assert response.status_code == 304, header
+        assert response.content == b'' and response.headers['etag'] == etag
+    assert client.get('/resources', headers={'If-None-Match': '"other"'}).status_code == 200
+    # Each page has its own tag
+    assert client.get('/resources', params={'limit': 1}, headers={'If-None-Match': etag}).status_code == 200
+
+def test_write_invalidates_cached_pages_of_its_collection():
+    add_resources([T0])
+    etag = client.get('/resources').headers['etag']
+    other = client.get('/donations').headers['etag']
+
+    assert client.post('/resources', json={'name': 'Blankets', 'quantity': 3}).status_code == 201
+    response = client.get('/resources', headers={'If-None-Match': etag})
+    assert response.status_code == 200 and response.headers['etag'] != etag
+    assert [item['name'] for item in response.json()] == ['Blankets', 'Item 0']
+    # Other collections keep their cached pages
+    assert client.get('/donations', headers={'If-None-Match': other}).status_code == 304
+
+    etag = response.headers['etag']
+    response = client.post('/resources/bulk', content=b'{"name": "Tents", "quantity": 1}\n',
+                           headers={'Content-Type': 'application/x-ndjson'})
+    assert response.json()['status'] == 201
+    response = client.get('/resources', headers={'If-None-Match': etag})
+    assert response.status_code == 200 and len(response.json()) == 3
@@ -0,0 +1,191 @@
+# 3_basic_function_testing/test_api_matching.py
+# Offline endpoint tests for matching, on the in-memory storage backend.
+
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from api_app import add_volunteers, client, main, put, reset, volunteer
+from matching_ai import MATCH_PHASE_SECONDS
+
+
+@pytest.fixture(autouse=True)
+def volunteers():
+    reset()
+    add_volunteers({
+        'near-medic': volunteer(32.78, -96.80, 'Medical'),
+        'near-cook': volunteer(32.79, -96.81, 'Food'),
+        'far-medic': volunteer(40.71, -74.00, 'Medical'),
+    })
+    put('requests', '101', {'title': 'First aid', 'type': 'Medical', 'latitude': 32.78, 'longitude': -96.80})
+    put('requests', '102', {'title': 'Meals', 'type': 'Food', 'latitude': 32.78, 'longitude': -96.80})
+
+
+# --- POST /match/batch ---
+def test_batch_mixes_stored_inline_and_unknown_requests():
+    response = client.post('/match/batch', json={'k': 2, 'requests': [
+        '101',
+        {'id': '102', 'k': 1},
+        {'type': 'Medical', 'latitude': 40.7, 'longitude': -74.0},
+        {'id': 'inline-named', 'type': 'Food', 'latitude': 32.78, 'longitude': -96.80, 'k': 3},
+        'missing',
+    ]})
+    assert response.status_code == 200
+    results = response.json()['results']
+    assert set(results) == {'101', '102', 'inline-2', 'inline-named', 'missing'}
+    assert results['missing'] == {'error': 'Request not found'}
+    # Per-entry k overrides the batch default
+    assert [len(results[key]['matches']) for key in ('101', '102', 'inline-2', 'inline-named')] == [2, 1, 2, 3]
+    assert results['102']['matches'][0]['skills'] == ['Food']
+    assert results['inline-2']['matches'][0]['location'] == {'latitude': 40.71, 'longitude': -74.0}
+    assert all(match is not None for key in ('101', '102', 'inline-2') for match in results[key]['matches'])
+
+def test_batch_matches_agree_with_single_match():
+    single = client.get('/match/101').json()['matches']
+    batch = client.post('/match/batch', json={'requests': ['101']}).json()['results']['101']['matches']
+    assert batch == single
+
+def test_batch_size_limit():
+    too_many = ['101'] * (main.MAX_BATCH_MATCH_REQUESTS + 1)
+    response = client.post('/match/batch', json={'requests': too_many})
+    assert response.status_code == 400
+    assert 'At most' in response.json()['error']
+    assert client.post('/match/batch', json={'requests': too_many[:-1]}).status_code == 200
+
+@pytest.mark.parametrize('body, error', [
+    ([1, 2, 3], "Missing 'requests' list"), # A JSON list is not a batch
+    ('"101"', "Missing 'requests' list"),
+    ({'requests': []}, "Missing 'requests' list"),
+    ({'requests': '101'}, "Missing 'requests' list"),
+    ({'requests': [42]}, "Invalid entry at position 0"),
+    ({'requests': [{'k': 2}]}, "neither an id nor a request payload"),
+    ({'requests': ['101'], 'k': 0}, "'k' must be an integer"),
+    ({'requests': [{'id': '101', 'k': True}]}, "'k' must be an integer"),
+    ({'requests': ['101'], 'k': main.MAX_MATCH_K + 1}, "'k' must be an integer"),
+])
+def test_malformed_batches_are_rejected(body, error):
+    if isinstance(body, str):
+        response = client.post('/match/batch', content=body, headers={'Content-Type': 'application/json'})
+    else:
+        response = client.post('/match/batch', json=body)
+    assert response.status_code == 400
+    assert error in response.json()['error']
+
+def test_invalid_coordinates_fail_only_their_entry():
+    response = client.post('/match/batch', json={'requests': [
+        '101', {'id': 'bad', 'type': 'Medical', 'latitude': 'north', 'longitude': 0}]})
+    results = response.json()['results']
+    assert results['bad'] == {'error': 'Invalid latitude/longitude'}
+    assert len(results['101']['matches']) == 3
+
+def test_stored_coordinates_are_read_alike_by_single_and_batch_matching():
+    put('requests', 'no-lat', {'title': 'First aid', 'type': 'Medical', 'latitude': None, 'longitude': -96.80})
+    put('requests', 'zero-lat', {'title': 'First aid', 'type': 'Medical', 'latitude': 0, 'longitude': -96.80})
+    put('requests', 'no-location', {'title': 'First aid', 'type': 'Medical'})
+    put('requests', 'bad-lat', {'title': 'First aid', 'type': 'Medical', 'latitude': 'north', 'longitude': 0})
+    results = client.post('/match/batch', json={'requests': ['no-lat', 'zero-lat', 'no-location', 'bad-lat']}).json()['results']
+
+    # A null coordinate counts as 0.0, like a missing one
+    for request_id in ('no-lat', 'zero-lat', 'no-location'):
+        response = client.get(f'/match/{request_id}')
+        assert response.status_code == 200
+        assert results[request_id] == response.json()
+    assert results['no-lat'] == results['zero-lat']
+    assert client.get('/debug-match/no-lat').status_code == 200
+
+    assert results['bad-lat'] == {'error': 'Invalid latitude/longitude'}
+    for path in ('/match/bad-lat', '/debug-match/bad-lat'):
+        response = client.get(path)
+        assert response.status_code == 400 and response.json() == {'error': 'Invalid latitude/longitude'}
+
+# --- Phase metrics ---
+PHASES = ('fetch', 'extract', 'fit', 'scale', 'query', 'serialize')
+
+def phase_counts():
+    return {phase: MATCH_PHASE_SECONDS.totals(phase=phase)[0] for phase in PHASES}
+
+@pytest.mark.parametrize('method, path, body', [
+    ('GET', '/match/101', None),
+    ('POST', '/match/batch', {'requests': ['101', '102', {'type': 'Food', 'latitude': 40.7, 'longitude': -74.0}]}),
+])
+def test_each_phase_is_observed_once_per_match(method, path, body):
+    before = phase_counts()
+    assert client.request(method, path, json=body).status_code == 200
+    after = phase_counts()
+    observed = {phase: after[phase] - before[phase] for phase in PHASES}
+    # extract and fit are index builds (volunteer features), not per request
+    assert observed == {'fetch': 1, 'extract': 0, 'fit': 0, 'scale': 1, 'query': 1, 'serialize': 1}
+
+# --- Background matching (POST /requests) ---
+NEW_REQUEST = {'name': 'First aid', 'description': 'Sprained ankle', 'type': 'Medical', 'location': 'Dallas'}
+
+def wait_for_match(request_id, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        data = client.get(f'/requests/{request_id}').json()
+        if data['matchStatus'] != 'pending':
+            return data
+        time.sleep(0.02)
+    raise AssertionError(f"Request {request_id} still pending after {timeout}s")
+
+def test_new_request_is_matched_in_the_background():
+    response = client.post('/requests', json=NEW_REQUEST)
+    assert response.status_code == 201
+    created = response.json()
+    assert created['matchStatus'] == 'pending' and created['matches'] == []
+
+    done = wait_for_match(created['id'])
+    assert done['matchStatus'] == 'complete'
+    assert len(done['matches']) == 3 and done['matches'][0]['skills'] == ['Medical']
+    # The result is written back onto the stored request
+    stored = main.storage.get_sync('requests', created['id']).to_dict()
+    assert stored['matchStatus'] == 'complete' and stored['matches'] == done['matches']
+    assert stored['matchedAt'] is not None
+
+def test_failed_match_is_recorded(monkeypatch):
+    def broken(request_data, wait):
+        raise RuntimeError("index exploded")
+    monkeypatch.setattr(main, 'match_request_data', broken)
+    created = client.post('/requests', json=NEW_REQUEST).json()
+    done = wait_for_match(created['id'])
+    assert done['matchStatus'] == 'failed' and done['matchError'] == 'index exploded'
+    assert done['matches'] == []
+
+def test_match_queue_is_bounded(monkeypatch):
+    release = threading.Event()
+    match = main.match_request_data
+
+    def slow(request_data, wait):
+        release.wait(5)
+        return match(request_data, wait)
+
+    monkeypatch.setattr(main, 'match_request_data', slow)
+    monkeypatch.setattr(main, 'MATCH_QUEUE_MAX', 1)
+    first = client.post('/requests', json=NEW_REQUEST).json()
+    second = client.post('/requests', json=NEW_REQUEST).json()
+    try:
+        assert first['matchStatus'] == 'pending'
+        # The queue is full: the second request is stored as failed right away
+        assert second['matchStatus'] == 'failed' and 'queue is full' in second['matchError']
+        assert client.get(f"/requests/{second['id']}").json()['matchStatus'] == 'failed'
+        assert client.get(f"/requests/{first['id']}").json()['matchStatus'] == 'pending'
+    finally:
+        release.set()
+    assert wait_for_match(first['id'])['matchStatus'] == 'complete'
+    # A slot is free again once the job has finished
+    deadline = time.time() + 5
+    while main._match_tasks and time.time() < deadline:
+        time.sleep(0.01)
+    third = client.post('/requests', json=NEW_REQUEST).json()
+    assert third['matchStatus'] == 'pending'
+    assert wait_for_match(third['id'])['matchStatus'] == 'complete'
+
+def test_non_object_bodies_are_rejected_by_create_handlers():
+    for path in ('/resources', '/requests', '/donations'):
+        response = client.post(path, json=['not', 'an', 'object'])
+        assert response.status_code == 400, path
@@ -0,0 +1,182 @@
+# 3_basic_function_testing/test_api_routes.py
+# Offline endpoint tests pinning each route's status codes and response bytes, which
+# clients saw from the Flask app and must keep seeing from the FastAPI one.
+
+import datetime
+import email.utils
+import os
+import sys
+import types
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from api_app import add_volunteers, client, main, put, reset, volunteer
+
+T0 = datetime.datetime(2024, 5, 1, 12, 0, tzinfo=datetime.timezone.utc)
+T0_HTTP = 'Wed, 01 May 2024 12:00:00 GMT'
+MEDIC = b'{"availability":true,"location":{"latitude":32.78,"longitude":-96.8},"name":"Medical 32.78,-96.8","skills":["Medical"]}'
+
+
+def assert_body(response, status, body):
+    assert response.status_code == status, response.text
+    assert response.headers['content-type'] == 'application/json'
+    assert response.content == body
+
+def created_at(response):
+    """The createdAt of a create response, checked to be an HTTP date."""
+    value = response.json()['createdAt']
+    assert email.utils.parsedate_to_datetime(value).tzinfo is not None, value
+    return value
+
+@pytest.fixture(autouse=True)
+def store():
+    reset()
+    add_volunteers({'medic': volunteer(32.78, -96.80, 'Medical')})
+    put('requests', '101', {'title': 'First aid', 'description': 'Sprained ankle', 'type': 'Medical',
+                            'latitude': 32.78, 'longitude': -96.80, 'createdAt': T0})
+
+
+# --- Errors ---
+@pytest.mark.parametrize('path', ['/resources', '/requests', '/donations'])
+def test_bodies_that_are_not_json_objects(path):
+    assert_body(client.post(path, content=b'{"name": "x"}'), 415,
+                b'{"error":"Did not attempt to load JSON data because the request Content-Type was not \'application/json\'."}\n')
+    assert_body(client.post(path, content=b'{"name": ', headers={'Content-Type': 'application/json'}), 400,
+                b'{"error":"Failed to decode JSON object"}\n')
+    assert_body(client.post(path, json=['not', 'an', 'object']), 400, b'{"error":"Request body must be a JSON object"}\n')
+
+def test_unknown_routes_and_methods():
+    assert_body(client.get('/volunteers'), 404, b'{"error":"Not Found"}\n')
+    response = client.delete('/resources')
+    assert_body(response, 405, b'{"error":"Method Not Allowed"}\n')
+    assert 'allow' in response.headers # The exception's headers are kept
+
+@pytest.mark.parametrize('path', ['/resources', '/requests', '/donations', '/alerts'])
+def test_invalid_page_parameters(path):
+    assert_body(client.get(path, params={'limit': '0'}), 400, b'{"error":"\'limit\' must be at least 1"}\n')
+    assert_body(client.get(path, params={'cursor': 'x'}), 400, b'{"error":"Invalid cursor"}\n')
+
+# --- /signup, /signin ---
+class FakeAuth(types.SimpleNamespace):
+    """Stand-in for firebase_admin.auth with one existing user."""
+
+    class FirebaseAuthError(Exception):
+        code = 'INVALID_ARGUMENT'
+
+    class EmailAlreadyExistsError(FirebaseAuthError):
+        pass
+
+    class UserNotFoundError(FirebaseAuthError):
+        pass
+
+    def __init__(self):
+        super().__init__(users={'ann@example.com': types.SimpleNamespace(uid='u1', email='ann@example.com', display_name='Ann')})
+
+    def create_user(self, email, password, display_name):
+        if email in self.users:
+            raise self.EmailAlreadyExistsError(email)
+        if len(password) < 6:
+            raise self.FirebaseAuthError("weak password")
+        self.users[email] = types.SimpleNamespace(uid=f'u{len(self.users) + 1}', email=email, display_name=display_name)
+        return self.users[email]
+
+    def get_user_by_email(self, email):
+        if email not in self.users:
+            raise self.UserNotFoundError(email)
+        return self.users[email]
+
+@pytest.fixture
+def auth(monkeypatch):
+    fake = FakeAuth()
+    monkeypatch.setattr(main, 'AUTH_ENABLED', True)
+    monkeypatch.setattr(main, 'fb_auth', fake)
+    return fake
+
+def test_auth_without_firebase():
+    for path in ('/signup', '/signin'):
+        assert_body(client.post(path, json={'email': 'ann@example.com', 'password': 'secret'}), 503,
+                    b'{"error":"Authentication needs Firebase (STORAGE_BACKEND=firestore)"}\n')
+
+def test_signup(auth):
+    assert_body(client.post('/signup', json={'email': 'bob@example.com', 'password': 'secret', 'name': 'Bob'}), 201,
+                b'{"email":"bob@example.com","message":"User created successfully","name":"Bob","uid":"u2","userType":"donor"}\n')
+    assert main.storage.get_sync('users', 'u2').to_dict()['name'] == 'Bob'
+    assert_body(client.post('/signup', json={'email': 'ann@example.com', 'password': 'secret', 'name': 'Ann'}), 409,
+                b'{"error":"Email already exists: ann@example.com"}\n')
+    assert_body(client.post('/signup', json={'email': 'cy@example.com', 'password': 'x', 'name': 'Cy'}), 400,
+                b'{"error":"Firebase signup failed: INVALID_ARGUMENT"}\n')
+    assert_body(client.post('/signup', json={'email': 'cy@example.com', 'password': 'secret'}), 400,
+                b'{"error":"Missing email, password, or name"}\n')
+    assert_body(client.post('/signup', json=[]), 400, b'{"error":"Request body must be a JSON object"}\n')
+
+def test_signin(auth):
+    assert_body(client.post('/signin', json={'email': 'ann@example.com', 'password': 'secret'}), 200,
+                b'{"email":"ann@example.com","message":"Sign in successful (profile missing, password not verified)",'
+                b'"name":"Ann","uid":"u1","userType":"donor"}\n')
+    put('users', 'u1', {'uid': 'u1', 'email': 'ann@example.com', 'name': 'Ann B.', 'userType': 'volunteer'})
+    assert_body(client.post('/signin', json={'email': 'ann@example.com', 'password': 'secret'}), 200,
+                b'{"email":"ann@example.com","message":"Sign in successful (password not verified by backend)",'
+                b'"name":"Ann B.","uid":"u1","userType":"volunteer"}\n')
+    assert_body(client.post('/signin', json={'email': 'bob@example.com', 'password': 'secret'}), 404,
+                b'{"error":"User not found for this email"}\n')
+    assert_body(client.post('/signin', json={'email': 'ann@example.com'}), 400, b'{"error":"Missing email or password"}\n')
+
+# --- /resources, /requests, /donations, /alerts ---
+def test_resources():
+    put('resources', 'r1', {'name': 'Cots', 'quantity': 5, 'createdAt': T0})
+    assert_body(client.get('/resources'), 200, f'[{{"createdAt":"{T0_HTTP}","id":"r1","name":"Cots","quantity":5}}]\n'.encode())
+
+    response = client.post('/resources', json={'name': 'Tents', 'quantity': 0, 'category': 'Shelter'})
+    assert_body(response, 201, (f'{{"category":"Shelter","createdAt":"{created_at(response)}","description":null,'
+                                f'"id":"{response.json()["id"]}","name":"Tents","quantity":0}}\n').encode())
+    assert_body(client.post('/resources', json={'name': 'Tents'}), 400,
+                b'{"error":"Missing required resource data (name, quantity)"}\n')
+
+def test_requests():
+    assert_body(client.get('/requests'), 200,
+                f'[{{"createdAt":"{T0_HTTP}","description":"Sprained ankle","id":"101","latitude":32.78,'
+                f'"longitude":-96.8,"name":"First aid","type":"Medical"}}]\n'.encode())
+
+    response = client.post('/requests', json={'name': 'Meals', 'description': 'Family of four', 'type': 'Food'})
+    assert_body(response, 201, (f'{{"contact_email":null,"createdAt":"{created_at(response)}","description":"Family of four",'
+                                f'"id":"{response.json()["id"]}","location":null,"matchStatus":"pending","matches":[],'
+                                f'"name":"Meals","required_skills":[],"status":"open","type":"Food","urgency":null}}\n').encode())
+    assert_body(client.post('/requests', json={'name': 'Meals', 'type': 'Food'}), 400,
+                b'{"error":"Missing required request data (name, description, type)"}\n')
+    assert_body(client.get('/requests/999'), 404, b'{"error":"Request not found"}\n')
+
+def test_donations():
+    put('donations', 'd1', {'itemDescription': 'Canned food', 'quantity': 4, 'estimatedValue': 20.0,
+                            'donation_type': 'non-monetary', 'createdAt': T0})
+    assert_body(client.get('/donations'), 200,
+                b'[{"detail":"Qty: 4, Value: $20.0","id":"d1","name":"Canned food","type":"non-monetary"}]\n')
+
+    response = client.post('/donations', json={'name': 'Blankets', 'detail': 'qty: 12'})
+    assert_body(response, 201, (f'{{"detail":"Qty: 12, Value: $None","id":"{response.json()["id"]}",'
+                                f'"name":"Blankets","type":"non-monetary"}}\n').encode())
+    assert_body(client.post('/donations', json={'detail': 'qty: 12'}), 400,
+                b'{"error":"Missing required donation data (name)"}\n')
+
+def test_alerts():
+    assert_body(client.get('/alerts'), 200, b'[]\n')
+    put('alerts', 'a1', {'title': 'Flood warning', 'message': 'Move to higher ground', 'createdAt': T0})
+    main.response_cache.invalidate('alerts') # put bypasses the API
+    assert_body(client.get('/alerts'), 200,
+                f'[{{"createdAt":"{T0_HTTP}","id":"a1","message":"Move to higher ground","title":"Flood warning"}}]\n'.encode())
+
+# --- /match/<id>, /debug-match/<id> ---
+def test_match():
+    assert_body(client.get('/match/101'), 200, b'{"matches":[' + MEDIC + b']}\n')
+    assert_body(client.get('/match/999'), 404, b'{"error":"Request not found"}\n')
+
+def test_debug_match():
+    response = client.get('/debug-match/101')
+    data = response.json()
+    # Everything but the timings is deterministic; the encoding is Flask's either way
+    assert_body(response, 200, main.dumps(data).encode() + b'\n')
+    assert set(data['timings_seconds']) >= {'fetch', 'extract', 'scale', 'fit', 'query'}
+    assert data['distances'] == [1.0] and data['indices'] == [0]
+    assert main.dumps(data['matched_volunteers']).encode() == b'[' + MEDIC + b']'
+    assert_body(client.get('/debug-match/999'), 404, b'{"error":"Request not found"}\n')
@@ -0,0 +1,44 @@
+# 3_basic_function_testing/test_bench_matching.py
+# Offline tests for the matching benchmark harness (a tiny sweep, not a benchmark run).
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import bench_matching
+
+
+def test_sweep_reports_every_phase(tmp_path):
+    rows = []
+    results = bench_matching.run_benchmarks([50, 120], [1, 4], k=3, repeat=1, report=rows.append)
+    assert rows == results
+    build_phases = {'features', 'scaler_fit', 'nn_fit', 'index_build'}
+    query_phases = {'request_features', 'nn_kneighbors', 'index_kneighbors', 'index_kneighbors_geo'}
+    assert len(results) == 2 * (len(build_phases) + 2 * len(query_phases))
+    assert {row['phase'] for row in results if row['batch'] is None} == build_phases
+    assert {(row['volunteers'], row['batch']) for row in results if row['phase'] == 'nn_kneighbors'} == \
+        {(50, 1), (50, 4), (120, 1), (120, 4)}
+    assert all(row['seconds'] > 0 and row['peak_mib'] >= 0 for row in results)
+
+    path = str(tmp_path / 'run.json')
+    bench_matching.save_results(path, results, {'k': 3})
+    stored = bench_matching.load_results(path)
+    assert stored['results'] == results and stored['environment']['numpy']
+
+def test_compare_flags_only_real_slowdowns():
+    baseline = [
+        {'phase': 'features', 'volunteers': 1000, 'batch': None, 'seconds': 0.100, 'peak_mib': 1.0},
+        {'phase': 'index_kneighbors', 'volunteers': 1000, 'batch': 16, 'seconds': 0.0010, 'peak_mib': 0.1},
+        {'phase': 'nn_fit', 'volunteers': 1000, 'batch': None, 'seconds': 0.050, 'peak_mib': 0.1},
+    ]
+    results = [
+        dict(baseline[0], seconds=0.150), # 50% slower: a regression
+        dict(baseline[1], seconds=0.0020), # Twice as slow, but within the noise floor
+        dict(baseline[2], seconds=0.055), # Within the tolerance
+        {'phase': 'nn_fit', 'volunteers': 5000, 'batch': None, 'seconds': 1.0, 'peak_mib': 1.0}, # Not in the baseline
+    ]
+    comparisons, regressions = bench_matching.compare(results, baseline, tolerance=0.25)
+    assert len(comparisons) == 3
+    assert [entry['phase'] for entry in regressions] == ['features']
+    assert abs(regressions[0]['ratio'] - 1.5) < 1e-9
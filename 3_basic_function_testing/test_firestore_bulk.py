@@ -0,0 +1,205 @@
+# 3_basic_function_testing/test_firestore_bulk.py
+# Offline tests for the streamed JSON reader and chunked parallel writer used by populate_database.py.
+
+import json
+import os
+import sys
+import threading
+import time
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '2_data_collection')
+sys.path.insert(0, os.path.abspath(DATA_DIR))
+
+from google.api_core import exceptions as google_exceptions
+
+from firestore_bulk import ChunkedWriter, delete_collection, iter_json_items
+
+
+class FakeBatch:
+    def __init__(self, db):
+        self.db = db
+        self.writes = []
+
+    def set(self, ref, data, merge=False):
+        self.writes.append(('set', ref, data))
+
+    def delete(self, ref):
+        self.writes.append(('delete', ref, None))
+        if self.db.fail_deletes_of == ref.id:
+            raise google_exceptions.InvalidArgument('cannot delete')
+
+    def commit(self):
+        with self.db.lock:
+            self.db.batch_sizes.append(len(self.writes))
+            if self.db.failures:
+                raise self.db.failures.pop(0)
+            for op, ref, data in self.writes:
+                if op == 'set':
+                    self.db.docs[ref] = data
+                else:
+                    ref.collection.docs.pop(ref.id, None)
+
+class FakeDB:
+    def __init__(self, failures=()):
+        self.docs = {}
+        self.batch_sizes = []
+        self.failures = list(failures) # Exceptions raised by the next commits, in order
+        self.fail_deletes_of = None # Document id whose delete fails (until reset)
+        self.lock = threading.Lock()
+
+    def batch(self):
+        return FakeBatch(self)
+
+class FakeDocRef:
+    def __init__(self, collection, doc_id):
+        self.collection = collection
+        self.id = doc_id
+        self.path = f"{collection.path}/{doc_id}"
+
+    def collections(self):
+        return [sub for sub in self.collection.subcollections.get(self.id, []) if sub.docs]
+
+class FakeSnapshot:
+    def __init__(self, ref):
+        self.id = ref.id
+        self.reference = ref
+
+class FakeQuery:
+    def __init__(self, collection):
+        self.collection = collection
+        self.after = None
+        self.n = None
+
+    def order_by(self, field):
+        assert field == '__name__'
+        return self
+
+    def limit(self, n):
+        self.n = n
+        return self
+
+    def start_after(self, values):
+        self.after = values['__name__']
+        return self
+
+    def stream(self):
+        self.collection.pages_read += 1
+        ids = sorted(doc_id for doc_id in self.collection.docs if self.after is None or doc_id > self.after)
+        return [FakeSnapshot(FakeDocRef(self.collection, doc_id)) for doc_id in ids[:self.n]]
+
+class FakeCollection:
+    def __init__(self, coll_id, ids, parent=None):
+        self.id = coll_id
+        self.parent = parent
+        self.path = f"{parent.path}/{coll_id}" if parent else coll_id
+        self.docs = {doc_id: {'n': doc_id} for doc_id in ids}
+        self.subcollections = {}
+        self.pages_read = 0
+
+    def select(self, fields):
+        assert fields == [] # Only document names are read
+        return FakeQuery(self)
+
+
+def test_json_array_is_read_item_by_item(tmp_path):
+    items = [{'name': f'item {i}', 'quantity': i * 1001, 'tags': ['a', 'b'] * i} for i in range(50)]
+    path = tmp_path / 'items.json'
+    path.write_text(json.dumps(items, indent=2))
+    # A tiny read size splits items (and numbers) across reads
+    assert list(iter_json_items(path, read_size=7)) == items
+
+def test_ndjson_and_bare_values_are_read(tmp_path):
+    path = tmp_path / 'items.ndjson'
+    path.write_text('{"a": 1}\n\n{"a": 2}\n12345\n')
+    assert list(iter_json_items(path, read_size=4)) == [{'a': 1}, {'a': 2}, 12345]
+
+def test_malformed_json_raises_after_the_good_items(tmp_path):
+    path = tmp_path / 'broken.json'
+    path.write_text('[{"a": 1}, {"a": ]')
+    items = iter_json_items(path)
+    assert next(items) == {'a': 1}
+    try:
+        next(items)
+        assert False, "expected a JSONDecodeError"
+    except json.JSONDecodeError:
+        pass
+
+def test_writes_are_committed_in_bounded_chunks():
+    db = FakeDB()
+    with ChunkedWriter(db, chunk_size=100, workers=4, report_every=60) as writer:
+        for i in range(1050):
+            writer.set(f'doc{i}', {'n': i})
+    assert writer.written == 1050 and writer.failed == 0
+    assert len(db.docs) == 1050 and max(db.batch_sizes) == 100
+
+def test_transient_errors_are_retried_and_permanent_ones_counted():
+    db = FakeDB(failures=[google_exceptions.ServiceUnavailable('busy'), google_exceptions.InvalidArgument('bad')])
+    writer = ChunkedWriter(db, chunk_size=10, workers=1, backoff=0.001, report_every=60)
+    for i in range(20):
+        writer.set(f'doc{i}', {'n': i})
+    writer.close()
+    assert writer.retries == 1
+    assert writer.failed == 10 and writer.written == 10
+    assert len(db.docs) == 10
+
+def test_collection_and_subcollections_are_deleted_in_pages(tmp_path):
+    db = FakeDB()
+    users = FakeCollection('users', [f'u{i:03}' for i in range(250)])
+    notes = FakeCollection('notes', ['n1', 'n2'], parent=FakeDocRef(users, 'u007'))
+    users.subcollections['u007'] = [notes]
+    checkpoint = tmp_path / 'checkpoint.json'
+    deleted = delete_collection(db, users, page_size=100, workers=2, recursive=True,
+                                checkpoint_path=str(checkpoint), report_every=60)
+    assert deleted == 252
+    assert not users.docs and not notes.docs
+    assert users.pages_read == 4 # 3 pages and the empty one that ends the scan
+    assert not checkpoint.exists()
+
+def test_commit_callbacks_wait_for_every_earlier_commit():
+    release = threading.Event()
+
+    class SlowFirstBatch(FakeBatch):
+        def commit(self):
+            if self.writes[0][1] == 'doc0':
+                release.wait(5)
+            super().commit()
+
+    db = FakeDB()
+    db.batch = lambda: SlowFirstBatch(db)
+    done = []
+    writer = ChunkedWriter(db, chunk_size=10, workers=2, report_every=60)
+    for i in range(25):
+        writer.set(f'doc{i}', {'n': i})
+        if i % 10 == 4:
+            writer.after_commit(lambda i=i: done.append(i))
+    # The second chunk can commit first, but nothing is reported past the stalled one
+    while len(db.batch_sizes) < 1:
+        time.sleep(0.01)
+    assert done == []
+    release.set()
+    writer.close()
+    assert done == [4, 14, 24]
+    writer.after_commit(lambda: done.append('now'))
+    assert done[-1] == 'now'
+
+def test_interrupted_delete_resumes_after_the_checkpoint(tmp_path):
+    db = FakeDB()
+    users = FakeCollection('users', [f'u{i:04}' for i in range(1200)])
+    checkpoint = tmp_path / 'checkpoint.json'
+    # Its chunk (u0500-u0999) fails, so the checkpoint stays at the last page before it
+    # even though the chunk after it commits
+    db.fail_deletes_of = 'u0750'
+    delete_collection(db, users, page_size=100, workers=2, max_retries=0, checkpoint_path=str(checkpoint),
+                      report_every=60)
+    assert 'u0750' in users.docs and 'u1100' not in users.docs
+    assert json.loads(checkpoint.read_text()) == {'users': 'u0499'}
+
+    db.fail_deletes_of = None
+    remaining = len(users.docs)
+    users.pages_read = 0
+    deleted = delete_collection(db, users, page_size=100, workers=2, checkpoint_path=str(checkpoint),
+                                report_every=60)
+    assert deleted == remaining == 500 and not users.docs
+    # The pages after the checkpoint and the empty one that ends them, then the (empty) sweep
+    assert users.pages_read == 5 + 1 + 1
+    assert not checkpoint.exists()
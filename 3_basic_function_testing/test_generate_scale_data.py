@@ -0,0 +1,78 @@
+# 3_basic_function_testing/test_generate_scale_data.py
+# Offline tests for the synthetic scale-data generator.
+
+import collections
+import json
+import os
+import sys
+
+import numpy as np
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '2_data_collection')
+sys.path.insert(0, os.path.abspath(DATA_DIR))
+
+import generate_scale_data as gen
+from storage import MemoryStorage
+from matching_ai import KNOWN_SKILLS, extract_features_requests, extract_features_volunteers, haversine_km
+
+
+def test_same_seed_gives_the_same_data():
+    first_volunteers, first_requests = gen.generate(500, 100, seed=7)
+    second_volunteers, second_requests = gen.generate(500, 100, seed=7)
+    other_volunteers, _ = gen.generate(500, 100, seed=8)
+    assert np.array_equal(first_volunteers['latitude'], second_volunteers['latitude'])
+    assert first_volunteers['skills'] == second_volunteers['skills']
+    assert list(first_requests['type']) == list(second_requests['type'])
+    assert not np.array_equal(first_volunteers['latitude'], other_volunteers['latitude'])
+    # Asking for more requests leaves the volunteers unchanged
+    more_requests_volunteers, _ = gen.generate(500, 300, seed=7)
+    assert np.array_equal(first_volunteers['longitude'], more_requests_volunteers['longitude'])
+
+def test_distributions():
+    volunteers, requests = gen.generate(20000, 5000, seed=1, n_sites=4, availability_ratio=0.25)
+    assert abs(volunteers['availability'].mean() - 0.25) < 0.02
+    counts = collections.Counter(skill for skills in volunteers['skills'] for skill in skills)
+    assert counts.most_common(1)[0][0] == KNOWN_SKILLS[0] # Skewed towards the first skills
+    assert counts[KNOWN_SKILLS[0]] > 3 * counts[KNOWN_SKILLS[-1]]
+    assert all(len(set(skills)) == len(skills) >= 1 for skills in volunteers['skills'][:1000])
+
+    # Requests cluster around the disaster sites
+    sites = gen.make_sites(gen._rngs(1)[0], 4)
+    distances = haversine_km(requests['latitude'][:, None], requests['longitude'][:, None],
+                             sites['latitude'][None, :], sites['longitude'][None, :]).min(axis=1)
+    assert np.median(distances) < 30
+
+    # Timestamps fall within the incident, front-loaded for requests
+    start = gen.DEFAULT_START.timestamp()
+    assert volunteers['created_at'].min() >= start and requests['created_at'].max() <= start + 72 * 3600
+    assert np.median(requests['created_at']) - start < 36 * 3600
+
+def test_npz_round_trip_feeds_the_feature_extractors(tmp_path):
+    volunteers, requests = gen.generate(300, 50, seed=3)
+    gen.write_npz(tmp_path / 'volunteers.npz', volunteers, 'skills')
+    gen.write_npz(tmp_path / 'requests.npz', requests, 'required_skills')
+    loaded_volunteers = gen.load_columns(tmp_path / 'volunteers.npz')
+    loaded_requests = gen.load_columns(tmp_path / 'requests.npz')
+    assert loaded_volunteers['skills'] == volunteers['skills']
+    assert loaded_requests['required_skills'] == requests['required_skills']
+
+    X, valid = extract_features_volunteers(loaded_volunteers)
+    assert X.shape[0] == 300 and len(valid) == 300
+    assert extract_features_requests(loaded_requests).shape[0] == 50
+
+def test_ndjson_records_have_the_firestore_shape(tmp_path):
+    volunteers, requests = gen.generate(20, 10, seed=4)
+    path = tmp_path / 'volunteers.ndjson'
+    assert gen.write_ndjson(path, gen.volunteer_records(volunteers)) == 20
+    first = json.loads(path.read_text().splitlines()[0])
+    assert set(first['location']) == {'latitude', 'longitude'} and isinstance(first['availability'], bool)
+    request = next(gen.request_records(requests))
+    assert request['type'] in KNOWN_SKILLS and 'latitude' in request and 'createdAt' in request
+
+def test_documents_load_into_a_storage():
+    volunteers, requests = gen.generate(30, 12, seed=5)
+    storage = MemoryStorage()
+    gen.write_storage(storage, volunteers, requests, version='synthetic:5:30', chunk_size=7)
+    assert storage.count_sync('volunteers') == 30 and storage.count_sync('requests') == 12
+    assert storage.get_sync('meta', 'volunteers').to_dict() == {'version': 'synthetic:5:30'}
+    assert isinstance(storage.get_sync('requests', 'req-0000000').to_dict()['createdAt'], gen.datetime.datetime)
@@ -0,0 +1,149 @@
+# 3_basic_function_testing/test_geocoding.py
+# Offline tests for the geocoding layer, against a local stand-in geocoder.
+
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'code_1', 'backend')
+sys.path.insert(0, os.path.abspath(BACKEND_DIR))
+
+import matching_ai
+from geocoding import GeocodeCache, Geocoder, NOT_FOUND
+
+
+class Location:
+    def __init__(self, latitude, longitude):
+        self.latitude = latitude
+        self.longitude = longitude
+
+
+class FakeGeocoder:
+    """Resolves addresses from a dict, recording every call; optionally slow or failing."""
+
+    def __init__(self, places, delay=0.0, fail=()):
+        self.places = places
+        self.delay = delay
+        self.fail = set(fail)
+        self.calls = []
+        self.call_times = []
+
+    def geocode(self, address, timeout=None):
+        self.calls.append(address)
+        self.call_times.append(time.monotonic())
+        time.sleep(self.delay)
+        if address in self.fail:
+            raise RuntimeError("service unavailable")
+        place = self.places.get(address)
+        return Location(*place) if place else None
+
+
+PLACES = {'Plano, TX': (33.02, -96.70), 'Dallas, TX': (32.78, -96.80), 'Austin, TX': (30.27, -97.74)}
+
+
+def test_results_are_cached_on_disk_across_instances(tmp_path):
+    path = str(tmp_path / 'geocode.sqlite3')
+    fake = FakeGeocoder(PLACES)
+    assert Geocoder(fake, cache_path=path, min_interval=0).geocode('Plano, TX') == (33.02, -96.70)
+    again = Geocoder(fake, cache_path=path, min_interval=0)
+    assert again.geocode('  plano,   tx ') == (33.02, -96.70) # Case/whitespace-insensitive key
+    assert fake.calls == ['Plano, TX']
+
+def test_failed_lookups_are_negatively_cached_until_they_expire():
+    fake = FakeGeocoder(PLACES, fail={'Broken'})
+    geocoder = Geocoder(fake, min_interval=0, negative_ttl=60, error_ttl=0.05)
+    assert geocoder.geocode('Nowhere') is None
+    assert geocoder.geocode('Nowhere') is None
+    assert geocoder.geocode('Broken') is None
+    time.sleep(0.1)
+    assert geocoder.geocode('Broken') is None
+    assert fake.calls == ['Nowhere', 'Broken', 'Broken']
+
+def test_concurrent_identical_lookups_share_one_provider_call():
+    fake = FakeGeocoder(PLACES, delay=0.1)
+    geocoder = Geocoder(fake, min_interval=0)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(geocoder.geocode('Dallas, TX'))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [(32.78, -96.80)] * 8
+    assert fake.calls == ['Dallas, TX']
+
+def test_batch_lookups_are_rate_limited():
+    fake = FakeGeocoder(PLACES)
+    geocoder = Geocoder(fake, min_interval=0.05)
+    results = geocoder.geocode_many(['Plano, TX', 'Dallas, TX', 'Austin, TX', 'Plano, TX', 'Nowhere'])
+    assert results == {'Plano, TX': (33.02, -96.70), 'Dallas, TX': (32.78, -96.80),
+                       'Austin, TX': (30.27, -97.74), 'Nowhere': None}
+    assert len(fake.calls) == 4
+    gaps = [b - a for a, b in zip(fake.call_times, fake.call_times[1:])]
+    assert min(gaps) >= 0.045
+
+def test_slow_lookup_times_out_but_still_fills_the_cache():
+    fake = FakeGeocoder(PLACES, delay=0.2)
+    geocoder = Geocoder(fake, min_interval=0)
+    assert geocoder.geocode('Austin, TX', timeout=0.01) is None
+    time.sleep(0.3)
+    assert geocoder.geocode('Austin, TX', timeout=0.01) == (30.27, -97.74)
+    assert len(fake.calls) == 1
+
+def test_cache_evicts_least_recently_used():
+    cache = GeocodeCache(':memory:', max_entries=2)
+    cache.put('a', (1.0, 1.0))
+    time.sleep(0.01)
+    cache.put('b', NOT_FOUND)
+    time.sleep(0.01)
+    assert cache.get('a') == (1.0, 1.0) # 'a' is now more recently used than 'b'
+    time.sleep(0.01)
+    cache.put('c', (3.0, 3.0))
+    assert len(cache) == 2
+    assert cache.get('b') is None and cache.get('a') == (1.0, 1.0)
+
+def test_cache_hits_do_not_write(tmp_path):
+    cache = GeocodeCache(str(tmp_path / 'cache.sqlite3'), max_entries=2)
+    cache.put('a', (1.0, 1.0))
+    cache.put('b', (2.0, 2.0))
+    conn = cache._connect()
+    changes = conn.total_changes
+    for _ in range(100):
+        assert cache.get('a') == (1.0, 1.0)
+    assert conn.total_changes == changes and not conn.in_transaction
+
+    # The use times are written by the next put (so 'b' is evicted) or by flush()
+    cache.put('c', (3.0, 3.0))
+    assert cache.get('b') is None and cache.get('a') == (1.0, 1.0)
+    used = conn.execute("SELECT used FROM geocode WHERE address = 'a'").fetchone()[0]
+    time.sleep(0.01)
+    cache.flush()
+    assert conn.execute("SELECT used FROM geocode WHERE address = 'a'").fetchone()[0] > used
+
+@pytest.mark.parametrize('address', [None, '', '   ', 42])
+def test_invalid_addresses_do_not_reach_the_provider(address):
+    fake = FakeGeocoder(PLACES)
+    assert Geocoder(fake, min_interval=0).geocode(address) is None
+    assert fake.calls == []
+
+# --- matching_ai's shared geocoder ---
+def test_shared_geocoder_is_created_on_first_use(monkeypatch, tmp_path):
+    monkeypatch.setattr(matching_ai, '_geocoder', None)
+    monkeypatch.setenv('GEOCODE_CACHE_PATH', str(tmp_path / 'geocode.sqlite3'))
+    matching_ai.flush_geocoder() # Nothing to flush yet
+    assert matching_ai._geocoder is None
+    geocoder = matching_ai.get_geocoder()
+    assert matching_ai.get_geocoder() is geocoder
+    assert geocoder.cache.path == str(tmp_path / 'geocode.sqlite3')
+    assert not os.listdir(tmp_path) # The cache file only appears with the first lookup
+
+def test_default_cache_path_is_outside_the_repo(monkeypatch, tmp_path):
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    assert not os.path.abspath(matching_ai.DEFAULT_GEOCODE_CACHE_PATH).startswith(os.path.join(repo, ''))
+    # It is used when GEOCODE_CACHE_PATH is not set
+    monkeypatch.setattr(matching_ai, '_geocoder', None)
+    monkeypatch.delenv('GEOCODE_CACHE_PATH')
+    monkeypatch.setattr(matching_ai, 'DEFAULT_GEOCODE_CACHE_PATH', str(tmp_path / 'cache.sqlite3'))
+    assert matching_ai.get_geocoder().cache.path == str(tmp_path / 'cache.sqlite3')
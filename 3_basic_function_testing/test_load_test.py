@@ -0,0 +1,74 @@
+# 3_basic_function_testing/test_load_test.py
+# Offline tests for the load generator, run against a small in-process ASGI app.
+
+import asyncio
+import json
+import os
+import sys
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import load_test
+
+
+async def fake_app(scope, receive, send):
+    """Answers like the backend: 201 with an id for POST /requests, 304 on a matching ETag, 500 on /match/boom."""
+    if scope['type'] != 'http':
+        return
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            break
+    headers = dict(scope['headers'])
+    await asyncio.sleep(0.001)
+    if scope['method'] == 'POST' and scope['path'] == '/requests':
+        status, payload = 201, {'id': f"new-{len(body)}"}
+    elif scope['path'] == '/match/boom':
+        status, payload = 500, {'error': 'Failed'}
+    elif headers.get(b'if-none-match') == b'"v1"':
+        status, payload = 304, None
+    else:
+        status, payload = 200, {'ok': True}
+    content = json.dumps(payload).encode() if payload is not None else b''
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'application/json'), (b'etag', b'"v1"')]})
+    await send({'type': 'http.response.body', 'body': content})
+
+def run(profile, request_ids=('r1', 'r2'), **kwargs):
+    async def go():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=fake_app), base_url='http://test') as client:
+            return await load_test.run_load(client, profile, list(request_ids), **kwargs)
+    return asyncio.run(go())
+
+
+def test_closed_loop_reports_each_route():
+    stats, elapsed = run('mixed', duration=0.3, concurrency=4)
+    summary = stats.summary(elapsed)
+    assert set(summary) - {'ALL'} <= {'GET /alerts', 'GET /match/{id}', 'GET /requests', 'GET /requests/{id}',
+                                      'GET /resources', 'POST /match/batch', 'POST /requests'}
+    total = summary['ALL']
+    assert total['requests'] == sum(row['requests'] for route, row in summary.items() if route != 'ALL')
+    assert total['error_rate'] == 0.0 and total['throughput'] > 0
+    assert total['p50_ms'] <= total['p95_ms'] <= total['p99_ms'] <= total['max_ms']
+    # Polling clients revalidate with the ETag they were given
+    assert summary['GET /alerts']['statuses'].get('304', 0) > 0
+
+def test_errors_are_counted_per_route():
+    boom = lambda w: load_test.Call('GET /match/{id}', 'GET', '/match/boom', {}, None)
+    stats, elapsed = run([(1, boom), (1, load_test.list_requests)], duration=0.2, concurrency=2)
+    summary = stats.summary(elapsed)
+    assert summary['GET /match/{id}']['error_rate'] == 1.0
+    assert summary['GET /requests']['error_rate'] == 0.0
+    assert 0.0 < summary['ALL']['error_rate'] < 1.0
+
+def test_open_loop_follows_the_arrival_rate():
+    stats, elapsed = run('surge', duration=0.5, rate=200, concurrency=50, warmup=0.1)
+    calls = stats.summary(elapsed)['ALL']['requests']
+    assert 40 < calls < 200 # About 100 arrivals expected in the measured half second
+    # Created requests are polled by the surge profile
+    polled = stats.statuses['GET /requests/{id}']
+    assert sum(polled.values()) > 0
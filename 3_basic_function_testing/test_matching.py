@@ -8,6 +8,7 @@ import json
 import requests
 import pytest
 import traceback
+import time
 
 # --- Configuration ---
 BASE_URL = "http://localhost:8001" # Backend server URL
@@ -46,7 +47,7 @@ def validate_volunteer_dict(vol_dict):
     pytest.param("/match", "101", 200, id="match_success_101"),
     pytest.param("/match", "102", 200, id="match_success_102"),
     pytest.param("/match", "999", 404, id="match_not_found_999"), # Expecting 404 specifically
-    pytest.param("/debug-match", "101", 200, id="debug_success_101", marks=pytest.mark.xfail(reason="Known bug in main.py's debug_match_route prevents success")), # Marked as expected fail due to bug
+    pytest.param("/debug-match", "101", 200, id="debug_success_101"),
     pytest.param("/debug-match", "999", 404, id="debug_not_found_999"), # Expecting 404 specifically
 ])
 def test_match_endpoints(endpoint, request_id, expected_status):
@@ -137,11 +138,9 @@ def test_match_endpoints(endpoint, request_id, expected_status):
         pytest.fail(f"An unexpected error occurred during test for {url}: {e}\nStatus: {status}\nResponse Text: {text}\n{traceback.format_exc()}")
 
 
-@pytest.mark.xfail(reason="Known bug in main.py's debug_match_route prevents success") # Mark as expected fail
 def test_consistency_between_endpoints():
     """
     Tests if /match and /debug-match return the same volunteers for the same request.
-    NOTE: This test WILL FAIL until the bug in main.py's debug_match_route is fixed.
     """
     request_id = "101" # Use a known valid request ID
     match_url = f"{BASE_URL}/match/{request_id}"
@@ -182,4 +181,158 @@ def test_consistency_between_endpoints():
     except AssertionError: # Re-raise assertion errors
         raise
     except Exception as e:
-        pytest.fail(f"An unexpected error occurred during consistency test for ID {request_id}: {e}\n{traceback.format_exc()}")
\ No newline at end of file
+        pytest.fail(f"An unexpected error occurred during consistency test for ID {request_id}: {e}\n{traceback.format_exc()}")
+
+# --- Background Matching (POST /requests, GET /requests/<id>) ---
+NEW_REQUEST = {"name": "Live test: first aid", "description": "Sprained ankle", "type": "Medical", "location": "Dallas, TX"}
+
+def wait_for_match(request_id, timeout=REQUEST_TIMEOUT):
+    """Poll GET /requests/<id> until its background match has finished (or timeout); returns the request."""
+    url = f"{BASE_URL}/requests/{request_id}"
+    deadline = time.time() + timeout
+    while True:
+        response = requests.get(url, timeout=REQUEST_TIMEOUT)
+        assert response.status_code == 200, f"URL: {url}\nStatus {response.status_code}, Text: {response.text[:500]}"
+        data = response.json()
+        if data.get("matchStatus") != "pending" or time.time() > deadline:
+            return data
+        time.sleep(0.2)
+
+def test_new_request_is_matched_in_the_background():
+    """
+    POST /requests returns without waiting for matching; the match result is
+    written back onto the request and shows up on GET /requests/<id>.
+    """
+    response = requests.post(f"{BASE_URL}/requests", json=NEW_REQUEST, timeout=REQUEST_TIMEOUT)
+    assert response.status_code == 201, f"POST /requests failed: Status {response.status_code}, Text: {response.text[:500]}"
+    created = response.json()
+    assert created.get("matchStatus") in ("pending", "complete"), f"Unexpected matchStatus on creation: {created}"
+
+    data = wait_for_match(created["id"])
+    assert data["matchStatus"] == "complete", f"Request {created['id']} was not matched: {data}"
+    assert data["name"] == NEW_REQUEST["name"]
+    assert isinstance(data["matches"], list), f"'matches' should be a list, got {type(data['matches'])}"
+    for i, volunteer in enumerate(data["matches"]):
+        try:
+            validate_volunteer_dict(volunteer)
+        except AssertionError as e:
+            pytest.fail(f"Validation failed for stored match at index {i}: {e}\nVolunteer data: {volunteer}")
+    print(f"\n✅ Request {created['id']} was matched in the background with {len(data['matches'])} matches.")
+
+def test_unknown_request_status_is_404():
+    response = requests.get(f"{BASE_URL}/requests/999", timeout=REQUEST_TIMEOUT)
+    assert response.status_code == 404, f"Expected 404 for /requests/999, got {response.status_code}"
+    assert response.json() == {"error": "Request not found"}
+
+# --- Pagination (GET /resources?limit=N&cursor=...) ---
+def get_pages(path, limit, max_pages=1000):
+    """Every page of a list endpoint, following X-Next-Cursor from the first page."""
+    pages, params = [], {"limit": limit}
+    while True:
+        response = requests.get(f"{BASE_URL}{path}", params=params, timeout=REQUEST_TIMEOUT)
+        assert response.status_code == 200, f"{path} {params}: Status {response.status_code}, Text: {response.text[:500]}"
+        pages.append(response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            return pages
+        assert len(pages) < max_pages, f"{path}: X-Next-Cursor does not advance"
+        params = {"limit": limit, "cursor": cursor}
+
+def test_pages_cover_the_collection_once():
+    """Small pages, followed cursor by cursor, list every resource once, newest first."""
+    created = []
+    for i in range(3):
+        response = requests.post(f"{BASE_URL}/resources", json={"name": f"Live test item {i}", "quantity": i},
+                                 timeout=REQUEST_TIMEOUT)
+        assert response.status_code == 201, f"POST /resources failed: Status {response.status_code}, Text: {response.text[:500]}"
+        created.append(response.json()["id"])
+
+    pages = get_pages("/resources", 2)
+    ids = [item["id"] for page in pages for item in page]
+    assert all(len(page) == 2 for page in pages[:-1]), f"Only the last page may be short: {[len(p) for p in pages]}"
+    assert 1 <= len(pages[-1]) <= 2, "The last page (no X-Next-Cursor) should not be empty"
+    assert len(ids) == len(set(ids)), "A resource appeared on more than one page"
+    positions = [ids.index(resource_id) for resource_id in created]
+    assert positions == sorted(positions, reverse=True), f"Resources are not listed newest first: {positions}"
+    print(f"\n✅ /resources listed {len(ids)} resources over {len(pages)} pages.")
+
+@pytest.mark.parametrize("params", [
+    pytest.param({"cursor": "not-a-cursor"}, id="bad_cursor"),
+    pytest.param({"limit": "0"}, id="limit_zero"),
+    pytest.param({"limit": "ten"}, id="limit_not_a_number"),
+])
+def test_invalid_page_parameters_are_rejected(params):
+    response = requests.get(f"{BASE_URL}/resources", params=params, timeout=REQUEST_TIMEOUT)
+    assert response.status_code == 400, f"Expected 400 for {params}, got {response.status_code}"
+    assert "error" in response.json()
+
+def test_page_size_is_capped():
+    """No limit gives the default page (100); a huge limit is capped at MAX_PAGE_SIZE (500 by default)."""
+    response = requests.get(f"{BASE_URL}/resources", timeout=REQUEST_TIMEOUT)
+    assert response.status_code == 200 and len(response.json()) <= 100
+    response = requests.get(f"{BASE_URL}/resources", params={"limit": 100000}, timeout=REQUEST_TIMEOUT)
+    assert response.status_code == 200 and len(response.json()) <= 500
+
+# --- Streaming Exports (Accept: application/x-ndjson, ?stream=1) ---
+def test_streams_match_the_paged_listing():
+    """Both streaming forms return the same documents, in the same order, as the pages."""
+    response = requests.post(f"{BASE_URL}/resources", json={"name": "Live test: streamed item", "quantity": 1},
+                             timeout=REQUEST_TIMEOUT)
+    assert response.status_code == 201, f"POST /resources failed: Status {response.status_code}, Text: {response.text[:500]}"
+    paged = [item for page in get_pages("/resources", 500) for item in page]
+
+    response = requests.get(f"{BASE_URL}/resources", headers={"Accept": "application/x-ndjson"}, timeout=REQUEST_TIMEOUT)
+    assert response.status_code == 200
+    assert response.headers["Content-Type"].startswith("application/x-ndjson")
+    streamed = [json.loads(line) for line in response.text.splitlines() if line]
+    assert streamed == paged, "The NDJSON stream does not match the paged listing"
+
+    response = requests.get(f"{BASE_URL}/resources", params={"stream": 1}, timeout=REQUEST_TIMEOUT)
+    assert response.status_code == 200
+    assert response.json() == paged, "The streamed JSON array does not match the paged listing"
+    print(f"\n✅ Streamed {len(paged)} resources as NDJSON and as a JSON array.")
+
+# --- Bulk Ingestion (POST /<collection>/bulk, NDJSON) ---
+NDJSON_HEADERS = {"Content-Type": "application/x-ndjson"}
+
+def post_bulk(path, lines, params=None):
+    """POST NDJSON lines to a bulk endpoint; returns the parsed result lines."""
+    body = "".join(line + "\n" for line in lines).encode()
+    response = requests.post(f"{BASE_URL}{path}", data=body, params=params, headers=NDJSON_HEADERS, timeout=REQUEST_TIMEOUT)
+    assert response.status_code == 200, f"POST {path}: Status {response.status_code}, Text: {response.text[:500]}"
+    return [json.loads(line) for line in response.text.splitlines() if line]
+
+def test_bulk_reports_each_line():
+    """Valid lines are created, invalid ones are reported by line number; blank lines are skipped."""
+    results = post_bulk("/donations/bulk", [
+        json.dumps({"name": "Live test: canned food", "detail": "qty: 4"}),
+        "",
+        json.dumps({"detail": "no name"}),
+        '{"name": ',
+        json.dumps(["not", "an", "object"]),
+    ])
+    assert [(r["line"], r["status"]) for r in results] == [(1, 201), (3, 400), (4, 400), (5, 400)], results
+    assert results[3]["error"] == "Each line must be a JSON object"
+
+def test_bulk_requests_are_matched_with_their_coordinates():
+    """?match=1 matches the new requests at their own coordinates and records the result."""
+    results = post_bulk("/requests/bulk", [
+        json.dumps(dict(NEW_REQUEST, latitude=32.78, longitude=-96.80)),
+        json.dumps(dict(NEW_REQUEST, latitude=91, longitude=0)),
+    ], params={"match": 1})
+    created, matched = results[:2], results[2:]
+    assert created[0]["status"] == 201, created
+    assert created[1] == {"line": 2, "status": 400, "error": "Invalid latitude/longitude"}
+    assert matched == [{"id": created[0]["id"], "matchStatus": "complete"}]
+
+    response = requests.get(f"{BASE_URL}/requests/{created[0]['id']}", timeout=REQUEST_TIMEOUT)
+    data = response.json()
+    assert (data["latitude"], data["longitude"]) == (32.78, -96.80)
+    assert data["matchStatus"] == "complete"
+    for volunteer in data["matches"]:
+        validate_volunteer_dict(volunteer)
+
+def test_bulk_requires_ndjson():
+    response = requests.post(f"{BASE_URL}/resources/bulk", json={"name": "Live test item", "quantity": 1},
+                             timeout=REQUEST_TIMEOUT)
+    assert response.status_code == 415, f"Expected 415 for a JSON body, got {response.status_code}"
\ No newline at end of file
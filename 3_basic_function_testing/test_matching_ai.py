@@ -0,0 +1,439 @@
+# 3_basic_function_testing/test_matching_ai.py
+# Offline tests for matching_ai: no Firebase, no running server.
+
+import os
+import sys
+
+import numpy as np
+import pytest
+from sklearn.neighbors import NearestNeighbors
+from sklearn.preprocessing import StandardScaler
+
+# Allow importing matching_ai from the backend folder
+backend_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'code_1', 'backend'))
+if backend_dir not in sys.path:
+    sys.path.insert(0, backend_dir)
+
+import matching_ai
+from matching_ai import (
+    NUMERIC_DIM, VolunteerIndex, build_feature_matrix, extract_features_request, get_best_matches,
+)
+
+SKILLS = ['Medical', 'Rescue', 'Food', 'Shelter', 'Transportation']
+
+# --- Helpers ---
+def make_volunteers(n, seed=0):
+    """Deterministic volunteers scattered around the Dallas area."""
+    rng = np.random.default_rng(seed)
+    return [
+        {
+            'id': f'v{i}',
+            'name': f'Volunteer {i}',
+            'skills': [SKILLS[rng.integers(len(SKILLS))]],
+            'availability': bool(rng.random() < 0.7),
+            'location': {'latitude': float(32.8 + rng.normal(0, 0.3)),
+                         'longitude': float(-96.8 + rng.normal(0, 0.3))},
+        }
+        for i in range(n)
+    ]
+
+def make_request(req_type='Medical', lat=32.78, lon=-96.80):
+    return {'id': 'r1', 'type': req_type, 'latitude': lat, 'longitude': lon}
+
+def reference_matches(request_features, volunteers, k):
+    """The original fit-everything-per-call pipeline, used as ground truth."""
+    X, valid = build_feature_matrix(volunteers)
+    X = X.toarray()
+    scaler = StandardScaler()
+    X_scaled = scaler.fit_transform(X)
+    nn = NearestNeighbors(n_neighbors=min(k, len(valid))).fit(X_scaled)
+    distances, indices = nn.kneighbors(scaler.transform([request_features]))
+    return distances[0], [volunteers[valid[i]]['id'] for i in indices[0]]
+
+# --- VolunteerIndex ---
+def test_index_matches_reference_pipeline():
+    volunteers = make_volunteers(200)
+    features = extract_features_request(make_request())
+    index = VolunteerIndex.from_volunteers(volunteers)
+
+    distances, ids = index.kneighbors(features, k=5)
+    ref_distances, ref_ids = reference_matches(features, volunteers, 5)
+
+    np.testing.assert_allclose(distances[0], ref_distances, rtol=1e-6)
+    assert ids[0] == ref_ids
+
+def test_index_add_update_remove_tracks_rebuilt_index():
+    volunteers = make_volunteers(50)
+    index = VolunteerIndex.from_volunteers(volunteers[:40])
+    for vol in volunteers[40:]:
+        index.add(vol['id'], vol)
+    index.remove('v3')
+    moved = dict(volunteers[7], location={'latitude': 32.78, 'longitude': -96.80}, skills=['Medical'])
+    index.update('v7', moved)
+
+    expected = [v for v in volunteers if v['id'] not in ('v3', 'v7')] + [moved]
+    rebuilt = VolunteerIndex.from_volunteers(expected)
+    features = extract_features_request(make_request())
+
+    assert len(index) == len(rebuilt) == 49
+    assert 'v3' not in index and 'v7' in index
+    np.testing.assert_allclose(index.scale_, rebuilt.scale_, rtol=1e-9)
+    np.testing.assert_allclose(index.mean_, rebuilt.mean_, rtol=1e-9)
+    assert index.kneighbors(features, k=4)[1] == rebuilt.kneighbors(features, k=4)[1]
+    assert index.get_best_matches(features, k=1)[0]['id'] == 'v7'
+
+def test_index_batch_queries_match_single_queries():
+    volunteers = make_volunteers(300, seed=1)
+    index = VolunteerIndex.from_volunteers(volunteers)
+    requests = [make_request(t, 32.5 + i * 0.1, -97.0 + i * 0.05) for i, t in enumerate(SKILLS)]
+    Q = np.vstack([extract_features_request(r) for r in requests])
+
+    batch_distances, batch_ids = index.kneighbors(Q, k=3)
+    for row, features in enumerate(Q):
+        distances, ids = index.kneighbors(features, k=3)
+        np.testing.assert_allclose(batch_distances[row], distances[0])
+        assert batch_ids[row] == ids[0]
+
+def test_index_handles_empty_and_small_k():
+    index = VolunteerIndex()
+    features = extract_features_request(make_request())
+    assert index.get_best_matches(features) == []
+
+    vol = make_volunteers(1)[0]
+    index.add(vol['id'], vol)
+    assert [m['id'] for m in index.get_best_matches(features, k=3)] == ['v0']
+    assert index.remove('v0') and not index.remove('v0')
+    assert len(index) == 0 and index.get_best_matches(features) == []
+
+def test_get_best_matches_accepts_list_or_index():
+    volunteers = make_volunteers(100, seed=2)
+    features = extract_features_request(make_request('Rescue'))
+    from_list = get_best_matches(features, volunteers, k=3)
+    from_index = get_best_matches(features, VolunteerIndex.from_volunteers(volunteers), k=3)
+    assert [v['id'] for v in from_list] == [v['id'] for v in from_index]
+    assert [v['id'] for v in from_list] == reference_matches(features, volunteers, 3)[1]
+
+# --- Geo stage ---
+def test_haversine_known_distance():
+    # Dallas -> Houston is roughly 362 km great-circle
+    assert abs(matching_ai.haversine_km(32.7767, -96.7970, 29.7604, -95.3698) - 362) < 5
+
+def test_geo_candidates_agree_with_brute_force_after_mutations():
+    volunteers = make_volunteers(400, seed=3)
+    index = VolunteerIndex.from_volunteers(volunteers[:300])
+    index.geo_candidates(32.8, -96.8, radius_km=10) # Builds the tree
+    for vol in volunteers[300:]:
+        index.add(vol['id'], vol) # Pending rows, not yet in the tree
+    for i in range(0, 60, 3):
+        index.remove(f'v{i}')
+
+    live = [v for v in volunteers if v['id'] in index]
+    lats = np.array([v['location']['latitude'] for v in live])
+    lons = np.array([v['location']['longitude'] for v in live])
+    km = matching_ai.haversine_km(32.8, -96.8, lats, lons)
+
+    rows, dists = index.geo_candidates(32.8, -96.8, radius_km=15)
+    assert sorted(index._ids[r] for r in rows) == sorted(v['id'] for v, d in zip(live, km) if d <= 15)
+    assert np.all(np.diff(dists) >= 0)
+
+    rows, dists = index.geo_candidates(32.8, -96.8, max_candidates=25)
+    expected = [live[i]['id'] for i in np.argsort(km, kind='stable')[:25]]
+    assert [index._ids[r] for r in rows] == expected
+
+def test_geo_stage_ranks_nearby_candidates_on_skill():
+    volunteers = make_volunteers(300, seed=4)
+    far_medic = {'id': 'far', 'skills': ['Medical'], 'availability': True,
+                 'location': {'latitude': 29.76, 'longitude': -95.37}} # Houston
+    index = VolunteerIndex.from_volunteers(volunteers + [far_medic])
+    features = extract_features_request(make_request('Medical'))
+
+    matches = index.get_best_matches(features, k=5, radius_km=20)
+    assert matches and 'far' not in [m['id'] for m in matches]
+    for m in matches:
+        loc = m['location']
+        assert matching_ai.haversine_km(32.78, -96.80, loc['latitude'], loc['longitude']) <= 20
+    # Available medics inside the radius outrank everyone else
+    nearby_medics = [v for v in volunteers if v['skills'] == ['Medical'] and v['availability']
+                     and matching_ai.haversine_km(32.78, -96.80, v['location']['latitude'], v['location']['longitude']) <= 20]
+    assert all(m['skills'] == ['Medical'] and m['availability'] for m in matches[:min(5, len(nearby_medics))])
+
+def test_scaled_rows_are_reused_until_the_index_changes():
+    volunteers = make_volunteers(100, seed=9)
+    features = extract_features_request(make_request())
+    index = VolunteerIndex.from_volunteers(volunteers)
+    index.kneighbors(features, k=3)
+    cached = index._scaled
+    index.kneighbors(features, k=3)
+    assert index._scaled is cached # Nothing changed: no rescaling per query
+
+    index.add('close', {'skills': ['Medical'], 'availability': True,
+                        'location': {'latitude': 32.78, 'longitude': -96.80}})
+    index.remove('v0')
+    distances, ids = index.kneighbors(features, k=5)
+    assert index._scaled is not cached
+    remaining = [vol for vol in volunteers if vol['id'] != 'v0'] + [dict(index.get('close'), id='close')]
+    ref_distances, ref_ids = reference_matches(features, remaining, 5)
+    assert ids[0] == ref_ids
+    np.testing.assert_allclose(distances[0], ref_distances)
+
+def test_exact_scan_in_blocks_matches_one_block(monkeypatch):
+    volunteers = make_volunteers(500, seed=4)
+    index = VolunteerIndex.from_volunteers(volunteers)
+    index.add('close', {'skills': ['Medical', 'Food'], 'availability': True,
+                        'location': {'latitude': 32.78, 'longitude': -96.80}})
+    index.update('v3', {'skills': ['Rescue'], 'availability': True, 'location': {'latitude': 32.7, 'longitude': -96.9}})
+    index.remove('v7')
+    requests = [make_request(SKILLS[i % len(SKILLS)], 32.5 + i * 0.03, -97.0 + i * 0.02) for i in range(20)]
+    Q = np.vstack([extract_features_request(r) for r in requests])
+    distances, ids = index.kneighbors(Q, k=4)
+
+    # 3 queries per block and ~40 volunteers per tile: 7 blocks of 13 tiles each
+    monkeypatch.setattr(matching_ai, '_QUERY_CHUNK', 3)
+    monkeypatch.setattr(matching_ai, '_BLOCK_BYTES', 8 * (2 * 3 + NUMERIC_DIM + len(index.taxonomy)) * 40)
+    block_distances, block_ids = index.kneighbors(Q, k=4)
+    np.testing.assert_allclose(block_distances, distances)
+    assert block_ids == ids
+    remaining = [vol for vol in volunteers if vol['id'] not in ('v3', 'v7')] + [
+        dict(index.get(vid), id=vid) for vid in ('close', 'v3')]
+    ref_distances, ref_ids = reference_matches(Q[0], remaining, 4)
+    assert block_ids[0] == ref_ids
+    np.testing.assert_allclose(block_distances[0], ref_distances)
+
+def test_best_matches_many_resolves_each_requests_k():
+    volunteers = make_volunteers(60, seed=5)
+    index = VolunteerIndex.from_volunteers(volunteers)
+    requests = [make_request('Medical'), make_request('Food', lat=33.0, lon=-97.0)]
+    features = matching_ai.extract_features_requests(requests)
+    found = index.get_best_matches_many(features, [1, 4])
+    assert [len(matches) for matches in found] == [1, 4]
+    for request, matches, k in zip(requests, found, [1, 4]):
+        assert matches == index.get_best_matches(extract_features_request(request), k=k)
+
+# --- Batch feature extraction ---
+def test_batch_extraction_matches_single_rows():
+    volunteers = make_volunteers(50, seed=5)
+    volunteers[4]['skills'] = [] # Unknown skill
+    volunteers[9]['location'] = {} # Zero lat/lon
+    volunteers[11]['location'] = None # Unreadable: skipped
+    X, valid = matching_ai.extract_features_volunteers(volunteers)
+    assert 11 not in valid and len(valid) == 49
+    X = X.toarray()
+    for row, i in enumerate(valid):
+        np.testing.assert_array_equal(X[row], matching_ai.extract_features_volunteer(volunteers[i]))
+    with pytest.raises(AttributeError):
+        matching_ai.extract_features_volunteer(volunteers[11])
+
+    requests = [make_request(t, 30 + i, -95 - i) for i, t in enumerate(SKILLS + ['Unknown'])]
+    R = matching_ai.extract_features_requests(requests)
+    for row, req in enumerate(requests):
+        np.testing.assert_array_equal(R[row], extract_features_request(req))
+
+def test_columnar_extraction_matches_dicts():
+    volunteers = make_volunteers(30, seed=6)
+    columns = {
+        'latitude': [v['location']['latitude'] for v in volunteers],
+        'longitude': [v['location']['longitude'] for v in volunteers],
+        'skill': [v['skills'][0] for v in volunteers],
+        'availability': [v['availability'] for v in volunteers],
+    }
+    X_cols, valid_cols = matching_ai.extract_features_volunteers(columns)
+    X_dicts, valid_dicts = matching_ai.extract_features_volunteers(volunteers)
+    np.testing.assert_array_equal(X_cols.toarray(), X_dicts.toarray())
+    assert valid_cols == valid_dicts
+
+# --- Multi-skill sparse encoding ---
+def test_multi_skill_volunteers_are_multi_hot_and_case_insensitive():
+    vol = {'id': 'v', 'skills': ['medical', 'Rescue', 'Medical', 'Knitting'], 'availability': True,
+           'location': {'latitude': 32.0, 'longitude': -96.0}}
+    X, _ = build_feature_matrix([vol])
+    taxonomy = matching_ai.skill_taxonomy
+    assert X.nnz == 3 + 2 # lat, lon, availability + two distinct known skills
+    assert X[0, matching_ai.NUMERIC_DIM + taxonomy.column('Medical')] == 1
+    assert X[0, matching_ai.NUMERIC_DIM + taxonomy.column('Rescue')] == 1
+
+def test_index_sparse_distances_match_dense_reference_with_multi_skills():
+    rng = np.random.default_rng(7)
+    volunteers = make_volunteers(150, seed=7)
+    for v in volunteers:
+        v['skills'] = list(rng.choice(SKILLS, size=rng.integers(0, 4), replace=False))
+    index = VolunteerIndex.from_volunteers(volunteers[:100])
+    for v in volunteers[100:]:
+        index.add(v['id'], v) # Exercise the pending (not yet compacted) rows too
+    request = dict(make_request('Medical'), required_skills=['Rescue'])
+    features = extract_features_request(request)
+
+    distances, ids = index.kneighbors(features, k=6)
+    ref_distances, ref_ids = reference_matches(features, volunteers, 6)
+    np.testing.assert_allclose(distances[0], ref_distances, rtol=1e-6)
+    assert ids[0] == ref_ids
+
+def test_taxonomy_extends_at_runtime_without_rebuilding():
+    taxonomy = matching_ai.SkillTaxonomy(matching_ai.ALL_CATEGORIES)
+    volunteers = make_volunteers(40, seed=8)
+    index = VolunteerIndex.from_volunteers(volunteers, taxonomy=taxonomy)
+    old_features = extract_features_request(make_request('Medical'), taxonomy) # Built before the extension
+
+    taxonomy.extend(['Swift Water Rescue'])
+    diver = {'id': 'diver', 'skills': ['Swift Water Rescue', 'Medical'], 'availability': True,
+             'location': {'latitude': 32.78, 'longitude': -96.80}}
+    index.add('diver', diver)
+    features = extract_features_request(dict(make_request('Medical'), required_skills=['swift water rescue']),
+                                        taxonomy)
+
+    assert len(index.scale_) == matching_ai.NUMERIC_DIM + len(taxonomy)
+    assert index.get_best_matches(features, k=1)[0]['id'] == 'diver'
+    assert len(index.kneighbors(old_features, k=3)[1][0]) == 3 # Shorter vectors are zero-padded
+
+# --- Neighbor backends ---
+def test_grid_backend_recall_improves_with_more_candidates():
+    volunteers = make_volunteers(2000, seed=9)
+    requests = [make_request(SKILLS[i % len(SKILLS)], 32.8 + 0.02 * (i - 10), -96.8 + 0.03 * (i % 7))
+                for i in range(20)]
+    Q = matching_ai.extract_features_requests(requests)
+
+    exact = VolunteerIndex.from_volunteers(volunteers)
+    assert exact.recall(Q, k=5) == 1.0
+    recalls = []
+    for n_candidates in (20, 200, 2000):
+        index = VolunteerIndex.from_volunteers(volunteers, backend='grid',
+                                               backend_options={'cell_km': 5, 'n_candidates': n_candidates})
+        recalls.append(index.recall(Q, k=5))
+    assert recalls[0] <= recalls[1] <= recalls[2] == 1.0
+
+def test_grid_backend_follows_add_and_remove():
+    volunteers = make_volunteers(300, seed=10)
+    index = VolunteerIndex.from_volunteers(volunteers[:200], backend='grid',
+                                           backend_options={'n_candidates': 10_000})
+    for vol in volunteers[200:]:
+        index.add(vol['id'], vol)
+    for i in range(0, 300, 4):
+        index.remove(f'v{i}')
+    features = extract_features_request(make_request('Shelter'))
+    live = [v for v in volunteers if v['id'] in index]
+    assert index.kneighbors(features, k=5)[1] == VolunteerIndex.from_volunteers(live).kneighbors(features, k=5)[1]
+
+def test_grid_backend_far_query_does_not_walk_empty_rings():
+    volunteers = make_volunteers(2000, seed=12)
+    index = VolunteerIndex.from_volunteers(volunteers, backend='grid',
+                                           backend_options={'cell_km': 1, 'n_candidates': 50})
+    backend = index.backend
+
+    class CountingCells(dict):
+        lookups = 0
+
+        def get(self, key, default=None):
+            CountingCells.lookups += 1
+            return super().get(key, default)
+
+    backend._cells = CountingCells(backend._cells)
+    # Sydney is about 13,000 cells away from every volunteer
+    rows = backend.candidates(-33.87, 151.21)
+    assert len(rows) >= 50
+    assert CountingCells.lookups <= len(backend._cells)
+    distances, ids = index.kneighbors(extract_features_request(make_request('Food', -33.87, 151.21)), k=5)
+    assert len(ids[0]) == 5
+
+    # Finishing from the occupied cells collects the same rows as walking the rings
+    reference = matching_ai.GridBackend(cell_km=1, n_candidates=50, max_ring=0)
+    reference._cells, reference._row_cells = backend._cells, backend._row_cells
+    for lat, lon in [(32.8, -96.8), (33.2, -96.5), (31.5, -97.9), (-33.87, 151.21)]:
+        assert sorted(backend.candidates(lat, lon)) == sorted(reference.candidates(lat, lon))
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        VolunteerIndex(backend='hnsw')
+
+# --- Snapshots ---
+def test_snapshot_round_trip_answers_like_the_original(tmp_path):
+    volunteers = make_volunteers(400, seed=11)
+    index = VolunteerIndex.from_volunteers(volunteers, backend='grid')
+    for i in range(0, 400, 5):
+        index.remove(f'v{i}')
+    features = extract_features_request(make_request('Food'))
+    index.kneighbors(features, k=4, radius_km=30) # Build the geo tree so it is saved too
+    path = str(tmp_path / 'index.snapshot')
+    index.save(path, source_version='v1')
+
+    loaded = VolunteerIndex.load(path, source_version='v1')
+    assert len(loaded) == len(index) and loaded.source_version == 'v1'
+    assert loaded.get('v1') == index.get('v1')
+    for radius in (None, 30):
+        distances, ids = loaded.kneighbors(features, k=4, radius_km=radius)
+        expected_distances, expected_ids = index.kneighbors(features, k=4, radius_km=radius)
+        assert ids == expected_ids
+        np.testing.assert_allclose(distances, expected_distances)
+
+    # A loaded index is memory-mapped but still accepts changes
+    loaded.add('v0', volunteers[0])
+    loaded.remove('v1')
+    index.add('v0', volunteers[0])
+    index.remove('v1')
+    assert loaded.kneighbors(features, k=4)[1] == index.kneighbors(features, k=4)[1]
+
+def test_stale_or_missing_snapshot_is_ignored(tmp_path):
+    path = str(tmp_path / 'index.snapshot')
+    assert VolunteerIndex.load(path) is None
+    VolunteerIndex.from_volunteers(make_volunteers(20, seed=12)).save(path, source_version=3)
+    assert VolunteerIndex.load(path, source_version=4) is None
+    assert len(VolunteerIndex.load(path)) == 20
+
+def test_rejected_snapshot_leaves_the_taxonomy_alone(tmp_path):
+    path = str(tmp_path / 'index.snapshot')
+    volunteers = make_volunteers(20, seed=13)
+    volunteers[0]['skills'] = ['Boats']
+    source = matching_ai.SkillTaxonomy(['Food', 'Medical'], auto_extend=True)
+    VolunteerIndex.from_volunteers(volunteers, taxonomy=source).save(path)
+    assert 'Boats' in source
+
+    shared = matching_ai.SkillTaxonomy(['Medical', 'Food'])
+    assert VolunteerIndex.load(path, taxonomy=shared) is None # Food and Medical swapped
+    assert shared.names == ['Medical', 'Food']
+
+    # A taxonomy the snapshot's columns extend takes its new skills on load
+    shared = matching_ai.SkillTaxonomy(['food'])
+    loaded = VolunteerIndex.load(path, taxonomy=shared)
+    assert len(loaded) == 20 and shared.names == ['food'] + source.names[1:]
+    assert not shared.extend_in_order(['Food', 'Boats', 'Kayaks'])
+    assert shared.names == ['food'] + source.names[1:]
+
+# --- Data-quality diagnostics ---
+def test_data_quality_is_summarised_once_per_match(capsys, monkeypatch):
+    monkeypatch.setattr(matching_ai, '_data_quality_log', matching_ai._SummaryLog(interval=0))
+    volunteers = make_volunteers(50, seed=3)
+    for vol in volunteers[:30]:
+        vol['location'] = {}
+    volunteers[30]['skills'] = ['Cooking']
+    volunteers[31]['location'] = {'latitude': 'north'}
+
+    index = VolunteerIndex.from_volunteers(volunteers)
+    assert len(index) == 49
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 1 # One bounded summary, not a line per volunteer
+    assert lines[0].startswith("Warning: Data quality (volunteer features): ")
+    assert "30 volunteer_zero_location (e.g. v0, v1, v2, v3, v4)" in lines[0]
+    assert "1 volunteer_unknown_skill (e.g. v30 (Cooking))" in lines[0]
+    assert "1 volunteer_unreadable (e.g. v31 (ValueError" in lines[0]
+
+    with matching_ai.collect_data_quality() as report:
+        extract_features_request(make_request('Knitting', lat=0.0, lon=0.0))
+        extract_features_request(make_request('Medical', lat=0.0, lon=0.0))
+    assert report.summary() == {
+        'request_unknown_type': {'count': 1, 'examples': ['r1 (Knitting)']},
+        'request_zero_location': {'count': 2, 'examples': ['r1', 'r1']},
+    }
+    assert len(capsys.readouterr().out.splitlines()) == 1 # Nested extractions share the outer report
+
+def test_data_quality_summaries_are_rate_limited(capsys):
+    log = matching_ai._SummaryLog(interval=3600)
+    for _ in range(3):
+        log.emit("summary")
+    log._last -= 3600
+    log.emit("summary")
+    assert capsys.readouterr().out.splitlines() == ["summary", "summary (+2 similar summaries suppressed)"]
+
+def test_debug_output_reports_data_quality():
+    volunteers = make_volunteers(10, seed=4)
+    volunteers[0]['location'] = {}
+    debug = matching_ai.get_best_matches_debug(extract_features_request(make_request()), volunteers)
+    assert debug['data_quality'] == {'volunteer_zero_location': {'count': 1, 'examples': ['v0']}}
+    assert len(debug['matched_volunteers']) == 3
@@ -0,0 +1,78 @@
+# 3_basic_function_testing/test_metrics.py
+# Offline tests for the metrics module and the matching phase timings.
+
+import os
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'code_1', 'backend')
+sys.path.insert(0, os.path.abspath(BACKEND_DIR))
+
+from matching_ai import (
+    MATCH_PHASE_SECONDS, MATCH_VOLUNTEERS_SKIPPED, VolunteerIndex, extract_features_request,
+    get_best_matches_debug,
+)
+from metrics import PhaseTimer, Registry
+
+
+VOLUNTEERS = [
+    {'id': f'v{i}', 'name': f'Volunteer {i}', 'skills': ['Medical' if i % 2 else 'Food'], 'availability': True,
+     'location': {'latitude': 32.7 + i * 0.01, 'longitude': -96.8}}
+    for i in range(20)
+]
+REQUEST = {'id': 'r1', 'type': 'Medical', 'latitude': 32.75, 'longitude': -96.8, 'urgency': 'High'}
+
+
+def test_render_counters_and_histograms():
+    registry = Registry()
+    hits = registry.counter('cache_hits_total', 'Cache hits.', ['route'])
+    hits.inc(route='/alerts')
+    hits.inc(2, route='/alerts')
+    latency = registry.histogram('handler_seconds', 'Handler time.', buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        latency.observe(value)
+
+    assert hits.value(route='/alerts') == 3
+    assert latency.totals() == (4, pytest.approx(3.65))
+    lines = registry.render().splitlines()
+    assert lines[:3] == ['# HELP cache_hits_total Cache hits.', '# TYPE cache_hits_total counter',
+                         'cache_hits_total{route="/alerts"} 3']
+    # Buckets are cumulative and inclusive of their upper bound
+    assert 'handler_seconds_bucket{le="0.1"} 2' in lines
+    assert 'handler_seconds_bucket{le="1.0"} 3' in lines
+    assert 'handler_seconds_bucket{le="+Inf"} 4' in lines
+    assert 'handler_seconds_count 4' in lines
+
+def test_labels_and_registration_are_checked():
+    registry = Registry()
+    counter = registry.counter('events_total', 'Events.', ['kind'])
+    assert registry.counter('events_total', 'Events.', ['kind']) is counter
+    with pytest.raises(ValueError):
+        counter.inc(other='x')
+    with pytest.raises(ValueError):
+        registry.histogram('events_total', 'Events.', ['kind'])
+
+def test_match_records_its_phases():
+    before = {phase: MATCH_PHASE_SECONDS.totals(phase=phase)[0] for phase in ('extract', 'fit', 'scale', 'query')}
+    serialized = MATCH_PHASE_SECONDS.totals(phase='serialize')[0]
+    skipped = MATCH_VOLUNTEERS_SKIPPED.value()
+    index = VolunteerIndex.from_volunteers(VOLUNTEERS + [{'id': 'broken', 'location': {'latitude': 'north'}}])
+    matches = index.get_best_matches(extract_features_request(REQUEST), k=3)
+
+    assert len(matches) == 3
+    for phase, count in before.items():
+        assert MATCH_PHASE_SECONDS.totals(phase=phase)[0] > count, phase
+    assert MATCH_PHASE_SECONDS.totals(phase='serialize')[0] == serialized # Timed by the routes
+    assert MATCH_VOLUNTEERS_SKIPPED.value() == skipped + 1
+
+def test_debug_output_breaks_down_timings():
+    debug = get_best_matches_debug(extract_features_request(REQUEST), VOLUNTEERS)
+    assert set(debug['timings_seconds']) == {'extract', 'scale', 'fit', 'query'}
+    assert all(seconds >= 0 for seconds in debug['timings_seconds'].values())
+    assert len(debug['matched_volunteers']) == 3
+
+    timer = PhaseTimer()
+    with timer.phase('fetch'):
+        pass
+    assert set(timer.milliseconds()) == {'fetch'}
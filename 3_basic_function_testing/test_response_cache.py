@@ -0,0 +1,50 @@
+# 3_basic_function_testing/test_response_cache.py
+# Offline tests for the list endpoint response cache.
+
+import os
+import sys
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'code_1', 'backend')
+sys.path.insert(0, os.path.abspath(BACKEND_DIR))
+
+from response_cache import ResponseCache, etag_matches
+
+
+def test_hit_until_invalidated_or_expired():
+    cache = ResponseCache(ttl=0.1)
+    entry = cache.put('alerts', 'page1', b'[1]', {'X-Next-Cursor': 'c'})
+    assert cache.get('alerts', 'page1') == entry
+    cache.invalidate('resources') # Other collections are unaffected
+    assert cache.get('alerts', 'page1') == entry
+    cache.invalidate('alerts')
+    assert cache.get('alerts', 'page1') is None
+
+    cache.put('alerts', 'page1', b'[2]')
+    time.sleep(0.15)
+    assert cache.get('alerts', 'page1') is None
+
+def test_response_computed_before_a_write_is_not_cached():
+    cache = ResponseCache()
+    generation = cache.generation('requests')
+    cache.invalidate('requests') # A write lands while the page is being read
+    entry = cache.put('requests', 'page1', b'[]', generation=generation)
+    assert entry.etag and cache.get('requests', 'page1') is None
+
+def test_least_recently_used_entries_are_evicted():
+    cache = ResponseCache(max_entries=2)
+    cache.put('alerts', 'a', b'a')
+    cache.put('alerts', 'b', b'b')
+    cache.get('alerts', 'a')
+    cache.put('alerts', 'c', b'c')
+    assert cache.get('alerts', 'b') is None
+    assert cache.get('alerts', 'a') and cache.get('alerts', 'c')
+
+def test_etag_changes_with_body_and_matches_if_none_match():
+    cache = ResponseCache()
+    etag = cache.put('alerts', 'a', b'[1]').etag
+    assert etag != cache.put('alerts', 'b', b'[2]').etag
+    assert etag_matches(etag, etag)
+    assert etag_matches(f'"other", W/{etag}', etag)
+    assert etag_matches('*', etag)
+    assert not etag_matches('"other"', etag) and not etag_matches(None, etag)
@@ -0,0 +1,124 @@
+# 3_basic_function_testing/test_storage.py
+# Offline tests for the in-memory and SQLite storage backends.
+
+import asyncio
+import datetime
+import os
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'code_1', 'backend')
+sys.path.insert(0, os.path.abspath(BACKEND_DIR))
+
+from firebase_admin import firestore
+
+from storage import MemoryStorage, SQLiteStorage, Storage, make_storage
+
+START = datetime.datetime(2025, 4, 5, tzinfo=datetime.timezone.utc)
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def storage(request, tmp_path):
+    return make_storage(request.param, path=str(tmp_path / 'store.sqlite3'))
+
+def load(storage, n, collection='requests'):
+    """n documents whose createdAt values repeat in pairs (so ties need the id)."""
+    writes = [('set', storage.document(collection, f'doc{i:03}'),
+               {'n': i, 'createdAt': START + datetime.timedelta(minutes=i // 2), 'tags': ['a', i]})
+              for i in range(n)]
+    asyncio.run(storage.commit(writes))
+
+
+def test_get_add_and_get_many(storage):
+    async def run():
+        ref, result = await storage.add('resources', {'name': 'Water', 'createdAt': firestore.SERVER_TIMESTAMP})
+        doc = await storage.get('resources', ref.id)
+        missing = await storage.get('resources', 'nope')
+        many = await storage.get_many('resources', [ref.id, 'nope', ref.id])
+        return ref, result, doc, missing, many
+    ref, result, doc, missing, many = asyncio.run(run())
+    assert len(ref.id) == 20
+    # The server timestamp resolves to the commit time, and datetimes round-trip
+    assert doc.exists and doc.to_dict() == {'name': 'Water', 'createdAt': result.update_time}
+    assert doc.to_dict()['createdAt'].tzinfo is not None
+    assert not missing.exists and missing.to_dict() is None
+    assert [d.id for d in many] == [ref.id]
+
+def test_ordered_pages_follow_the_cursor(storage):
+    load(storage, 25)
+    async def pages(descending):
+        seen, cursor = [], None
+        while True:
+            docs = await storage.query('requests', order_by='createdAt', descending=descending,
+                                       start_after=cursor, limit=7)
+            seen += [doc.id for doc in docs]
+            if len(docs) < 7:
+                return seen
+            cursor = (docs[-1].to_dict()['createdAt'], docs[-1].id)
+    expected = sorted((f'doc{i:03}' for i in range(25)), key=lambda d: (int(d[3:]) // 2, d))
+    assert asyncio.run(pages(False)) == expected
+    assert asyncio.run(pages(True)) == expected[::-1]
+
+def test_stream_projects_fields_and_skips_documents_without_the_order_field(storage):
+    load(storage, 12)
+    asyncio.run(storage.commit([('set', storage.document('requests', 'undated'), {'n': -1})]))
+    async def run():
+        return [doc async for doc in storage.stream('requests', order_by='createdAt', descending=True,
+                                                    fields=['n'])]
+    docs = asyncio.run(run())
+    assert [doc.to_dict() for doc in docs] == [{'n': i} for i in reversed(range(12))]
+    by_n = asyncio.run(storage.query('requests', order_by='n', limit=2, fields=[]))
+    assert [(doc.id, doc.to_dict()) for doc in by_n] == [('undated', {}), ('doc000', {})]
+
+def test_batches_are_atomic(storage):
+    load(storage, 3)
+    async def run():
+        await storage.commit([('update', storage.document('requests', 'doc000'), {'matchStatus': 'complete'}),
+                              ('delete', storage.document('requests', 'doc001'), None)])
+        with pytest.raises(LookupError):
+            await storage.commit([('set', storage.document('requests', 'new'), {'n': 99}),
+                                  ('update', storage.document('requests', 'missing'), {'n': 1})])
+        return [doc.id for doc in await storage.query('requests')]
+    assert asyncio.run(run()) == ['doc000', 'doc002']
+    doc = storage.get_sync('requests', 'doc000').to_dict()
+    assert doc['matchStatus'] == 'complete' and doc['n'] == 0 # An update merges into the document
+    # Ordered queries see the delete
+    assert [d.id for d in asyncio.run(storage.query('requests', order_by='createdAt'))] == ['doc000', 'doc002']
+
+def test_sync_view_for_the_volunteer_store(storage):
+    load(storage, 4, collection='volunteers')
+    volunteers = storage.sync_collection('volunteers')
+    assert not hasattr(volunteers, 'on_snapshot') # The store polls local backends
+    assert sorted(doc.id for doc in volunteers.stream()) == ['doc000', 'doc001', 'doc002', 'doc003']
+    assert storage.count_sync('volunteers') == 4 and storage.count_sync('requests') == 0
+
+def test_sqlite_persists_across_reopen(tmp_path):
+    path = str(tmp_path / 'store.sqlite3')
+    first = SQLiteStorage(path)
+    load(first, 5)
+    first.close()
+    reopened = SQLiteStorage(path)
+    docs = asyncio.run(reopened.query('requests', order_by='createdAt', descending=True, limit=2))
+    assert [doc.id for doc in docs] == ['doc004', 'doc003']
+    assert docs[0].to_dict()['createdAt'] == START + datetime.timedelta(minutes=2)
+
+def test_memory_index_tracks_writes():
+    storage = MemoryStorage()
+    load(storage, 4)
+    asyncio.run(storage.query('requests', order_by='createdAt')) # Builds the index
+    later = START + datetime.timedelta(days=1)
+    asyncio.run(storage.commit([('update', storage.document('requests', 'doc000'), {'createdAt': later})]))
+    docs = asyncio.run(storage.query('requests', order_by='createdAt', descending=True, limit=1))
+    assert [doc.id for doc in docs] == ['doc000']
+
+def test_backends_must_implement_the_interface():
+    with pytest.raises(TypeError):
+        Storage()
+
+    class ReadOnly(Storage):
+        async def get(self, collection, doc_id):
+            return None
+
+    with pytest.raises(TypeError, match='commit'):
+        ReadOnly()
@@ -0,0 +1,94 @@
+# 3_basic_function_testing/test_tracing.py
+# Offline tests for request tracing, on a small app over the in-memory storage.
+
+import asyncio
+import logging
+import os
+import sys
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.responses import JSONResponse, StreamingResponse
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'code_1', 'backend')
+sys.path.insert(0, os.path.abspath(BACKEND_DIR))
+
+from storage import MemoryStorage
+from tracing import TraceMiddleware, Traced, current_trace, span, untraced
+
+
+def make_app(sample_rate=1.0):
+    storage = Traced(MemoryStorage(), "storage", methods=("get", "commit"), streams=("stream",))
+    background = []
+    app = FastAPI()
+    app.add_middleware(TraceMiddleware, sample_rate=sample_rate, logger=logging.getLogger("trace-test"))
+
+    @app.post('/items/{item_id}')
+    async def create(item_id):
+        await storage.commit([("set", storage.document("items", item_id), {"name": item_id})])
+        doc = await storage.get("items", item_id)
+        with span("auth.get_user"):
+            await asyncio.sleep(0)
+        # Background work started by the request is not part of its trace
+        untraced(lambda: background.append(current_trace()))
+        return JSONResponse(doc.to_dict(), 201)
+
+    @app.get('/items')
+    async def stream_items():
+        async def generate():
+            async for doc in storage.stream("items"):
+                yield doc.id + "\n"
+        return StreamingResponse(generate())
+
+    return TestClient(app), background
+
+
+def timings(response):
+    return {entry.split(';')[0]: entry for entry in response.headers['server-timing'].split(', ')}
+
+
+def test_traced_request_reports_its_calls(caplog):
+    client, background = make_app()
+    with caplog.at_level(logging.INFO, logger="trace-test"):
+        response = client.post('/items/a')
+    assert response.status_code == 201
+    trace_id = response.headers['x-trace-id']
+    spans = timings(response)
+    assert set(spans) == {'storage.commit', 'storage.get', 'auth.get_user', 'total'}
+    assert 'desc="1 calls"' in spans['storage.get']
+    assert background == [None]
+
+    line = caplog.records[-1].getMessage()
+    assert line.startswith(f"trace={trace_id} POST /items/a 201 ")
+    assert "calls=3" in line and "storage.commit=1/" in line
+
+def test_streamed_calls_are_logged():
+    client, _ = make_app()
+    client.post('/items/a')
+    client.post('/items/b')
+    logger = logging.getLogger("trace-test")
+    records = []
+    handler = logging.Handler()
+    handler.emit = records.append
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    try:
+        response = client.get('/items')
+    finally:
+        logger.removeHandler(handler)
+    assert response.text == "a\nb\n"
+    # Headers go out before the body is streamed; the log line has the whole stream
+    assert 'storage.stream' not in response.headers['server-timing']
+    assert "storage.stream=1/" in records[-1].getMessage()
+
+def test_sampling_and_forced_traces():
+    client, _ = make_app(sample_rate=0.0)
+    response = client.post('/items/a')
+    assert 'x-trace-id' not in response.headers and 'server-timing' not in response.headers
+
+    response = client.post('/items/b', headers={'X-Trace-Id': 'debug-42'})
+    assert response.headers['x-trace-id'] == 'debug-42'
+    assert 'storage.get' in timings(response)
+
+    response = client.post('/items/c', headers={'X-Trace-Id': 'bad id; x=1'})
+    assert len(response.headers['x-trace-id']) == 16 # Malformed ids are replaced
@@ -0,0 +1,137 @@
+# 3_basic_function_testing/test_volunteer_store.py
+# Offline tests for the volunteer store, against an in-memory stand-in collection.
+
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+import pytest
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'code_1', 'backend')
+sys.path.insert(0, os.path.abspath(BACKEND_DIR))
+
+from volunteer_store import StoreNotReady, VolunteerStore
+
+
+class FakeCollection:
+    """Dict-backed stand-in for a Firestore collection: stream() and, optionally, on_snapshot()."""
+
+    def __init__(self, docs, listener=False):
+        self.docs = dict(docs)
+        self.version = 1
+        self.streams = 0
+        self.callback = None
+        if listener:
+            self.on_snapshot = self._on_snapshot
+
+    def _snapshot(self, doc_id):
+        data = self.docs.get(doc_id)
+        return SimpleNamespace(id=doc_id, to_dict=lambda: dict(data) if data is not None else None)
+
+    def stream(self):
+        self.streams += 1
+        return [self._snapshot(doc_id) for doc_id in list(self.docs)]
+
+    def _on_snapshot(self, callback):
+        self.callback = callback
+        callback(self.stream(), [], None)
+        return SimpleNamespace(unsubscribe=lambda: None, is_active=True)
+
+    def write(self, doc_id, data):
+        kind = 'REMOVED' if data is None else ('MODIFIED' if doc_id in self.docs else 'ADDED')
+        snapshot = self._snapshot(doc_id) if data is None else None
+        if data is None:
+            self.docs.pop(doc_id, None)
+        else:
+            self.docs[doc_id] = data
+        self.version += 1
+        if self.callback:
+            change = SimpleNamespace(type=SimpleNamespace(name=kind), document=snapshot or self._snapshot(doc_id))
+            self.callback([], [change], None)
+
+
+def volunteer(lat, lon, skill='Medical'):
+    return {'skills': [skill], 'availability': True, 'location': {'latitude': lat, 'longitude': lon}}
+
+
+def make_docs(n):
+    return {f'v{i}': volunteer(32.7 + 0.01 * i, -96.8 + 0.01 * i) for i in range(n)}
+
+
+def test_poll_mode_applies_diffs_only_when_the_version_changes():
+    collection = FakeCollection(make_docs(10))
+    store = VolunteerStore(collection, version_fn=lambda: collection.version, poll_interval=3600, use_listener=False)
+    index = store.index(wait=5)
+    assert len(index) == 10 and collection.streams == 1
+
+    assert store.sync() == 0 and collection.streams == 1 # Unchanged version: no collection read
+    collection.write('v3', None)
+    collection.write('v4', volunteer(33.0, -97.0, 'Food'))
+    collection.write('new', volunteer(32.9, -96.9))
+    assert store.sync() == 3
+    assert 'v3' not in index and 'new' in index
+    assert index.get('v4')['skills'] == ['Food']
+
+def test_listener_mode_applies_changes_incrementally():
+    collection = FakeCollection(make_docs(5), listener=True)
+    store = VolunteerStore(collection, version_fn=lambda: collection.version)
+    index = store.index(wait=5)
+    deadline = time.time() + 5
+    while collection.callback is None and time.time() < deadline:
+        time.sleep(0.01)
+    streams = collection.streams
+    collection.write('v0', None)
+    collection.write('v9', volunteer(32.8, -96.8))
+    assert 'v0' not in index and 'v9' in index
+    assert collection.streams == streams # Changes arrive without re-reading the collection
+    assert store.status()['staleness_seconds'] == 0.0
+
+def test_warm_start_from_snapshot_skips_the_collection_read(tmp_path):
+    path = str(tmp_path / 'volunteers.snapshot')
+    collection = FakeCollection(make_docs(20))
+    VolunteerStore(collection, version_fn=lambda: collection.version, snapshot_path=path,
+                   use_listener=False).index(wait=5)
+    assert collection.streams == 1
+    warm = VolunteerStore(collection, version_fn=lambda: collection.version, snapshot_path=path, use_listener=False)
+    assert len(warm.index(wait=5)) == 20 and collection.streams == 1
+
+def test_not_ready_until_loaded_and_stale_reads_sync():
+    collection = FakeCollection(make_docs(3))
+    slow_stream = collection.stream
+    collection.stream = lambda: (time.sleep(0.3), slow_stream())[1]
+    store = VolunteerStore(collection, version_fn=lambda: collection.version, poll_interval=3600,
+                           max_staleness=0.0, use_listener=False)
+    with pytest.raises(StoreNotReady):
+        store.index(wait=0)
+    assert store.status()['state'] == 'loading'
+    index = store.index(wait=5)
+    collection.docs['late'] = volunteer(32.7, -96.7)
+    collection.version += 1
+    assert 'late' in store.index() # max_staleness=0: every read syncs first
+    assert index is store.index()
+
+def test_failed_initial_load_is_retried():
+    collection = FakeCollection(make_docs(4))
+    stream = collection.stream
+    failures = []
+
+    def flaky_stream():
+        if not failures:
+            failures.append(1)
+            raise RuntimeError("deadline exceeded")
+        return stream()
+
+    collection.stream = flaky_stream
+    store = VolunteerStore(collection, poll_interval=3600, use_listener=False, retry_delay=0.5)
+    store.start()
+    deadline = time.time() + 5
+    while store.status()['state'] != 'failed' and time.time() < deadline:
+        time.sleep(0.01)
+    with pytest.raises(StoreNotReady, match="deadline exceeded"):
+        store.index()
+
+    index = store.index(wait=5)
+    assert len(index) == 4 and failures == [1]
+    assert store.status()['state'] == 'ready' and store.status()['error'] is None
+    store.stop()
@@ -0,0 +1,71 @@
+# 3_basic_function_testing/test_write_coalescer.py
+# Offline tests for coalescing API writes into batch commits, using an in-memory storage.
+
+import asyncio
+import datetime
+import os
+import sys
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'code_1', 'backend')
+sys.path.insert(0, os.path.abspath(BACKEND_DIR))
+
+from firebase_admin import firestore
+
+from write_coalescer import WriteCoalescer, resolve_server_timestamps
+
+
+class FakeWriteResult:
+    def __init__(self, update_time):
+        self.update_time = update_time
+
+class FakeStorage:
+    def __init__(self):
+        self.docs = {}
+        self.batch_sizes = []
+
+    async def commit(self, writes):
+        self.batch_sizes.append(len(writes))
+        if any(data.get('invalid') for op, ref, data in writes):
+            raise ValueError('invalid write')
+        update_time = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+        for op, ref, data in writes:
+            self.docs[ref] = data
+        return [FakeWriteResult(update_time) for _ in writes]
+
+
+def test_concurrent_writes_share_a_commit():
+    async def run():
+        storage = FakeStorage()
+        coalescer = WriteCoalescer(storage, linger=0.01)
+        results = await asyncio.gather(*(coalescer.set(f'doc{i}', {'n': i}) for i in range(10)))
+        return storage, results
+    storage, results = asyncio.run(run())
+    assert storage.batch_sizes == [10]
+    assert len(results) == 10 and len(storage.docs) == 10
+
+def test_full_batch_commits_without_waiting():
+    async def run():
+        storage = FakeStorage()
+        coalescer = WriteCoalescer(storage, max_batch=4, linger=60)
+        await asyncio.wait_for(asyncio.gather(*(coalescer.set(f'doc{i}', {'n': i}) for i in range(8))), 1)
+        return storage
+    assert asyncio.run(run()).batch_sizes == [4, 4]
+
+def test_failed_write_does_not_fail_the_others():
+    async def run():
+        storage = FakeStorage()
+        coalescer = WriteCoalescer(storage)
+        results = await asyncio.gather(coalescer.set('good1', {'n': 1}), coalescer.update('bad', {'invalid': True}),
+                                       coalescer.set('good2', {'n': 2}), return_exceptions=True)
+        return storage, results
+    storage, results = asyncio.run(run())
+    assert isinstance(results[1], ValueError)
+    assert isinstance(results[0], FakeWriteResult) and isinstance(results[2], FakeWriteResult)
+    assert set(storage.docs) == {'good1', 'good2'}
+
+def test_server_timestamps_resolve_to_the_commit_time():
+    write_result = FakeWriteResult(datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc))
+    data = {'name': 'Water', 'createdAt': firestore.SERVER_TIMESTAMP}
+    resolved = resolve_server_timestamps(data, write_result)
+    assert resolved == {'name': 'Water', 'createdAt': write_result.update_time}
+    assert data['createdAt'] is firestore.SERVER_TIMESTAMP # The written data is left as is
@@ -0,0 +1,220 @@
+# 1_code/geocoding.py
+
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+# Geocoding layer used by matching_ai.get_lat_long.
+# Every lookup is answered from a persistent SQLite cache when possible. Misses are
+# queued to one background worker that calls the provider (e.g. geopy's Nominatim)
+# no faster than min_interval, so single lookups, batches and concurrent callers all
+# share one rate limit. Identical addresses in flight share one provider call, and
+# failed lookups are cached too (negative caching) so they are not retried on every
+# request.
+
+NOT_FOUND = "not_found" # Cached result for an address the provider could not resolve
+
+
+def normalize_address(address):
+    """Cache key for an address: case- and whitespace-insensitive."""
+    return " ".join(address.split()).casefold()
+
+
+class GeocodeCache:
+    """
+    On-disk cache of geocoding results with LRU eviction.
+    get() returns (lat, lon), NOT_FOUND for a cached failure that has not expired,
+    or None on a miss. Pass path=":memory:" for a cache that is not persisted.
+
+    get() only reads: the use times that drive eviction are kept in memory and
+    written by the next put() (which commits anyway, and needs them to evict) or
+    flush(). Expired entries are left for put() to replace or purge.
+    """
+
+    def __init__(self, path, max_entries=10000):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = None
+        self._touched = {} # Address -> last use not yet written to the table
+
+    def _connect(self):
+        if self._conn is None:
+            if self.path != ":memory:" and os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS geocode ("
+                " address TEXT PRIMARY KEY, latitude REAL, longitude REAL,"
+                " expires REAL, used REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS geocode_used ON geocode (used)")
+        return self._conn
+
+    def get(self, key):
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT latitude, longitude, expires FROM geocode WHERE address = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            if row[2] is not None and row[2] <= now:
+                return None
+            self._touched[key] = now
+            return NOT_FOUND if row[0] is None else (row[0], row[1])
+
+    def _write_touches(self, conn):
+        if self._touched:
+            conn.executemany("UPDATE geocode SET used = ? WHERE address = ?",
+                             [(used, key) for key, used in self._touched.items()])
+            self._touched.clear()
+
+    def flush(self):
+        """Write the use times recorded by get() since the last put()."""
+        with self._lock:
+            if self._touched:
+                conn = self._connect()
+                self._write_touches(conn)
+                conn.commit()
+
+    def put(self, key, result, ttl=None):
+        """Store (lat, lon) or NOT_FOUND; ttl (seconds) makes the entry expire."""
+        latitude, longitude = (None, None) if result == NOT_FOUND else result
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            self._touched.pop(key, None)
+            self._write_touches(conn)
+            conn.execute("DELETE FROM geocode WHERE expires <= ?", (now,))
+            conn.execute(
+                "INSERT OR REPLACE INTO geocode (address, latitude, longitude, expires, used) VALUES (?, ?, ?, ?, ?)",
+                (key, latitude, longitude, None if ttl is None else now + ttl, now),
+            )
+            excess = conn.execute("SELECT COUNT(*) FROM geocode").fetchone()[0] - self.max_entries
+            if excess > 0: # Evict the least recently used entries
+                conn.execute(
+                    "DELETE FROM geocode WHERE address IN (SELECT address FROM geocode ORDER BY used LIMIT ?)",
+                    (excess,),
+                )
+            conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM geocode").fetchone()[0]
+
+
+class Geocoder:
+    """
+    Cached, rate-limited front end for a geopy-style geocoder (any object with
+    geocode(address, timeout=...) returning something with .latitude/.longitude,
+    or None). Results are (lat, lon) tuples, or None if the address cannot be
+    resolved (or was not resolved within the caller's timeout).
+
+    negative_ttl: how long an address the provider could not find stays cached.
+    error_ttl: how long a provider error (timeout, service error) stays cached.
+    """
+
+    def __init__(self, geocoder, cache_path=":memory:", max_entries=10000, min_interval=1.0,
+                 timeout=10, negative_ttl=24 * 3600, error_ttl=60):
+        self.geocoder = geocoder
+        self.cache = GeocodeCache(cache_path, max_entries)
+        self.min_interval = min_interval # Seconds between provider calls (Nominatim allows 1/s)
+        self.timeout = timeout
+        self.negative_ttl = negative_ttl
+        self.error_ttl = error_ttl
+        self.provider_calls = 0
+        self._lock = threading.Lock()
+        self._in_flight = {} # Cache key -> Future shared by every caller of that address
+        self._queue = queue.Queue()
+        self._worker = None
+        self._last_call = 0.0
+
+    def submit(self, address):
+        """Start resolving an address; returns a Future of (lat, lon) or None."""
+        if not address or not isinstance(address, str) or not address.strip():
+            future = Future()
+            future.set_result(None)
+            return future
+        key = normalize_address(address)
+        # Hits are answered without taking the lock; a miss that races the worker's
+        # put() is queued again and answered from the cache by _lookup
+        cached = self.cache.get(key)
+        future = Future()
+        if cached is not None:
+            future.set_result(None if cached == NOT_FOUND else cached)
+            return future
+        with self._lock:
+            in_flight = self._in_flight.get(key)
+            if in_flight is not None: # Coalesce with the lookup already in progress
+                return in_flight
+            self._in_flight[key] = future
+            self._ensure_worker()
+        self._queue.put((key, address, future))
+        return future
+
+    def geocode(self, address, timeout=None):
+        """Resolve one address, waiting at most `timeout` seconds (default self.timeout)."""
+        future = self.submit(address)
+        try:
+            return future.result(self.timeout if timeout is None else timeout)
+        except Exception: # Not resolved in time; the worker still fills the cache
+            return None
+
+    def geocode_many(self, addresses, timeout=None):
+        """
+        Resolve many addresses through the rate-limited worker.
+        Returns {address: (lat, lon) or None}; addresses still pending after
+        `timeout` seconds (default: no limit) map to None.
+        """
+        futures = {address: self.submit(address) for address in addresses}
+        deadline = None if timeout is None else time.monotonic() + timeout
+        results = {}
+        for address, future in futures.items():
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0.0)
+            try:
+                results[address] = future.result(remaining)
+            except Exception:
+                results[address] = None
+        return results
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name="geocoder", daemon=True)
+            self._worker.start()
+
+    def _run(self):
+        while True:
+            key, address, future = self._queue.get()
+            try:
+                result = self._lookup(key, address)
+            except Exception as e: # Never let one lookup stop the worker
+                print(f"Warning: Geocoding failed for '{address}': {e}")
+                result = None
+            with self._lock:
+                self._in_flight.pop(key, None)
+            future.set_result(result)
+
+    def _lookup(self, key, address):
+        cached = self.cache.get(key) # May have been filled since the address was queued
+        if cached is not None:
+            return None if cached == NOT_FOUND else cached
+        wait = self._last_call + self.min_interval - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        self._last_call = time.monotonic()
+        self.provider_calls += 1
+        try:
+            location = self.geocoder.geocode(address, timeout=self.timeout)
+        except Exception as e:
+            print(f"Warning: Geocoding failed for '{address}': {e}")
+            self.cache.put(key, NOT_FOUND, ttl=self.error_ttl)
+            return None
+        if not location:
+            self.cache.put(key, NOT_FOUND, ttl=self.negative_ttl)
+            return None
+        result = (location.latitude, location.longitude)
+        self.cache.put(key, result)
+        return result
@@ -1,67 +1,585 @@
 import os
 import sys
+import asyncio
+import base64
+import functools
+import json
+import logging
 import datetime # Import datetime for timestamps
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 
 # Allow importing matching_ai from this folder
 current_dir = os.path.dirname(os.path.abspath(__file__))
 if current_dir not in sys.path:
     sys.path.insert(0, current_dir)
 
-# Use Flask for compatibility with potential frontend assumptions based on previous versions
-from flask import Flask, request, jsonify
-from flask_cors import CORS
+# Async-native app served directly by uvicorn (no WSGI thread per request)
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
+from starlette.exceptions import HTTPException as StarletteHTTPException
+from starlette.requests import ClientDisconnect
+from starlette.responses import Response, StreamingResponse
+from werkzeug.http import http_date
 
 import firebase_admin
-from firebase_admin import credentials, firestore, auth as fb_auth
+from firebase_admin import credentials, firestore, firestore_async, auth as fb_auth
 from werkzeug.security import generate_password_hash, check_password_hash
 
 # Assuming matching_ai functions can be called directly
-from matching_ai import extract_features_request, get_best_matches, get_best_matches_debug
+from matching_ai import (
+    collect_data_quality, extract_features_request, extract_features_requests,
+    flush_geocoder, get_best_matches, get_best_matches_debug, phase_timer,
+)
+from metrics import CONTENT_TYPE, REGISTRY
+from response_cache import CachedResponse, ResponseCache, etag_matches, make_etag
+from storage import make_storage
+from tracing import TraceMiddleware, Traced, span, untraced
+from volunteer_store import StoreNotReady, VolunteerStore
+from write_coalescer import WriteCoalescer, resolve_server_timestamps
+
+# ————— Storage —————
+# Documents are read and written through a Storage (storage.py), chosen by
+# STORAGE_BACKEND: "firestore" (default), "memory" (nothing is persisted) or
+# "sqlite" (the file at STORAGE_SQLITE_PATH). The local backends need no
+# credentials; the auth endpoints, which need Firebase Auth, then answer 503.
+# Collections: volunteers, requests, resources, donations, users, alerts, meta.
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "firestore")
+STORAGE_SQLITE_PATH = os.getenv("STORAGE_SQLITE_PATH", os.path.join(current_dir, "local_store.sqlite3"))
+AUTH_ENABLED = STORAGE_BACKEND == "firestore"
+
+if STORAGE_BACKEND == "firestore":
+    # ————— Firebase Admin Initialization —————
+    cred_path = os.getenv(
+        "GOOGLE_APPLICATION_CREDENTIALS",
+        os.path.join(current_dir, "serviceAccountKey.json")
+    )
+    if not os.path.exists(cred_path):
+        print(f"Service account key not found at {cred_path}")
+        exit(1)
+    if not firebase_admin._apps:
+        cred = credentials.Certificate(cred_path)
+        firebase_admin.initialize_app(cred)
+    # The synchronous client is used only by the volunteer store's own thread,
+    # the async client for everything the request handlers read and write
+    storage = make_storage("firestore", client=firestore.client(), async_client=firestore_async.client())
+else:
+    storage = make_storage(STORAGE_BACKEND, path=STORAGE_SQLITE_PATH)
+
+# Writes from the handlers are coalesced into batch commits (see write_coalescer.py):
+# up to WRITE_BATCH_MAX writes, committed at most WRITE_BATCH_LINGER_MS after the first.
+WRITE_BATCH_MAX = int(os.getenv("WRITE_BATCH_MAX", "500"))
+WRITE_BATCH_LINGER_MS = float(os.getenv("WRITE_BATCH_LINGER_MS", "5"))
+write_coalescer = WriteCoalescer(storage, max_batch=WRITE_BATCH_MAX, linger=WRITE_BATCH_LINGER_MS / 1000)
+
+# ————— Request Tracing —————
+# A TRACE_SAMPLE_RATE fraction of requests (and every request sending X-Trace-Id)
+# is traced: each storage and Firebase Auth call it makes is counted and timed,
+# reported in the X-Trace-Id and Server-Timing response headers and in one log
+# line per request (see tracing.py). Writes are counted as the set/update calls
+# the handler waits for; the coalescer's batch commits belong to no one request.
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.1"))
+write_coalescer = Traced(write_coalescer, "storage", methods=("set", "update"))
+storage = Traced(storage, "storage", methods=("get", "get_many", "query", "commit", "add"), streams=("stream",))
+
+logger = logging.getLogger("main")
+trace_logger = logging.getLogger("trace")
+_handler = logging.StreamHandler()
+_handler.setFormatter(logging.Formatter("[%(asctime)s] %(levelname)s in %(module)s: %(message)s"))
+if not logger.handlers: # Same output format as the Flask app logger this replaces
+    logger.addHandler(_handler)
+if not trace_logger.handlers:
+    trace_logger.addHandler(_handler)
+    trace_logger.setLevel(logging.INFO)
+
+# ————— Matching Configuration —————
+# Geo stage for matching: only volunteers within MATCH_RADIUS_KM and/or the nearest
+# MATCH_GEO_CANDIDATES (great-circle) are ranked. Leave both unset to rank everyone.
+# Exact ranking of everyone stays the default because it returns exactly what the
+# original StandardScaler + NearestNeighbors pipeline (and /debug-match) returns;
+# it costs one vectorised pass over the volunteers per query (the scaled rows are
+# cached between changes). For sub-linear match latency at scale, set
+# MATCH_GEO_CANDIDATES (e.g. 500) or MATCH_BACKEND=grid; both trade exactness
+# for speed, and matches then differ from /debug-match.
+MATCH_RADIUS_KM = float(os.environ["MATCH_RADIUS_KM"]) if os.getenv("MATCH_RADIUS_KM") else None
+MATCH_GEO_CANDIDATES = int(os.environ["MATCH_GEO_CANDIDATES"]) if os.getenv("MATCH_GEO_CANDIDATES") else None
+# Neighbor backend for the volunteer index: "exact" (default) or "grid" (approximate;
+# MATCH_GRID_CANDIDATES trades recall for latency, see matching_ai.GridBackend)
+MATCH_BACKEND = os.getenv("MATCH_BACKEND", "exact")
+MATCH_BACKEND_OPTIONS = {}
+if MATCH_BACKEND == "grid":
+    MATCH_BACKEND_OPTIONS = {
+        "cell_km": float(os.getenv("MATCH_GRID_CELL_KM", "10")),
+        "n_candidates": int(os.getenv("MATCH_GRID_CANDIDATES", "256")),
+    }
+DEFAULT_MATCH_K = 3 # Matches per request when the caller does not ask for a k
+MAX_MATCH_K = 50
+MAX_BATCH_MATCH_REQUESTS = 500 # Requests accepted by one POST /match/batch
+# Matching (CPU-bound) runs on MATCH_WORKERS threads so it never blocks the event loop.
+# Matching for POST /requests runs in the background; results are written back onto
+# the request document (matchStatus: pending -> complete/failed).
+MATCH_WORKERS = int(os.getenv("MATCH_WORKERS", "4"))
+MATCH_QUEUE_MAX = int(os.getenv("MATCH_QUEUE_MAX", "200")) # Background matches in flight before new ones are refused
+MATCH_JOB_READY_TIMEOUT = 60 # Seconds a background match waits for volunteers to load
+
+# ————— Volunteer Store —————
+# Matching reads volunteers from one process-wide VolunteerStore (volunteer_store.py):
+# it loads the collection once, warm starting from the index snapshot at
+# MATCH_SNAPSHOT_PATH when that is current, then applies changes from a snapshot
+# listener (VOLUNTEER_SYNC=listener, the default) or by polling the version marker
+# every VOLUNTEER_POLL_INTERVAL seconds (VOLUNTEER_SYNC=poll).
+# Anything that writes volunteers should bump meta/volunteers.version
+# (populate_database.py does); without the marker the document count is used,
+# which misses in-place updates.
+MATCH_SNAPSHOT_PATH = os.getenv("MATCH_SNAPSHOT_PATH", os.path.join(current_dir, "volunteer_index.snapshot"))
+MATCH_WARM_START = os.getenv("MATCH_WARM_START", "1") == "1" # Load volunteers when the worker starts
+VOLUNTEER_SYNC = os.getenv("VOLUNTEER_SYNC", "listener")
+VOLUNTEER_POLL_INTERVAL = float(os.getenv("VOLUNTEER_POLL_INTERVAL", "30"))
+VOLUNTEER_MAX_STALENESS = float(os.getenv("VOLUNTEER_MAX_STALENESS", "120")) # Seconds before a read forces a sync
+VOLUNTEER_READY_TIMEOUT = float(os.getenv("VOLUNTEER_READY_TIMEOUT", "2")) # Seconds a request waits for the initial load
 
-# Import the ASGI middleware
-from a2wsgi import ASGIMiddleware as WSGIMiddleware # Use this import
+def volunteers_version():
+    """Version marker of the volunteers collection and of the index configuration."""
+    meta = storage.get_sync("meta", "volunteers")
+    version = meta.to_dict().get("version") if meta.exists else None
+    if version is None:
+        version = f"count:{storage.count_sync('volunteers')}"
+    return (version, MATCH_BACKEND, tuple(sorted(MATCH_BACKEND_OPTIONS.items())))
 
-# ————— Firebase Admin Initialization —————
-cred_path = os.getenv(
-    "GOOGLE_APPLICATION_CREDENTIALS",
-    os.path.join(current_dir, "serviceAccountKey.json")
+volunteers_collection = storage.sync_collection("volunteers") # Only Firestore's supports a listener
+volunteer_store = VolunteerStore(
+    volunteers_collection,
+    version_fn=volunteers_version,
+    snapshot_path=MATCH_SNAPSHOT_PATH,
+    backend=MATCH_BACKEND,
+    backend_options=MATCH_BACKEND_OPTIONS,
+    poll_interval=VOLUNTEER_POLL_INTERVAL,
+    max_staleness=VOLUNTEER_MAX_STALENESS,
+    use_listener=VOLUNTEER_SYNC == "listener" and hasattr(volunteers_collection, "on_snapshot"),
 )
-if not os.path.exists(cred_path):
-    print(f"Service account key not found at {cred_path}")
-    exit(1)
-if not firebase_admin._apps:
-    cred = credentials.Certificate(cred_path)
-    firebase_admin.initialize_app(cred)
-
-db = firestore.client()
-
-# ————— Collection References —————
-volunteers_ref = db.collection("volunteers")
-requests_ref   = db.collection("requests")
-resources_ref  = db.collection("resources")
-donations_ref  = db.collection("donations")
-users_ref      = db.collection("users")
-alerts_ref     = db.collection("alerts")
-
-# ————— Flask App Setup —————
-_flask_app = Flask(__name__) # Rename original Flask app instance
-CORS(_flask_app) # Enable CORS for the Flask app
+
+def get_volunteer_index(wait=VOLUNTEER_READY_TIMEOUT):
+    """Return the volunteer index; raises StoreNotReady while volunteers are still loading."""
+    return volunteer_store.index(wait=wait)
+
+match_executor = ThreadPoolExecutor(max_workers=MATCH_WORKERS, thread_name_prefix="match")
+_match_tasks = set() # Background match tasks in flight (holding them keeps them alive)
+
+async def run_matching(fn, *args, **kwargs):
+    """Run blocking or CPU-bound matching work on match_executor."""
+    return await asyncio.get_running_loop().run_in_executor(match_executor, functools.partial(fn, *args, **kwargs))
+
+def match_coordinates(request_data):
+    """
+    Copy of a request dictionary with the float latitude/longitude it is matched at.
+    A missing or null coordinate is 0.0 (no location: ranked against every volunteer);
+    raises ValueError if one is not a number. Every match route goes through this.
+    """
+    try:
+        latitude, longitude = (float(0.0 if request_data.get(key) is None else request_data[key])
+                               for key in ("latitude", "longitude"))
+    except (TypeError, ValueError):
+        raise ValueError("Invalid latitude/longitude")
+    return dict(request_data, latitude=latitude, longitude=longitude)
+
+def match_request_data(request_data, wait=VOLUNTEER_READY_TIMEOUT):
+    """Best volunteer matches for one request dictionary (runs on match_executor)."""
+    index = get_volunteer_index(wait)
+    if not len(index):
+        logger.info("No volunteers found to match against.")
+        return []
+    # Ensure request data passed to matching uses internal field names if needed
+    features = extract_features_request(request_data)
+    return get_best_matches(features, index, radius_km=MATCH_RADIUS_KM, max_candidates=MATCH_GEO_CANDIDATES)
+
+async def _match_request_job(doc_ref, request_data):
+    """Match one stored request and write the outcome back onto its document."""
+    try:
+        matches = await run_matching(match_request_data, request_data, MATCH_JOB_READY_TIMEOUT)
+        await write_coalescer.update(doc_ref, {"matchStatus": "complete", "matches": matches, "matchedAt": firestore.SERVER_TIMESTAMP})
+        response_cache.invalidate("requests")
+    except Exception as e:
+        logger.error(f"Error during volunteer matching for request {doc_ref.id}: {e}")
+        try:
+            await write_coalescer.update(doc_ref, {"matchStatus": "failed", "matchError": str(e)})
+            response_cache.invalidate("requests")
+        except Exception as update_e:
+            logger.error(f"Could not record match failure for request {doc_ref.id}: {update_e}")
+
+def submit_match_job(doc_ref, request_data):
+    """Start matching a stored request in the background. Returns False if too many are in flight."""
+    if len(_match_tasks) >= MATCH_QUEUE_MAX:
+        return False
+    # The job outlives the request, so its writes are not counted in the request's trace
+    task = untraced(asyncio.get_running_loop().create_task, _match_request_job(doc_ref, request_data))
+    _match_tasks.add(task)
+    task.add_done_callback(_match_tasks.discard)
+    return True
+
+# ————— JSON Responses —————
+# Bodies are encoded exactly as Flask's jsonify encoded them (sorted keys, compact
+# separators, trailing newline, datetimes as HTTP dates), so clients see the same bytes.
+def _json_default(o):
+    if isinstance(o, datetime.date):
+        return http_date(o)
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+def dumps(obj):
+    return json.dumps(obj, default=_json_default, ensure_ascii=True, sort_keys=True, separators=(",", ":"))
+
+class JSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content):
+        return f"{dumps(content)}\n".encode("utf-8")
+
+def jsonify(obj, status_code=200, headers=None):
+    return JSONResponse(obj, status_code=status_code, headers=headers)
+
+async def get_json(request, silent=False):
+    """
+    Parse the request body as JSON, as Flask's request.get_json() did: 415 if the
+    body is not declared as JSON, 400 if it does not parse (or None if silent).
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type != "application/json" and not (content_type.startswith("application/") and content_type.endswith("+json")):
+        if silent:
+            return None
+        raise HTTPException(415, "Did not attempt to load JSON data because the request Content-Type was not 'application/json'.")
+    try:
+        return json.loads(await request.body())
+    except ValueError:
+        if silent:
+            return None
+        raise HTTPException(400, "Failed to decode JSON object")
+
+async def get_json_object(request, silent=False):
+    """get_json for handlers that expect a JSON object: any other JSON value is a 400 (or None if silent)."""
+    data = await get_json(request, silent)
+    if data is not None and not isinstance(data, dict):
+        if silent:
+            return None
+        raise HTTPException(400, "Request body must be a JSON object")
+    return data
+
+def _not_ready_response(e):
+    return jsonify({"error": str(e), "status": volunteer_store.status()}, 503, headers={"Retry-After": "5"})
+
+# ————— App Setup —————
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    volunteer_store.stop()
+    match_executor.shutdown(wait=False)
+    flush_geocoder() # Keep the LRU order of cache hits since the last lookup
+
+app = FastAPI(title="Disaster Relief Backend", lifespan=lifespan)
+app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"],
+                   expose_headers=["X-Next-Cursor", "ETag", "X-Trace-Id", "Server-Timing"])
+app.add_middleware(TraceMiddleware, sample_rate=TRACE_SAMPLE_RATE, logger=trace_logger)
+
+@app.exception_handler(StarletteHTTPException)
+async def http_error_response(request, exc):
+    """HTTP errors raised by the JSON helpers or the router (unknown route, wrong method) as {"error": ...}."""
+    return jsonify({"error": exc.detail}, exc.status_code, headers=exc.headers)
+
+# ————— Pagination —————
+# List endpoints return one page, newest first: ?limit=N (default DEFAULT_PAGE_SIZE,
+# capped at MAX_PAGE_SIZE) and ?cursor=<X-Next-Cursor of the previous page>.
+# The body stays a plain JSON array; the X-Next-Cursor header is absent on the last page.
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", "100"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "500"))
+
+def encode_cursor(doc):
+    """
+    Opaque start-after cursor for a document: its createdAt and id. A null
+    createdAt (documents written without a timestamp) is kept as null; such
+    documents sort after all dated ones, newest first, as the datastore orders them.
+    """
+    created_at = doc.to_dict().get("createdAt")
+    raw = json.dumps([None if created_at is None else created_at.isoformat(), doc.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor; raises ValueError for a malformed cursor."""
+    try:
+        created_at, doc_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if created_at is not None:
+            created_at = datetime.datetime.fromisoformat(created_at)
+        if not isinstance(doc_id, str):
+            raise ValueError("Invalid cursor")
+        return created_at, doc_id
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def page_params(request):
+    """(limit, cursor) from the query string; raises ValueError for bad values."""
+    try:
+        limit = int(request.query_params.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ValueError("'limit' must be an integer")
+    if limit < 1:
+        raise ValueError("'limit' must be at least 1")
+    cursor = request.query_params.get('cursor')
+    return min(limit, MAX_PAGE_SIZE), decode_cursor(cursor) if cursor else None
+
+async def fetch_page(collection, limit, cursor):
+    """Return (docs, next_cursor) for one page of a collection ordered by createdAt, newest first."""
+    # Ties on createdAt are broken by document id so the cursor is exact
+    docs = await storage.query(collection, order_by="createdAt", descending=True, start_after=cursor,
+                               limit=limit + 1) # One extra document tells whether another page exists
+    next_cursor = encode_cursor(docs[limit - 1]) if len(docs) > limit else None
+    return docs[:limit], next_cursor
+
+# ————— Response Cache —————
+# Pages of the list endpoints are cached per collection and query string, with an
+# ETag; a matching If-None-Match gets a bodyless 304. POST handlers invalidate their
+# collection; RESPONSE_CACHE_TTL bounds the staleness after writes made outside the
+# API (populate_database.py, the Firebase console). RESPONSE_CACHE_TTL=0 disables it.
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "30"))
+response_cache = ResponseCache(ttl=RESPONSE_CACHE_TTL)
+
+def conditional_response(request, entry):
+    headers = dict(entry.headers, ETag=entry.etag)
+    headers["Cache-Control"] = "no-cache" # Clients may keep it but must revalidate
+    if etag_matches(request.headers.get("if-none-match"), entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(entry.body, media_type="application/json", headers=headers)
+
+async def cached_page(request, label, to_item, limit, cursor):
+    """One page of a list endpoint, from the response cache when possible."""
+    key = str(sorted(request.query_params.multi_items()))
+    entry = response_cache.get(label, key) if RESPONSE_CACHE_TTL > 0 else None
+    if entry is None:
+        generation = response_cache.generation(label)
+        try:
+            docs, next_cursor = await fetch_page(label, limit, cursor)
+            items = [to_item(doc) for doc in docs]
+        except Exception as e:
+            logger.error(f"Error listing {label}: {e}")
+            return jsonify({"error": f"Failed to retrieve {label}"}, 500)
+        body = JSONResponse(items).body
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+        if RESPONSE_CACHE_TTL > 0:
+            entry = response_cache.put(label, key, body, headers, generation)
+        else:
+            entry = CachedResponse(body, make_etag(body), headers, 0)
+    return conditional_response(request, entry)
+
+# ————— Streaming —————
+# For full exports the list endpoints can stream the whole collection instead of one
+# page: "Accept: application/x-ndjson" gives one JSON document per line, ?stream=1 a
+# JSON array. Documents are encoded as they arrive from storage and sent in chunks
+# of about STREAM_CHUNK_BYTES, so memory stays flat whatever the collection size.
+# A cursor, if given, is honoured; limit is not. If the stream fails part way the
+# error is logged and the response ends early: an array is left unclosed (so it does
+# not parse), and NDJSON ends with an {"error": ...} line, since a truncated NDJSON
+# body would otherwise look complete.
+STREAM_CHUNK_BYTES = 64 * 1024
+
+def stream_mode(request):
+    """'ndjson', 'array', or None when the client asked for a normal page."""
+    if "application/x-ndjson" in request.headers.get("accept", ""):
+        return "ndjson"
+    if request.query_params.get("stream", "").lower() in ("1", "true"):
+        return "array"
+    return None
+
+def stream_response(label, to_item, cursor, mode):
+    """Streamed response over every document of collection `label` (newest first), encoded by to_item."""
+    ndjson = mode == "ndjson"
+
+    async def generate():
+        if not ndjson:
+            yield "[" # First byte goes out before the first document is read
+        chunk, size, n = [], 0, 0
+        try:
+            async for doc in storage.stream(label, order_by="createdAt", descending=True, start_after=cursor):
+                encoded = dumps(to_item(doc))
+                piece = encoded + "\n" if ndjson else ("," if n else "") + encoded
+                n += 1
+                chunk.append(piece)
+                size += len(piece)
+                if size >= STREAM_CHUNK_BYTES:
+                    yield "".join(chunk)
+                    chunk, size = [], 0
+        except Exception as e:
+            logger.error(f"Error streaming {label}: {e}")
+            if ndjson:
+                chunk.append(dumps({"error": f"Failed to retrieve {label}"}) + "\n")
+            if chunk:
+                yield "".join(chunk)
+            return
+        if chunk:
+            yield "".join(chunk)
+        if not ndjson:
+            yield "]\n"
+
+    media_type = "application/x-ndjson" if ndjson else "application/json"
+    return StreamingResponse(generate(), media_type=media_type, headers={"X-Accel-Buffering": "no"})
+
+# ————— Bulk Ingestion —————
+# POST /<collection>/bulk takes an NDJSON body (one JSON object per line, e.g. a
+# partner agency's export) and validates each record with the same rules as the
+# single-item POST. Valid records are written BULK_CHUNK_SIZE at a time through
+# the write coalescer, so each chunk goes out as one batch commit within
+# Firestore's 500-write limit. The response streams one NDJSON result line per
+# input line as its chunk completes: {"line": n, "status": 201, "id": ...} or
+# {"line": n, "status": 400|500, "error": ...}. Blank lines are skipped.
+# The body is read from the request stream as it arrives, so memory stays at about
+# one chunk whatever the upload size. A body over BULK_MAX_BYTES (by Content-Length)
+# is refused with 413 up front; otherwise reading stops once the body passes
+# BULK_MAX_BYTES or BULK_MAX_RECORDS records, the records before that are written,
+# and the response ends with a {"line": n, "status": 413, "error": ...} line.
+BULK_CHUNK_SIZE = min(int(os.getenv("BULK_CHUNK_SIZE", "500")), 500)
+BULK_MAX_BYTES = int(os.getenv("BULK_MAX_BYTES", str(64 * 1024 * 1024)))
+BULK_MAX_RECORDS = int(os.getenv("BULK_MAX_RECORDS", "100000"))
+NDJSON_TYPES = ("application/x-ndjson", "application/jsonl")
+
+class BulkLimitExceeded(Exception):
+    def __init__(self, line, message):
+        super().__init__(message)
+        self.line = line
+
+async def ndjson_lines(chunks, max_bytes=None):
+    """
+    (line number, raw line) for each non-blank line of an NDJSON body arriving as
+    byte chunks; raises BulkLimitExceeded once more than max_bytes have arrived.
+    """
+    buffer, line_no, size = b"", 0, 0
+    async for data in chunks:
+        size += len(data)
+        if max_bytes is not None and size > max_bytes:
+            raise BulkLimitExceeded(line_no + 1, f"Bulk uploads are limited to {max_bytes} bytes")
+        *lines, buffer = (buffer + data).split(b"\n")
+        for line in lines:
+            line_no += 1
+            if line.strip():
+                yield line_no, line
+    if buffer.strip():
+        yield line_no + 1, buffer
+
+def _bulk_record(line_no, line, from_json):
+    """(line, document, error) entry for one line of a bulk upload."""
+    try:
+        record = json.loads(line)
+        if not isinstance(record, dict):
+            raise ValueError("Each line must be a JSON object")
+        return line_no, from_json(record), None
+    except ValueError as e: # Includes JSON decode errors
+        return line_no, None, str(e)
+    except Exception: # Fields of the wrong type (e.g. a numeric "detail")
+        return line_no, None, "Invalid record"
+
+async def _write_chunk(label, chunk, written):
+    """
+    Write the valid records of one chunk of (line, document, error) entries;
+    returns the chunk's result lines, in input order.
+    """
+    refs = {line_no: storage.document(label) for line_no, data, _ in chunk if data is not None}
+    outcomes = await asyncio.gather(*(write_coalescer.set(refs[line_no], data) for line_no, data, _ in chunk if data is not None),
+                                    return_exceptions=True)
+    outcomes = dict(zip(refs, outcomes))
+    if refs:
+        response_cache.invalidate(label)
+    lines = []
+    for line_no, data, error in chunk:
+        if error is not None:
+            lines.append(dumps({"line": line_no, "status": 400, "error": error}))
+        elif isinstance(outcomes[line_no], Exception):
+            logger.error(f"Error creating {label} from bulk line {line_no}: {outcomes[line_no]}")
+            lines.append(dumps({"line": line_no, "status": 500, "error": "Failed to create record"}))
+        else:
+            lines.append(dumps({"line": line_no, "status": 201, "id": refs[line_no].id}))
+            if written is not None:
+                written.append((refs[line_no], data))
+    return "".join(line + "\n" for line in lines)
+
+class BulkResponse(StreamingResponse):
+    """
+    StreamingResponse whose body generator reads the request body. It does not also
+    listen for a client disconnect, which would race the generator for receive();
+    reading the body reports a disconnect instead.
+    """
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await self.stream_response(send)
+        except OSError:
+            raise ClientDisconnect()
+        if self.background is not None:
+            await self.background()
+
+async def bulk_response(request, label, from_json, finish=None):
+    """
+    Streamed NDJSON response for a bulk upload to collection `label`; from_json builds a
+    document from one record or raises ValueError. finish, if given, is an async
+    generator over the written (doc_ref, data) pairs whose output is appended.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type not in NDJSON_TYPES:
+        return jsonify({"error": f"Bulk uploads must be sent as {NDJSON_TYPES[0]}"}, 415)
+    try:
+        too_large = int(request.headers.get("content-length", 0)) > BULK_MAX_BYTES
+    except ValueError:
+        return jsonify({"error": "Invalid Content-Length"}, 400)
+    if too_large:
+        return jsonify({"error": f"Bulk uploads are limited to {BULK_MAX_BYTES} bytes"}, 413)
+
+    async def generate():
+        written = [] if finish else None
+        chunk, records, limit = [], 0, None
+        try:
+            async for line_no, line in ndjson_lines(request.stream(), BULK_MAX_BYTES):
+                records += 1
+                if records > BULK_MAX_RECORDS:
+                    raise BulkLimitExceeded(line_no, f"Bulk uploads are limited to {BULK_MAX_RECORDS} records")
+                chunk.append(_bulk_record(line_no, line, from_json))
+                if len(chunk) >= BULK_CHUNK_SIZE:
+                    yield await _write_chunk(label, chunk, written)
+                    chunk = []
+        except BulkLimitExceeded as e:
+            limit = e
+        except ClientDisconnect:
+            logger.warning(f"Client disconnected during bulk upload to {label}; {len(chunk)} parsed records were not written")
+            return
+        if chunk:
+            yield await _write_chunk(label, chunk, written)
+        if limit is not None:
+            yield dumps({"line": limit.line, "status": 413, "error": str(limit)}) + "\n"
+        if finish and written:
+            async for lines in finish(written):
+                yield lines
+
+    return BulkResponse(generate(), media_type="application/x-ndjson", headers={"X-Accel-Buffering": "no"})
 
 # --- Authentication Endpoints (Email/Password based) ---
-@_flask_app.route('/signup', methods=['POST'])
-def signup():
-    data = request.get_json()
+async def auth_call(fn, *args, **kwargs):
+    """Call a Firebase Auth function (which has no async API) off the event loop, traced as auth.<name>."""
+    with span(f"auth.{fn.__name__}"):
+        return await run_in_threadpool(fn, *args, **kwargs)
+
+def _auth_unavailable():
+    return jsonify({"error": "Authentication needs Firebase (STORAGE_BACKEND=firestore)"}, 503)
+
+@app.post('/signup')
+async def signup(request: Request):
+    if not AUTH_ENABLED:
+        return _auth_unavailable()
+    data = await get_json_object(request)
     email = data.get('email')
     password = data.get('password')
     name = data.get('name') # Assuming frontend sends 'name'
     user_type = data.get('userType', 'donor') # Assuming frontend might send userType
 
     if not all([email, password, name]):
-        return jsonify({"error": "Missing email, password, or name"}), 400
+        return jsonify({"error": "Missing email, password, or name"}, 400)
 
     try:
         # Create Firebase Auth user
-        user_record = fb_auth.create_user(
+        user_record = await auth_call(
+            fb_auth.create_user,
             email=email,
             password=password,
             display_name=name
@@ -76,7 +594,7 @@ def signup():
             "userType": user_type,
             "createdAt": firestore.SERVER_TIMESTAMP
         }
-        users_ref.document(uid).set(profile_data)
+        await write_coalescer.set(storage.document("users", uid), profile_data)
 
         # Return success message AND the created profile data
         return jsonify({
@@ -86,27 +604,29 @@ def signup():
             "name": name,
             "userType": user_type
             # Add other fields if needed by frontend immediately after signup
-        }), 201
+        }, 201)
 
     except fb_auth.EmailAlreadyExistsError:
-        return jsonify({"error": f"Email already exists: {email}"}), 409
+        return jsonify({"error": f"Email already exists: {email}"}, 409)
     except fb_auth.FirebaseAuthError as e:
-        _flask_app.logger.error(f"Firebase Auth Error during signup for {email}: {e}")
-        return jsonify({"error": f"Firebase signup failed: {e.code}"}), 400
+        logger.error(f"Firebase Auth Error during signup for {email}: {e}")
+        return jsonify({"error": f"Firebase signup failed: {e.code}"}, 400)
     except Exception as e:
-        _flask_app.logger.error(f"Unexpected error during signup for {email}: {e}")
+        logger.error(f"Unexpected error during signup for {email}: {e}")
         # Consider deleting the auth user if Firestore save fails critically
         # if 'user_record' in locals(): fb_auth.delete_user(user_record.uid)
-        return jsonify({"error": "An unexpected server error occurred during signup."}), 500
+        return jsonify({"error": "An unexpected server error occurred during signup."}, 500)
 
-@_flask_app.route('/signin', methods=['POST'])
-def signin():
-    data = request.get_json()
+@app.post('/signin')
+async def signin(request: Request):
+    if not AUTH_ENABLED:
+        return _auth_unavailable()
+    data = await get_json_object(request)
     email = data.get('email')
     password = data.get('password') # Frontend sends email/password
 
     if not all([email, password]):
-        return jsonify({"error": "Missing email or password"}), 400
+        return jsonify({"error": "Missing email or password"}, 400)
 
     try:
         # Note: Firebase Admin SDK cannot directly sign in with email/password.
@@ -115,11 +635,11 @@ def signin():
         # 1. Get the user by email
         # 2. If user exists, fetch their profile from Firestore.
         # WARNING: This does NOT verify the password. True password verification MUST happen client-side with Firebase SDK.
-        user_record = fb_auth.get_user_by_email(email)
+        user_record = await auth_call(fb_auth.get_user_by_email, email)
         uid = user_record.uid
 
         # Fetch Firestore profile
-        profile_doc = users_ref.document(uid).get()
+        profile_doc = await storage.get("users", uid)
         if profile_doc.exists:
             profile_data = profile_doc.to_dict()
             # Return profile data (frontend expects this on signin)
@@ -130,10 +650,10 @@ def signin():
                 "name": profile_data.get('name'),
                 "userType": profile_data.get('userType')
                 # Add any other fields the frontend ProfileScreen expects
-            }), 200
+            }, 200)
         else:
              # Handle case where Auth user exists but Firestore profile doesn't
-             _flask_app.logger.warning(f"Firestore profile missing for user {uid} during signin attempt.")
+             logger.warning(f"Firestore profile missing for user {uid} during signin attempt.")
              # Return basic info from Auth user? Or error?
              return jsonify({
                  "message": "Sign in successful (profile missing, password not verified)",
@@ -141,37 +661,38 @@ def signin():
                  "email": user_record.email,
                  "name": user_record.display_name,
                  "userType": "donor" # Default or guess
-             }), 200
-             # return jsonify({"error": "User profile not found in database"}), 404
+             }, 200)
+             # return jsonify({"error": "User profile not found in database"}, 404)
 
     except fb_auth.UserNotFoundError:
-        return jsonify({"error": "User not found for this email"}), 404
+        return jsonify({"error": "User not found for this email"}, 404)
     except Exception as e:
-        _flask_app.logger.error(f"Error during sign in attempt for {email}: {e}")
-        return jsonify({"error": f"An error occurred during sign in: {e}"}), 500
+        logger.error(f"Error during sign in attempt for {email}: {e}")
+        return jsonify({"error": f"An error occurred during sign in: {e}"}, 500)
 
 
 # ————— Resources —————
 # WARNING: These endpoints are now unprotected without token verification.
-@_flask_app.route('/resources', methods=['GET'])
-def list_resources():
-    resources = []
+def resource_item(doc):
+    data = doc.to_dict()
+    data["id"] = doc.id
+    # Ensure field names match frontend Resource model (name, description, quantity, category, location?)
+    # Example: Rename backend field if needed: data['frontendFieldName'] = data.pop('backendFieldName')
+    return data
+
+@app.get('/resources')
+async def list_resources(request: Request):
     try:
-        docs = resources_ref.order_by("createdAt", direction=firestore.Query.DESCENDING).stream()
-        for doc in docs:
-            data = doc.to_dict()
-            data["id"] = doc.id
-            # Ensure field names match frontend Resource model (name, description, quantity, category, location?)
-            # Example: Rename backend field if needed: data['frontendFieldName'] = data.pop('backendFieldName')
-            resources.append(data)
-        return jsonify(resources), 200
-    except Exception as e:
-        _flask_app.logger.error(f"Error listing resources: {e}")
-        return jsonify({"error": "Failed to retrieve resources"}), 500
+        limit, cursor = page_params(request)
+    except ValueError as e:
+        return jsonify({"error": str(e)}, 400)
+    mode = stream_mode(request)
+    if mode:
+        return stream_response("resources", resource_item, cursor, mode)
+    return await cached_page(request, "resources", resource_item, limit, cursor)
 
-@_flask_app.route('/resources', methods=['POST'])
-def create_resource():
-    data = request.get_json()
+def resource_from_json(data):
+    """Resource document for a POSTed payload; raises ValueError if required data is missing."""
     # Extract fields based on frontend Resource model
     name = data.get('name')
     quantity = data.get('quantity')
@@ -180,52 +701,66 @@ def create_resource():
     # location = data.get('location') # Add if frontend sends location
 
     if not all([name, quantity is not None]): # Check quantity is present, even if 0
-         return jsonify({"error": "Missing required resource data (name, quantity)"}), 400
+         raise ValueError("Missing required resource data (name, quantity)")
+
+    return {
+        "name": name,
+        "quantity": quantity,
+        "description": description,
+        "category": category,
+        # "location": location,
+        # "addedByUid": uid, # Cannot add UID reliably without auth
+        "createdAt": firestore.SERVER_TIMESTAMP
+    }
 
+@app.post('/resources')
+async def create_resource(request: Request):
+    data = await get_json_object(request)
     try:
-        resource_data = {
-            "name": name,
-            "quantity": quantity,
-            "description": description,
-            "category": category,
-            # "location": location,
-            # "addedByUid": uid, # Cannot add UID reliably without auth
-            "createdAt": firestore.SERVER_TIMESTAMP
-        }
-        timestamp, doc_ref = resources_ref.add(resource_data)
-        new_doc = doc_ref.get()
-        if new_doc.exists:
-             response_data = new_doc.to_dict()
-             response_data["id"] = new_doc.id
-             return jsonify(response_data), 201
-        else:
-             return jsonify({"error": "Failed to retrieve created resource"}), 500
+        resource_data = resource_from_json(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}, 400)
+
+    try:
+        doc_ref = storage.document("resources")
+        write_result = await write_coalescer.set(doc_ref, resource_data)
+        response_cache.invalidate("resources")
+        # Respond with what was written (no read-back); createdAt is the commit time
+        response_data = resolve_server_timestamps(resource_data, write_result)
+        response_data["id"] = doc_ref.id
+        return jsonify(response_data, 201)
     except Exception as e:
-        _flask_app.logger.error(f"Error creating resource: {e}")
-        return jsonify({"error": "Failed to create resource"}), 500
+        logger.error(f"Error creating resource: {e}")
+        return jsonify({"error": "Failed to create resource"}, 500)
+
+@app.post('/resources/bulk')
+async def bulk_create_resources(request: Request):
+    """Create resources from an NDJSON body; streams one result line per record (see bulk_response)."""
+    return await bulk_response(request, "resources", resource_from_json)
 
 # ————— Requests & Matching —————
-@_flask_app.route('/requests', methods=['GET'])
-def list_requests():
-    requests_list = []
+def request_item(doc):
+    data = doc.to_dict()
+    data["id"] = doc.id
+    # Ensure field names match frontend Request model
+    # Frontend uses 'name', backend used 'title'. Rename here for compatibility.
+    if 'title' in data:
+        data['name'] = data.pop('title')
+    return data
+
+@app.get('/requests')
+async def list_requests(request: Request):
     try:
-        docs = requests_ref.order_by("createdAt", direction=firestore.Query.DESCENDING).stream()
-        for doc in docs:
-            data = doc.to_dict()
-            data["id"] = doc.id
-            # Ensure field names match frontend Request model
-            # Frontend uses 'name', backend used 'title'. Rename here for compatibility.
-            if 'title' in data:
-                data['name'] = data.pop('title')
-            requests_list.append(data)
-        return jsonify(requests_list), 200
-    except Exception as e:
-        _flask_app.logger.error(f"Error listing requests: {e}")
-        return jsonify({"error": "Failed to retrieve requests"}), 500
+        limit, cursor = page_params(request)
+    except ValueError as e:
+        return jsonify({"error": str(e)}, 400)
+    mode = stream_mode(request)
+    if mode:
+        return stream_response("requests", request_item, cursor, mode)
+    return await cached_page(request, "requests", request_item, limit, cursor)
 
-@_flask_app.route('/requests', methods=['POST'])
-def create_request():
-    data = request.get_json()
+def request_from_json(data, match_status="pending"):
+    """Request document for a POSTed payload; raises ValueError if required data is missing."""
     # Extract fields based on frontend Request model
     # Frontend uses 'name', backend expects 'title'. Adjust here.
     title = data.get('name') # Map frontend 'name' to backend 'title' concept
@@ -237,88 +772,147 @@ def create_request():
     contact_email = data.get('contact_email')
 
     if not all([title, description, request_type]):
-         return jsonify({"error": "Missing required request data (name, description, type)"}), 400
+         raise ValueError("Missing required request data (name, description, type)")
+
+    # Coordinates, if given, are kept for matching (without them it falls back to 0, 0)
+    coordinates = {}
+    if 'latitude' in data or 'longitude' in data:
+        try:
+            coordinates = {"latitude": float(data['latitude']), "longitude": float(data['longitude'])}
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("Invalid latitude/longitude")
+        if not (-90 <= coordinates["latitude"] <= 90 and -180 <= coordinates["longitude"] <= 180):
+            raise ValueError("Invalid latitude/longitude")
+
+    return {
+        **coordinates,
+        "title": title, # Store as 'title' internally
+        "description": description,
+        "type": request_type,
+        "required_skills": required_skills,
+        "location": location,
+        "urgency": urgency,
+        "contact_email": contact_email,
+        # "user_id": uid, # Cannot add UID reliably without auth
+        "status": "open",
+        "matchStatus": match_status, # "pending" is set to complete/failed by the background match
+        "matches": [],
+        "createdAt": firestore.SERVER_TIMESTAMP
+    }
 
+@app.post('/requests')
+async def create_request(request: Request):
+    data = await get_json_object(request)
     try:
-        request_data = {
-            "title": title, # Store as 'title' internally
-            "description": description,
-            "type": request_type,
-            "required_skills": required_skills,
-            "location": location,
-            "urgency": urgency,
-            "contact_email": contact_email,
-            # "user_id": uid, # Cannot add UID reliably without auth
-            "status": "open",
-            "createdAt": firestore.SERVER_TIMESTAMP
-        }
+        request_data = request_from_json(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}, 400)
 
-        timestamp, doc_ref = requests_ref.add(request_data)
+    try:
+        doc_ref = storage.document("requests")
         req_id = doc_ref.id
-        request_data["id"] = req_id # Add ID for matching function
+        write_result = await write_coalescer.set(doc_ref, request_data)
 
-        # Perform matching
-        matches = []
-        try:
-            vols_docs = volunteers_ref.stream()
-            vols = [d.to_dict() for d in vols_docs]
-            if vols:
-                 # Pass data matching matching_ai expectation (might need internal 'title')
-                 matching_input = request_data.copy()
-                 features = extract_features_request(matching_input)
-                 matches = get_best_matches(features, vols)
+        # Hand matching off to the background pool; poll GET /requests/<id> for the result
+        if not submit_match_job(doc_ref, dict(request_data, id=req_id)):
+            logger.warning(f"Match queue full; request {req_id} was not matched.")
+            match_failure = {"matchStatus": "failed", "matchError": "Matching queue is full; use GET /match/<id>"}
+            await write_coalescer.update(doc_ref, match_failure)
+            request_data.update(match_failure)
+        response_cache.invalidate("requests")
+
+        # Respond with what was written (no read-back), matching the frontend model
+        response_data = resolve_server_timestamps(request_data, write_result)
+        response_data["id"] = req_id
+        # Rename 'title' back to 'name' for frontend compatibility
+        response_data['name'] = response_data.pop('title')
+        return jsonify(response_data, 201)
+
+    except Exception as e:
+        logger.error(f"Error creating request: {e}")
+        return jsonify({"error": "Failed to create request"}, 500)
+
+async def _match_bulk_requests(written):
+    """
+    Match every request of a bulk upload in one batched kneighbors pass, record
+    the outcome on each document and yield one result line per request.
+    """
+    try:
+        results = await run_matching(_match_batch, [(ref.id, DEFAULT_MATCH_K, dict(data, id=ref.id))
+                                                    for ref, data in written])
+        error = None
+    except Exception as e:
+        logger.error(f"Error matching {len(written)} bulk requests: {e}")
+        results, error = {}, str(e)
+    for start in range(0, len(written), BULK_CHUNK_SIZE):
+        chunk = written[start:start + BULK_CHUNK_SIZE]
+        updates = [{"matchStatus": "complete", "matches": results[ref.id]["matches"], "matchedAt": firestore.SERVER_TIMESTAMP}
+                   if error is None else {"matchStatus": "failed", "matchError": error} for ref, _ in chunk]
+        outcomes = await asyncio.gather(*(write_coalescer.update(ref, update) for (ref, _), update in zip(chunk, updates)),
+                                        return_exceptions=True)
+        response_cache.invalidate("requests")
+        lines = []
+        for (ref, _), update, outcome in zip(chunk, updates, outcomes):
+            if isinstance(outcome, Exception):
+                logger.error(f"Could not record match result for request {ref.id}: {outcome}")
+                lines.append(dumps({"id": ref.id, "matchStatus": "failed", "error": "Failed to record match result"}))
             else:
-                 _flask_app.logger.info("No volunteers found to match against.")
-        except Exception as match_e:
-            _flask_app.logger.error(f"Error during volunteer matching for request {req_id}: {match_e}")
-
-        # Fetch created doc and return data matching frontend model
-        created_doc = doc_ref.get()
-        if created_doc.exists:
-            response_data = created_doc.to_dict()
-            response_data["id"] = created_doc.id
-            # Rename 'title' back to 'name' for frontend compatibility
-            if 'title' in response_data:
-                 response_data['name'] = response_data.pop('title')
-            response_data["matches"] = matches # Include matches if frontend expects them
-            return jsonify(response_data), 201
-        else:
-            return jsonify({"error": "Failed to retrieve created request"}), 500
+                lines.append(dumps({"id": ref.id, "matchStatus": update["matchStatus"]}))
+        yield "".join(line + "\n" for line in lines)
+
+@app.post('/requests/bulk')
+async def bulk_create_requests(request: Request):
+    """
+    Create requests from an NDJSON body; streams one result line per record (see bulk_response).
+    With ?match=1 every new request is matched in one batched pass once the body is
+    written, followed by one {"id", "matchStatus"} line per request. Without it
+    requests are stored with matchStatus "skipped"; match them later with GET /match/<id>.
+    """
+    if request.query_params.get("match", "").lower() in ("1", "true"):
+        return await bulk_response(request, "requests", request_from_json, finish=_match_bulk_requests)
+    return await bulk_response(request, "requests", functools.partial(request_from_json, match_status="skipped"))
 
+@app.get('/requests/{request_id}')
+async def get_request(request_id):
+    """Return one request, including matchStatus and (once complete) matches."""
+    try:
+        doc = await storage.get("requests", request_id)
+        if not doc.exists:
+            return jsonify({"error": "Request not found"}, 404)
+        return jsonify(request_item(doc), 200)
     except Exception as e:
-        _flask_app.logger.error(f"Error creating request: {e}")
-        return jsonify({"error": "Failed to create request"}), 500
+        logger.error(f"Error retrieving request {request_id}: {e}")
+        return jsonify({"error": "Failed to retrieve request"}, 500)
 
 
 # ————— Donations —————
-@_flask_app.route('/donations', methods=['GET'])
-def list_donations():
-    donations = []
+def donation_item(doc):
+    data = doc.to_dict()
+    data["id"] = doc.id
+    # Ensure field names match frontend Donation model (name, type, detail)
+    # Backend uses itemDescription, quantity, estimatedValue, donorInfo, donation_type
+    # Map fields for frontend:
+    return {
+        "id": data.get("id"),
+        "name": data.get("itemDescription"), # Map itemDescription to name
+        "type": data.get("donation_type"), # Map donation_type to type
+        "detail": f"Qty: {data.get('quantity', 'N/A')}, Value: ${data.get('estimatedValue', 'N/A')}" # Combine details
+        # Add other fields if frontend expects them
+    }
+
+@app.get('/donations')
+async def list_donations(request: Request):
     try:
-        docs = donations_ref.order_by("createdAt", direction=firestore.Query.DESCENDING).stream()
-        for doc in docs:
-            data = doc.to_dict()
-            data["id"] = doc.id
-            # Ensure field names match frontend Donation model (name, type, detail)
-            # Backend uses itemDescription, quantity, estimatedValue, donorInfo, donation_type
-            # Map fields for frontend:
-            mapped_data = {
-                "id": data.get("id"),
-                "name": data.get("itemDescription"), # Map itemDescription to name
-                "type": data.get("donation_type"), # Map donation_type to type
-                "detail": f"Qty: {data.get('quantity', 'N/A')}, Value: ${data.get('estimatedValue', 'N/A')}" # Combine details
-                # Add other fields if frontend expects them
-            }
-            donations.append(mapped_data)
-        return jsonify(donations), 200
-    except Exception as e:
-        _flask_app.logger.error(f"Error listing donations: {e}")
-        return jsonify({"error": "Failed to retrieve donations"}), 500
+        limit, cursor = page_params(request)
+    except ValueError as e:
+        return jsonify({"error": str(e)}, 400)
+    mode = stream_mode(request)
+    if mode:
+        return stream_response("donations", donation_item, cursor, mode)
+    return await cached_page(request, "donations", donation_item, limit, cursor)
 
-@_flask_app.route('/donations', methods=['POST'])
-def create_donation():
-    # This endpoint likely corresponds to NON-MONETARY donations based on frontend
-    data = request.get_json()
+def donation_from_json(data):
+    """Donation document for a POSTed payload; raises ValueError if required data is missing."""
     # Extract fields based on frontend Donation model (name, type, detail)
     item_description = data.get('name') # Map frontend 'name' to itemDescription
     donation_type = data.get('type') # Frontend 'type' might be 'Non-Monetary'/'Item'
@@ -339,57 +933,70 @@ def create_donation():
                 except: pass
 
     if not item_description:
-         return jsonify({"error": "Missing required donation data (name)"}), 400
+         raise ValueError("Missing required donation data (name)")
 
+    return {
+        "itemDescription": item_description,
+        "quantity": quantity,
+        "estimatedValue": estimated_value,
+        # "donorInfo": ??? # Cannot get donor info reliably without auth
+        "donation_type": "non-monetary", # Assume non-monetary from frontend context
+        # "donorUid": uid, # Cannot add UID reliably without auth
+        "createdAt": firestore.SERVER_TIMESTAMP
+    }
+
+@app.post('/donations')
+async def create_donation(request: Request):
+    # This endpoint likely corresponds to NON-MONETARY donations based on frontend
+    data = await get_json_object(request)
     try:
-        donation_data = {
-            "itemDescription": item_description,
-            "quantity": quantity,
-            "estimatedValue": estimated_value,
-            # "donorInfo": ??? # Cannot get donor info reliably without auth
-            "donation_type": "non-monetary", # Assume non-monetary from frontend context
-            # "donorUid": uid, # Cannot add UID reliably without auth
-            "createdAt": firestore.SERVER_TIMESTAMP
-        }
+        donation_data = donation_from_json(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}, 400)
 
-        timestamp, doc_ref = donations_ref.add(donation_data)
-        new_doc = doc_ref.get()
-        if new_doc.exists:
-             response_data = new_doc.to_dict()
-             response_data["id"] = new_doc.id
-             # Map response back to frontend model if needed
-             mapped_response = {
-                 "id": response_data.get("id"),
-                 "name": response_data.get("itemDescription"),
-                 "type": response_data.get("donation_type"),
-                 "detail": f"Qty: {response_data.get('quantity', 'N/A')}, Value: ${response_data.get('estimatedValue', 'N/A')}"
-             }
-             return jsonify(mapped_response), 201
-        else:
-             return jsonify({"error": "Failed to retrieve created donation"}), 500
+    try:
+        doc_ref = storage.document("donations")
+        await write_coalescer.set(doc_ref, donation_data)
+        response_cache.invalidate("donations")
+        # Map what was written (no read-back) to the frontend model
+        response_data = dict(donation_data, id=doc_ref.id)
+        mapped_response = {
+            "id": response_data.get("id"),
+            "name": response_data.get("itemDescription"),
+            "type": response_data.get("donation_type"),
+            "detail": f"Qty: {response_data.get('quantity', 'N/A')}, Value: ${response_data.get('estimatedValue', 'N/A')}"
+        }
+        return jsonify(mapped_response, 201)
     except Exception as e:
-        _flask_app.logger.error(f"Error creating donation: {e}")
-        return jsonify({"error": "Failed to create donation"}), 500
+        logger.error(f"Error creating donation: {e}")
+        return jsonify({"error": "Failed to create donation"}, 500)
+
+@app.post('/donations/bulk')
+async def bulk_create_donations(request: Request):
+    """Create donations from an NDJSON body; streams one result line per record (see bulk_response)."""
+    return await bulk_response(request, "donations", donation_from_json)
 
 # --- Stripe ---
 # Cannot implement dynamic Stripe checkout to match frontend's hardcoded URL launch
 # without modifying the frontend.
 
 # ————— Alerts —————
-@_flask_app.route('/alerts', methods=['GET'])
-def list_alerts():
-    alerts = []
+def alert_item(doc):
+    data = doc.to_dict()
+    data["id"] = doc.id
+    # Ensure fields match frontend Alert model (likely title, message, timestamp?)
+    return data
+
+@app.get('/alerts')
+async def list_alerts(request: Request):
     try:
-        docs = alerts_ref.order_by("createdAt", direction=firestore.Query.DESCENDING).stream()
-        for doc in docs:
-            data = doc.to_dict()
-            data["id"] = doc.id
-            # Ensure fields match frontend Alert model (likely title, message, timestamp?)
-            alerts.append(data)
-        return jsonify(alerts), 200
-    except Exception as e:
-        _flask_app.logger.error(f"Error listing alerts: {e}")
-        return jsonify({"error": "Failed to retrieve alerts"}), 500
+        limit, cursor = page_params(request)
+    except ValueError as e:
+        return jsonify({"error": str(e)}, 400)
+    mode = stream_mode(request)
+    if mode:
+        return stream_response("alerts", alert_item, cursor, mode)
+    return await cached_page(request, "alerts", alert_item, limit, cursor)
 
 # Optional: POST /alerts - would need frontend changes to call this
 # @app.route('/alerts', methods=['POST'])
@@ -399,52 +1006,155 @@ def list_alerts():
 
 
 # ————— Volunteer Matching (Endpoints remain, but unprotected) —————
-@_flask_app.route('/match/<request_id>', methods=['GET'])
-def match_volunteers_route(request_id): # Renamed function to avoid conflict
+@app.get('/match/{request_id}')
+async def match_volunteers_route(request_id): # Renamed function to avoid conflict
+    timer = phase_timer()
     try:
-        req_doc = requests_ref.document(request_id).get()
+        with timer.phase("fetch"):
+            req_doc = await storage.get("requests", request_id)
         if not req_doc.exists:
-            return jsonify({"error": "Request not found"}), 404
+            return jsonify({"error": "Request not found"}, 404)
         req_data = req_doc.to_dict(); req_data["id"] = request_id
+        try:
+            req_data = match_coordinates(req_data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}, 400)
+
+        matches = await run_matching(match_request_data, req_data)
+        with timer.phase("serialize"):
+            return jsonify({"matches": matches}, 200)
+    except StoreNotReady as e:
+        return _not_ready_response(e)
+    except Exception as e:
+        logger.error(f"Error matching volunteers for request {request_id}: {e}")
+        return jsonify({"error": "Failed to match volunteers"}, 500)
 
-        vols_docs = volunteers_ref.stream()
-        vols = [d.to_dict() for d in vols_docs]
-        if not vols:
-             return jsonify({"matches": []}), 200
 
-        # Ensure request data passed to matching uses internal field names if needed
-        features = extract_features_request(req_data)
-        matches = get_best_matches(features, vols)
-        return jsonify({"matches": matches}), 200
+def _match_batch(to_match):
+    """{key: {"matches": [...]}} for (key, k, request dict) entries (runs on match_executor)."""
+    index = get_volunteer_index()
+    if len(index) == 0:
+        logger.info("No volunteers found to match against.")
+        return {key: {"matches": []} for key, _, _ in to_match}
+    features = extract_features_requests([req for _, _, req in to_match])
+    matches = index.get_best_matches_many(features, [k for _, k, _ in to_match], radius_km=MATCH_RADIUS_KM,
+                                          max_candidates=MATCH_GEO_CANDIDATES)
+    return {key: {"matches": found} for (key, _, _), found in zip(to_match, matches)}
+
+@app.post('/match/batch')
+async def match_batch_route(request: Request):
+    """
+    Match many requests in one pass: every request is answered by a single
+    batched kneighbors call against the volunteer index.
+    Body: {"requests": [...], "k": 3}, where each entry is a request id, an
+    object {"id": ..., "k": ...} naming a stored request, or an inline request
+    payload (with at least "type", "latitude", "longitude"; "id" and "k" optional).
+    Returns {"results": {request_id: {"matches": [...]} or {"error": ...}}}.
+    """
+    data = await get_json_object(request, silent=True) or {}
+    entries = data.get('requests')
+    default_k = data.get('k', DEFAULT_MATCH_K)
+
+    if not isinstance(entries, list) or not entries:
+        return jsonify({"error": "Missing 'requests' list"}, 400)
+    if len(entries) > MAX_BATCH_MATCH_REQUESTS:
+        return jsonify({"error": f"At most {MAX_BATCH_MATCH_REQUESTS} requests per batch"}, 400)
+
+    # Normalise entries to (key, k, inline payload or None)
+    queries = []
+    for n, entry in enumerate(entries):
+        if isinstance(entry, str):
+            entry = {"id": entry}
+        if not isinstance(entry, dict):
+            return jsonify({"error": f"Invalid entry at position {n}"}, 400)
+        k = entry.get('k', default_k)
+        if not isinstance(k, int) or isinstance(k, bool) or not 1 <= k <= MAX_MATCH_K:
+            return jsonify({"error": f"'k' must be an integer between 1 and {MAX_MATCH_K}"}, 400)
+        is_inline = 'type' in entry
+        key = str(entry.get('id') or f"inline-{n}")
+        if not is_inline and not entry.get('id'):
+            return jsonify({"error": f"Entry at position {n} has neither an id nor a request payload"}, 400)
+        queries.append((key, k, entry if is_inline else None))
+
+    timer = phase_timer()
+    try:
+        results = {}
+        # Fetch all stored requests in one round trip
+        stored_ids = [key for key, _, payload in queries if payload is None]
+        stored = {}
+        if stored_ids:
+            with timer.phase("fetch"):
+                docs = await storage.get_many("requests", stored_ids)
+            for doc in docs:
+                req_data = doc.to_dict(); req_data["id"] = doc.id
+                stored[doc.id] = req_data
+
+        to_match = []
+        for key, k, payload in queries:
+            req_data = payload if payload is not None else stored.get(key)
+            if req_data is None:
+                results[key] = {"error": "Request not found"}
+                continue
+            try:
+                to_match.append((key, k, dict(match_coordinates(req_data), id=key)))
+            except ValueError as e:
+                results[key] = {"error": str(e)}
+
+        if to_match:
+            results.update(await run_matching(_match_batch, to_match))
+
+        with timer.phase("serialize"):
+            return jsonify({"results": results}, 200)
+    except StoreNotReady as e:
+        return _not_ready_response(e)
     except Exception as e:
-        _flask_app.logger.error(f"Error matching volunteers for request {request_id}: {e}")
-        return jsonify({"error": "Failed to match volunteers"}), 500
+        logger.error(f"Error batch matching {len(queries)} requests: {e}")
+        return jsonify({"error": "Failed to match volunteers"}, 500)
 
 
-@_flask_app.route('/debug-match/<request_id>', methods=['GET'])
-def debug_match_route(request_id): # Renamed function
+def _debug_match(req_data):
+    """Debug output of get_best_matches_debug for one request (runs on match_executor)."""
+    vols = [vol for _, vol in get_volunteer_index().items()]
+    with collect_data_quality("debug match"): # One report for the request and the volunteers
+        features = extract_features_request(req_data)
+        return get_best_matches_debug(features, vols)
+
+@app.get('/debug-match/{request_id}')
+async def debug_match_route(request_id): # Renamed function
+    """Step-by-step match of one request, with the time spent in each phase under "timings_seconds"."""
+    timer = phase_timer()
     try:
-        req_doc = requests_ref.document(request_id).get()
+        with timer.phase("fetch"):
+            req_doc = await storage.get("requests", request_id)
         if not req_doc.exists:
-            return jsonify({"error": "Request not found"}), 404
+            return jsonify({"error": "Request not found"}, 404)
         req_data = req_doc.to_dict(); req_data["id"] = request_id
+        try:
+            req_data = match_coordinates(req_data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}, 400)
 
-        vols_docs = volunteers_ref.stream()
-        vols = [d.to_dict() for d in vols_docs]
-        if not vols:
-             return jsonify({"features": [], "matches": []}), 200
-
-        features = extract_features_request(req_data)
-        vec, matches = get_best_matches_debug(features, vols)
-        feature_list = vec.tolist() if hasattr(vec, 'tolist') else vec
-        return jsonify({"features": feature_list, "matches": matches}), 200
+        debug_output = await run_matching(_debug_match, req_data)
+        debug_output["timings_seconds"] = dict(timer.timings, **debug_output["timings_seconds"])
+        return jsonify(debug_output, 200)
+    except StoreNotReady as e:
+        return _not_ready_response(e)
     except Exception as e:
-        _flask_app.logger.error(f"Error debugging match for request {request_id}: {e}")
-        return jsonify({"error": "Failed to debug match"}), 500
+        logger.error(f"Error debugging match for request {request_id}: {e}")
+        return jsonify({"error": "Failed to debug match"}, 500)
+
+@app.get('/metrics')
+async def metrics_route():
+    """Prometheus metrics of this worker process (matching phase timings and volunteer counts)."""
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+@app.get('/ready')
+async def readiness_route():
+    """Readiness probe: 200 once volunteers are loaded for matching, else 503."""
+    status = volunteer_store.status()
+    return jsonify(status, 200 if volunteer_store.ready else 503)
 
-# Wrap the Flask app with the ASGI middleware for Uvicorn
-app = WSGIMiddleware(_flask_app)
+if MATCH_WARM_START:
+    volunteer_store.start()
 
-# --- (Remove or comment out the if __name__ == '__main__': block if Uvicorn runs this file directly) ---
-# if __name__ == '__main__':
-#    _flask_app.run(debug=True, port=8001) # This won't be used by Uvicorn
+# Run with: uvicorn main:app --port 8001
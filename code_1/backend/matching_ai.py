@@ -1,186 +1,1302 @@
 # 1_code/matching_ai.py
 
+import contextvars
+import functools
+import itertools
+import os
+import pickle
+import threading
+import time
+from contextlib import contextmanager
+
 import numpy as np
-from sklearn.neighbors import NearestNeighbors
-from sklearn.preprocessing import OneHotEncoder, StandardScaler
-import joblib  # For persistence (if needed in the future)
+from scipy import sparse
+from sklearn.neighbors import BallTree, NearestNeighbors
+from sklearn.preprocessing import StandardScaler
+import joblib  # For persistence (VolunteerIndex snapshots)
 from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut, GeocoderServiceError
 
-# Configuration and Encoder Setup
+from geocoding import Geocoder
+from metrics import COUNT_BUCKETS, REGISTRY, PhaseTimer
+
+# Configuration and Skill Taxonomy Setup
 KNOWN_SKILLS = ['Medical', 'Food Logistics', 'Rescue', 'Shelter Management', 'Transportation', 'Communication', 'General Labor', 'Food', 'Shelter'] # Added types from requests JSON
-# Ensure all known skills/types are included for the encoder
+# Ensure all known skills/types are included in the taxonomy
 ALL_CATEGORIES = sorted(list(set(KNOWN_SKILLS))) # Get unique sorted list
 
-encoder = OneHotEncoder(categories=[ALL_CATEGORIES], sparse_output=False, handle_unknown='ignore')
-encoder.fit(np.array(ALL_CATEGORIES).reshape(-1, 1))
+class SkillTaxonomy:
+    """
+    Ordered, extendable list of skills, each owning one sparse feature column.
+    Lookups are case-insensitive ('medical' matches 'Medical'). New skills get
+    the next free column, so matrices built before an extension stay valid;
+    they simply have fewer skill columns.
+    """
+
+    def __init__(self, skills=(), auto_extend=False):
+        self._names = []
+        self._columns = {} # casefolded name -> column
+        self._lock = threading.Lock()
+        # When True, unknown volunteer skills are added instead of ignored
+        self.auto_extend = auto_extend
+        self.extend(skills)
+
+    def __len__(self):
+        return len(self._names)
+
+    def __contains__(self, name):
+        return self.column(name) >= 0
+
+    @property
+    def names(self):
+        return list(self._names)
+
+    def column(self, name):
+        """Column of a skill name, or -1 if it is not in the taxonomy."""
+        if not isinstance(name, str):
+            return -1
+        return self._columns.get(name.strip().casefold(), -1)
+
+    def extend(self, names):
+        """Add any skills not yet known. Returns the column of every name given."""
+        columns = []
+        with self._lock:
+            for name in names:
+                key = name.strip().casefold() if isinstance(name, str) else ''
+                if not key:
+                    columns.append(-1)
+                    continue
+                if key not in self._columns:
+                    self._columns[key] = len(self._names)
+                    self._names.append(name.strip())
+                columns.append(self._columns[key])
+        return columns
+
+    def extend_in_order(self, names):
+        """
+        Add skills so that names[i] owns column i, as in a matrix built against `names`.
+        Returns False, leaving the taxonomy unchanged, if the current columns conflict.
+        """
+        keys = [name.strip().casefold() for name in names]
+        if len(set(keys)) != len(keys):
+            return False
+        with self._lock:
+            known = len(self._names)
+            for column, key in enumerate(keys):
+                if self._columns.get(key, -1) != column and (column < known or key in self._columns):
+                    return False
+            for name, key in zip(names[known:], keys[known:]):
+                self._columns[key] = len(self._names)
+                self._names.append(name.strip())
+        return True
 
-# Initialize geolocator
-geolocator = Nominatim(user_agent="disaster_matching_ai_v2") # Use a unique agent name
+skill_taxonomy = SkillTaxonomy(ALL_CATEGORIES)
+
+# Geocoder: the Nominatim client behind a cached, rate-limited front end (see geocoding.py).
+# It is created on first use, so importing this module touches neither the network nor the disk.
+# GEOCODE_CACHE_PATH=":memory:" disables persistence; the default lives in the user's cache directory.
+DEFAULT_GEOCODE_CACHE_PATH = os.path.join(
+    os.getenv("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+    "disaster_matching", "geocode_cache.sqlite3",
+)
+_geocoder = None
+_geocoder_lock = threading.Lock()
+
+def get_geocoder():
+    """The shared Geocoder, created on the first call from the GEOCODE_* environment."""
+    global _geocoder
+    with _geocoder_lock:
+        if _geocoder is None:
+            _geocoder = Geocoder(
+                Nominatim(user_agent="disaster_matching_ai_v2"), # Use a unique agent name
+                cache_path=os.getenv("GEOCODE_CACHE_PATH", DEFAULT_GEOCODE_CACHE_PATH),
+                min_interval=float(os.getenv("GEOCODE_MIN_INTERVAL", "1.0")),
+            )
+        return _geocoder
+
+def flush_geocoder():
+    """Write the geocode cache's pending use times, if a geocoder was ever created."""
+    if _geocoder is not None:
+        _geocoder.cache.flush()
 
 # Geocoding Function (Keep as fallback, but prioritize lat/lon)
-def get_lat_long(address):
+def get_lat_long(address, timeout=None):
     """
     Convert an address string to a (latitude, longitude) tuple.
-    Returns (0.0, 0.0) if the address cannot be resolved or is empty.
+    Returns (0.0, 0.0) if the address cannot be resolved or is empty, or if it
+    is not resolved within `timeout` seconds (default: the geocoder's 10s).
     """
-    if not address or not isinstance(address, str): # Check if address is valid string
-        return (0.0, 0.0)
+    return get_geocoder().geocode(address, timeout) or (0.0, 0.0)
+
+def get_lat_longs(addresses, timeout=None):
+    """Batch form of get_lat_long: one (latitude, longitude) tuple per address, in order."""
+    results = get_geocoder().geocode_many([address for address in addresses if isinstance(address, str)], timeout)
+    return [(results.get(address) if isinstance(address, str) else None) or (0.0, 0.0) for address in addresses]
+
+# Matching Metrics (exposed on GET /metrics)
+# Phases: fetch (reading volunteers/requests from storage), extract (feature
+# extraction), fit (building an index), scale (column statistics), query
+# (ranking) and serialize (encoding the HTTP response; timed by the routes only).
+MATCH_PHASE_SECONDS = REGISTRY.histogram(
+    "matching_phase_seconds", "Seconds spent per matching phase.", ["phase"])
+MATCH_VOLUNTEERS_SCANNED = REGISTRY.histogram(
+    "matching_volunteers_scanned", "Volunteers read per feature extraction (phase=extract) "
+    "and ranked per request (phase=query).", ["phase"], buckets=COUNT_BUCKETS)
+MATCH_VOLUNTEERS_SKIPPED = REGISTRY.counter(
+    "matching_volunteers_skipped_total", "Volunteers skipped because their features could not be extracted.")
+
+def phase_timer():
+    """PhaseTimer that records into the matching phase histogram."""
+    return PhaseTimer(MATCH_PHASE_SECONDS)
+
+# Data Quality Diagnostics
+# Records that extraction has to patch up (zero lat/lon, unknown skills or request
+# types, unreadable volunteers) are counted per category into the active
+# DataQualityReport, keeping a few example ids; nothing is printed per record.
+# A match opens a report with collect_data_quality(); when it closes, the counts
+# go to matching_data_quality_issues_total and one summary line is printed, at
+# most one per DATA_QUALITY_LOG_INTERVAL seconds. Extraction outside a report
+# (e.g. the volunteer store building its index) gets a report of its own.
+DATA_QUALITY_EXAMPLES = 5 # Example ids kept per category
+DATA_QUALITY_LOG_INTERVAL = float(os.getenv("DATA_QUALITY_LOG_INTERVAL", "10"))
+MATCH_DATA_QUALITY = REGISTRY.counter(
+    "matching_data_quality_issues_total", "Records with a data-quality problem seen during feature extraction.",
+    ["category"])
+
+class DataQualityReport:
+    """Data-quality problems found during one match: a count and example ids per category."""
+
+    def __init__(self, max_examples=DATA_QUALITY_EXAMPLES):
+        self.max_examples = max_examples
+        self.counts = {}
+        self.examples = {}
+
+    def add(self, category, examples, count=None):
+        """Record `count` problem records (default: len(examples)); only the first examples are kept."""
+        count = len(examples) if count is None else count
+        if count <= 0:
+            return
+        self.counts[category] = self.counts.get(category, 0) + count
+        kept = self.examples.setdefault(category, [])
+        kept.extend(examples[:self.max_examples - len(kept)])
+
+    def add_rows(self, category, mask, label_of):
+        """Record the rows flagged in a boolean mask; only example rows are labelled."""
+        rows = np.flatnonzero(mask)
+        if rows.size:
+            self.add(category, [label_of(i) for i in rows[:self.max_examples]], count=int(rows.size))
+
+    def summary(self):
+        """{category: {"count": n, "examples": [...]}}"""
+        return {category: {"count": count, "examples": list(self.examples[category])}
+                for category, count in sorted(self.counts.items())}
+
+    def message(self):
+        """One line describing every category, bounded by the number of categories."""
+        return "; ".join(f"{count} {category} (e.g. {', '.join(map(str, self.examples[category]))})"
+                         for category, count in sorted(self.counts.items()))
+
+    def __bool__(self):
+        return bool(self.counts)
+
+class _SummaryLog:
+    """Prints at most one line per `interval` seconds; the number suppressed in between is appended to the next."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._last = None
+        self._suppressed = 0
+        self._lock = threading.Lock()
+
+    def emit(self, line):
+        now = time.monotonic()
+        with self._lock:
+            if self._last is not None and now - self._last < self.interval:
+                self._suppressed += 1
+                return
+            self._last, suppressed, self._suppressed = now, self._suppressed, 0
+        print(line + (f" (+{suppressed} similar summaries suppressed)" if suppressed else ""))
+
+_data_quality_log = _SummaryLog(DATA_QUALITY_LOG_INTERVAL)
+_active_report = contextvars.ContextVar("data_quality_report", default=None)
+
+@contextmanager
+def collect_data_quality(label="match"):
+    """
+    Collect data-quality problems of the extraction in the with-block into one
+    DataQualityReport, emitted when the block ends. Nested blocks share the
+    outermost report, which is the only one emitted.
+    """
+    report = _active_report.get()
+    if report is not None:
+        yield report
+        return
+    report = DataQualityReport()
+    token = _active_report.set(report)
     try:
-        # Add delay and retries if needed, but keep simple for now
-        location = geolocator.geocode(address, timeout=10)
-        if location:
-            return location.latitude, location.longitude
-    except (GeocoderTimedOut, GeocoderServiceError, Exception) as e: # Catch generic exceptions too
-        print(f"Warning: Geocoding failed for '{address}': {e}")
-        pass
-    return (0.0, 0.0)
+        yield report
+    finally:
+        _active_report.reset(token)
+        if report:
+            for category, count in report.counts.items():
+                MATCH_DATA_QUALITY.inc(count, category=category)
+            _data_quality_log.emit(f"Warning: Data quality ({label}): {report.message()}")
+
+def _reports_data_quality(label):
+    """Decorator: run the function inside collect_data_quality(label)."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with collect_data_quality(label):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+# Feature Extraction Functions (Batched)
+# Feature layout: [lat, lon, availability/urgency, multi-hot skills over skill_taxonomy].
+# The numeric columns come first so the skill columns can grow with the taxonomy.
+# Volunteer skills are kept as a scipy.sparse CSR matrix, so memory follows the
+# number of skills volunteers actually hold, not the size of the taxonomy.
+NUMERIC_DIM = 3
+LAT, LON, FLAG = 0, 1, 2
+DEFAULT_URGENCY = 2 # Urgency is not in the database schema; use medium for every request
+
+def _skill_names(value):
+    """Normalise a 'skills' field to a list of names (None -> [], 'x' -> ['x'])."""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [value]
+    return list(value)
 
-# Feature Extraction Functions (Updated)
-def extract_features_request(request_data):
+def _encode_skills(skill_lists, taxonomy, extend=False):
     """
-    Extract features from an aid request dictionary (from Firestore).
-    Uses 'latitude', 'longitude' directly. Handles missing 'urgency'.
+    Multi-hot encode one list of skill names per row.
+    Returns (csr matrix of shape (rows, len(taxonomy)), [(row, unknown name), ...]).
+    """
+    lengths = np.fromiter((len(names) for names in skill_lists), dtype=np.intp, count=len(skill_lists))
+    flat_names = list(itertools.chain.from_iterable(skill_lists))
+    if extend:
+        taxonomy.extend(flat_names)
+    flat_rows = np.repeat(np.arange(len(skill_lists)), lengths)
+    flat_cols = np.fromiter((taxonomy.column(name) for name in flat_names), dtype=np.intp, count=len(flat_names))
+
+    known = flat_cols >= 0
+    unknown = [(row, flat_names[i]) for i, row in zip(np.flatnonzero(~known), flat_rows[~known])
+               if isinstance(flat_names[i], str) and flat_names[i].strip()]
+    width = len(taxonomy)
+    # Deduplicate (row, col) pairs so a skill listed twice is still a single 1
+    keys = np.unique(flat_rows[known] * width + flat_cols[known])
+    matrix = sparse.csr_matrix((np.ones(keys.size), (keys // max(width, 1), keys % max(width, 1))),
+                               shape=(len(skill_lists), width))
+    return matrix, unknown
+
+@_reports_data_quality("request features")
+def extract_features_requests(requests, taxonomy=None):
+    """
+    Batch version of extract_features_request.
+    `requests` is a list of request dictionaries, or a dict of equal-length
+    columns 'type', 'latitude' and 'longitude' (plus optional 'required_skills'
+    and 'id'). The request type and any required skills are multi-hot encoded
+    over `taxonomy` (default: the global skill_taxonomy).
+    Returns a dense (n, NUMERIC_DIM + len(taxonomy)) matrix, one row per request.
     """
-    req_type = request_data.get('type', '') # Get request type (e.g., 'Medical', 'Food')
-    # Ensure the type is in the categories known by the encoder
-    if req_type not in ALL_CATEGORIES:
-        print(f"Warning: Request type '{req_type}' not in known categories. Treating as unknown.")
-        # Optionally map to a default or handle as truly unknown if encoder allows
-        req_type = '' # Or handle based on encoder's 'handle_unknown' setting
+    taxonomy = taxonomy if taxonomy is not None else skill_taxonomy
+    if isinstance(requests, dict):
+        types = list(requests['type'])
+        lat = np.asarray(requests['latitude'], dtype=float)
+        lon = np.asarray(requests['longitude'], dtype=float)
+        required = requests.get('required_skills') or [[] for _ in types]
+        ids = requests.get('id')
+    else:
+        types = [r.get('type', '') for r in requests]
+        lat = np.fromiter((r.get('latitude', 0.0) for r in requests), dtype=float, count=len(requests))
+        lon = np.fromiter((r.get('longitude', 0.0) for r in requests), dtype=float, count=len(requests))
+        required = [r.get('required_skills') for r in requests]
+        ids = [r.get('id', 'N/A') for r in requests]
+
+    type_known = np.fromiter((taxonomy.column(t) >= 0 for t in types), dtype=bool, count=len(types))
+    label = lambda i: ids[i] if ids is not None else 'N/A'
+    report = _active_report.get()
+    report.add_rows("request_unknown_type", ~type_known, lambda i: f"{label(i)} ({types[i]})")
+    report.add_rows("request_zero_location", (lat == 0.0) & (lon == 0.0), label)
 
-    encoded_type = encoder.transform([[req_type]])[0]
+    skill_lists = [[t] + _skill_names(extra) for t, extra in zip(types, required)]
+    skills, _ = _encode_skills(skill_lists, taxonomy)
+    R = np.zeros((len(types), NUMERIC_DIM + skills.shape[1]))
+    R[:, LAT] = lat
+    R[:, LON] = lon
+    R[:, FLAG] = DEFAULT_URGENCY
+    R[:, NUMERIC_DIM:] = skills.toarray()
+    return R
 
-    # --- Use lat/lon directly from Firestore data ---
-    lat = request_data.get('latitude', 0.0)
-    lon = request_data.get('longitude', 0.0)
-    # Basic validation: if lat/lon are zero, maybe log a warning
-    if lat == 0.0 and lon == 0.0:
-        print(f"Warning: Request '{request_data.get('id', 'N/A')}' has zero lat/lon.")
-    # --- End location handling ---
+def _volunteer_label(vol):
+    return vol.get('id', 'N/A') if isinstance(vol, dict) else 'N/A'
 
-    # --- Handle missing 'urgency' ---
-    # Urgency is not in the database schema from populate_database.py
-    # We'll assign a default urgency or omit it. Let's use a default medium.
-    urgency_score = 2 # Default to medium urgency
-    # --- End urgency handling ---
+def _volunteer_columns(volunteers, strict=False):
+    """
+    Pull the feature columns out of a list of volunteer dictionaries in one pass.
+    Returns (lat, lon, skill_lists, availability, valid_mask); rows whose fields
+    cannot be read are counted in the active DataQualityReport and marked
+    invalid, or re-raised if strict.
+    """
+    n = len(volunteers)
+    lat, lon = np.zeros(n), np.zeros(n)
+    availability = np.zeros(n)
+    valid = np.zeros(n, dtype=bool)
+    skill_lists = [[] for _ in range(n)]
+    failures = [] # Labels of the volunteers that could not be read
+    for i, vol in enumerate(volunteers):
+        try:
+            skills = _skill_names(vol.get('skills', []))
+            location_map = vol.get('location', {})
+            lat[i] = location_map.get('latitude', 0.0)
+            lon[i] = location_map.get('longitude', 0.0)
+            skill_lists[i] = skills
+            availability[i] = 1.0 if vol.get('availability', False) else 0.0
+            valid[i] = True
+        except Exception as e:
+            if strict:
+                raise
+            failures.append(f"{_volunteer_label(vol)} ({type(e).__name__}: {e})")
+    if failures:
+        _active_report.get().add("volunteer_unreadable", failures)
+    return lat, lon, skill_lists, availability, valid
+
+@_reports_data_quality("volunteer features")
+def _volunteer_parts(volunteers, strict=False, taxonomy=None):
+    """
+    Shared body of the volunteer extractors.
+    Returns (numeric, skills, valid_indices): the dense (n, NUMERIC_DIM) block,
+    the CSR multi-hot skill block and the input positions of the rows kept.
+    """
+    taxonomy = taxonomy if taxonomy is not None else skill_taxonomy
+    started = time.perf_counter()
+    if isinstance(volunteers, dict):
+        lat = np.asarray(volunteers['latitude'], dtype=float)
+        lon = np.asarray(volunteers['longitude'], dtype=float)
+        if 'skills' in volunteers:
+            skill_lists = [_skill_names(names) for names in volunteers['skills']]
+        else:
+            skill_lists = [_skill_names(name) for name in volunteers['skill']]
+        availability = np.asarray(volunteers['availability'], dtype=bool).astype(float)
+        ids = volunteers.get('id')
+        valid_indices = np.arange(lat.shape[0])
+    else:
+        lat, lon, skill_lists, availability, valid = _volunteer_columns(volunteers, strict)
+        ids = [_volunteer_label(vol) for vol in volunteers]
+        valid_indices = np.flatnonzero(valid)
+        lat, lon, availability = lat[valid_indices], lon[valid_indices], availability[valid_indices]
+        skill_lists = [skill_lists[i] for i in valid_indices]
 
-    # Ensure all parts are numpy arrays before concatenating
-    return np.concatenate((np.array([lat, lon]), encoded_type, np.array([urgency_score])))
+    skills, unknown = _encode_skills(skill_lists, taxonomy, extend=taxonomy.auto_extend)
+    label = lambda i: ids[valid_indices[i]] if ids is not None else 'N/A'
+    report = _active_report.get()
+    report.add("volunteer_unknown_skill", [f"{label(row)} ({name})" for row, name in unknown[:report.max_examples]],
+               count=len(unknown))
+    report.add_rows("volunteer_zero_location", (lat == 0.0) & (lon == 0.0), label)
+
+    numeric = np.empty((lat.shape[0], NUMERIC_DIM))
+    numeric[:, LAT] = lat
+    numeric[:, LON] = lon
+    numeric[:, FLAG] = availability
+    n_scanned = len(volunteers['latitude']) if isinstance(volunteers, dict) else len(volunteers)
+    MATCH_PHASE_SECONDS.observe(time.perf_counter() - started, phase="extract")
+    MATCH_VOLUNTEERS_SCANNED.observe(n_scanned, phase="extract")
+    if n_scanned > valid_indices.size:
+        MATCH_VOLUNTEERS_SKIPPED.inc(n_scanned - valid_indices.size)
+    return numeric, skills, valid_indices.tolist()
+
+def extract_features_volunteers(volunteers, strict=False):
+    """
+    Batch version of extract_features_volunteer.
+    `volunteers` is a list of volunteer dictionaries, or a dict of equal-length
+    columns 'latitude', 'longitude', 'skills' (list of names per volunteer, or
+    'skill' with one name each) and 'availability' (plus optional 'id').
+    Returns (X, valid_indices): a CSR matrix with one row per volunteer whose
+    fields could be read, and the positions of those volunteers in the input.
+    With strict=True an unreadable volunteer raises instead of being skipped.
+    """
+    numeric, skills, valid_indices = _volunteer_parts(volunteers, strict)
+    return sparse.hstack([sparse.csr_matrix(numeric), skills], format='csr'), valid_indices
+
+def extract_features_request(request_data, taxonomy=None):
+    """
+    Extract features from an aid request dictionary (from Firestore).
+    Uses 'latitude', 'longitude' directly. Handles missing 'urgency'.
+    """
+    return extract_features_requests([request_data], taxonomy)[0]
 
 def extract_features_volunteer(volunteer_data):
     """
     Extract features from a volunteer dictionary (from Firestore).
     Handles 'skills' list, 'location' map, and boolean 'availability'.
+    Returns a dense vector; raises the underlying error if the volunteer's
+    fields cannot be read.
     """
-    # --- Handle skills list (use first skill or empty string) ---
-    skills_list = volunteer_data.get('skills', [])
-    # Use the first skill if available, ensure it's known to encoder
-    v_skill = skills_list[0] if skills_list else ''
-    if v_skill not in ALL_CATEGORIES:
-         print(f"Warning: Volunteer skill '{v_skill}' not in known categories. Treating as unknown.")
-         v_skill = '' # Or handle based on encoder's 'handle_unknown' setting
-    encoded_skill = encoder.transform([[v_skill]])[0]
-    # --- End skills handling ---
-
-    # --- Use lat/lon from location map if present ---
-    location_map = volunteer_data.get('location', {})
-    lat = location_map.get('latitude', 0.0)
-    lon = location_map.get('longitude', 0.0)
-    # Basic validation
-    if lat == 0.0 and lon == 0.0:
-         print(f"Warning: Volunteer '{volunteer_data.get('id', 'N/A')}' has zero lat/lon.")
-         # Optional: Fallback to geocoding if a string 'location' field existed
-         # addr_str = volunteer_data.get('location_string', '') # Example if you had another field
-         # if addr_str: lat, lon = get_lat_long(addr_str)
-    # --- End location handling ---
-
-    # --- Handle boolean availability ---
-    availability_bool = volunteer_data.get('availability', False) # Default to False if missing
-    availability_flag = 1 if availability_bool else 0
-    # --- End availability handling ---
-
-    # Ensure all parts are numpy arrays before concatenating
-    return np.concatenate((np.array([lat, lon]), encoded_skill, np.array([availability_flag])))
+    return extract_features_volunteers([volunteer_data], strict=True)[0].toarray()[0]
+
+def _fit_width(features, width):
+    """Pad (with zeros) or trim feature rows to `width` columns, for vectors built before/after a taxonomy extension."""
+    features = np.atleast_2d(np.asarray(features, dtype=float))
+    if features.shape[1] < width:
+        return np.hstack([features, np.zeros((features.shape[0], width - features.shape[1]))])
+    return features[:, :width]
 
 # Matching Functions (build_feature_matrix, get_best_matches, get_best_matches_debug)
-# These functions remain structurally the same, but will now receive correctly processed features.
 
 def build_feature_matrix(volunteers):
     """
     Build a feature matrix from a list of volunteer dictionaries.
-    Each row represents one volunteer's feature vector.
-    Handles potential errors during feature extraction for individual volunteers.
+    Each row represents one volunteer's feature vector (CSR sparse matrix).
+    Volunteers whose features cannot be extracted are skipped.
     """
-    features = []
-    valid_volunteers_indices = [] # Keep track of which volunteers were successfully processed
-    for i, vol in enumerate(volunteers):
+    X, valid_volunteers_indices = extract_features_volunteers(volunteers)
+    if X.shape[0] == 0: # If no volunteers could be processed
+        return None, [] # Return None for matrix, empty list for indices
+
+    # Return the matrix and the indices of the volunteers included in it
+    return X, valid_volunteers_indices
+
+# Persistent Volunteer Index
+# Holds the volunteer features, running scaler statistics and the id -> row
+# mapping for the lifetime of the process, so a match no longer rebuilds features,
+# refits a StandardScaler and refits NearestNeighbors over every volunteer.
+
+_QUERY_CHUNK = 256 # Max queries per distance block in batched kneighbors
+_BLOCK_BYTES = 16 * 2**20 # Memory budget for one block's query x volunteer arrays
+
+# Geo stage: candidates are pulled by great-circle distance before skill ranking
+EARTH_RADIUS_KM = 6371.0088
+# The BallTree and the skill CSR matrix are rebuilt lazily once this many volunteers
+# changed since the last build (or this fraction of the index, if larger); until
+# then changed rows are handled on their own next to the prebuilt structure.
+_REBUILD_MIN = 256
+_REBUILD_FRACTION = 0.05
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km between points given in degrees (broadcasts over arrays)."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(a, dtype=float)) for a in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def _column_scale(var):
+    """Standard deviation per column, with zero-variance columns set to 1 like StandardScaler."""
+    scale = np.sqrt(np.maximum(var, 0.0))
+    scale[scale < 10 * np.finfo(float).eps] = 1.0
+    return scale
+
+# Neighbor Backends
+# The index always ranks with exact distances; a backend only decides which
+# volunteers a query is ranked against. 'exact' ranks everyone; 'grid' is an
+# approximate, in-process alternative for very large volunteer counts.
+KM_PER_DEGREE = 111.195 # Great-circle km per degree of latitude
+
+class ExactBackend:
+    """Rank every volunteer (default)."""
+    exact = True
+
+    def add(self, rows, lat, lon):
+        pass
+
+    def remove(self, row):
+        pass
+
+    def candidates(self, lat, lon):
+        return None
+
+class GridBackend:
+    """
+    Approximate k-NN backend. Volunteers are bucketed into lat/lon cells of
+    roughly cell_km, and a query ranks only the volunteers in the rings of cells
+    around the request, widening ring by ring until at least n_candidates are
+    collected. n_candidates is the recall/latency knob: check its effect with
+    VolunteerIndex.recall. Cells are updated in place on add/remove.
+
+    A query far from every volunteer would walk O(r^2) empty cells, so the walk
+    stops at max_ring rings, or once it has looked up as many cells as are
+    occupied, and finishes from the occupied cells ordered by ring (one
+    vectorised pass) instead. Both paths collect the same rows.
+    """
+    exact = False
+
+    def __init__(self, cell_km=10.0, n_candidates=256, max_ring=16):
+        self.cell_deg = cell_km / KM_PER_DEGREE
+        self.n_candidates = int(n_candidates)
+        self.max_ring = int(max_ring)
+        self._cells = {} # (lat cell, lon cell) -> set of rows
+        self._row_cells = {} # row -> its cell
+        self._occupied = None # Keys of _cells as an (n, 2) array, built on demand
+
+    def _cell_of(self, lat, lon):
+        return np.floor(np.asarray(lat) / self.cell_deg).astype(np.int64), \
+               np.floor(np.asarray(lon) / self.cell_deg).astype(np.int64)
+
+    def add(self, rows, lat, lon):
+        cell_i, cell_j = self._cell_of(lat, lon)
+        for row, i, j in zip(np.atleast_1d(rows).tolist(), np.atleast_1d(cell_i).tolist(), np.atleast_1d(cell_j).tolist()):
+            members = self._cells.get((i, j))
+            if members is None:
+                members = self._cells[(i, j)] = set()
+                self._occupied = None
+            members.add(row)
+            self._row_cells[row] = (i, j)
+
+    def remove(self, row):
+        cell = self._row_cells.pop(row, None)
+        if cell is not None:
+            members = self._cells[cell]
+            members.discard(row)
+            if not members:
+                del self._cells[cell]
+                self._occupied = None
+
+    def candidates(self, lat, lon):
+        """Rows from the nearest rings of cells, at least n_candidates of them when available."""
+        ci, cj = (int(c) for c in self._cell_of(lat, lon))
+        found = []
+        ring = looked_up = 0
+        while len(found) < self.n_candidates:
+            ring_size = 8 * ring if ring else 1
+            if ring > self.max_ring or looked_up + ring_size > len(self._cells):
+                return self._from_occupied(ci, cj, ring, found)
+            if ring == 0:
+                ring_cells = [(ci, cj)]
+            else:
+                side = range(-ring, ring + 1)
+                ring_cells = ([(ci - ring, cj + d) for d in side] + [(ci + ring, cj + d) for d in side]
+                              + [(ci + d, cj - ring) for d in side[1:-1]] + [(ci + d, cj + ring) for d in side[1:-1]])
+            for cell in ring_cells:
+                members = self._cells.get(cell)
+                if members:
+                    found.extend(members)
+            looked_up += ring_size
+            ring += 1
+        return np.fromiter(found, dtype=np.intp, count=len(found))
+
+    def _from_occupied(self, ci, cj, ring, found):
+        """Finish a walk from the occupied cells at `ring` and beyond, whole rings at a time."""
+        if self._occupied is None:
+            self._occupied = np.array(list(self._cells), dtype=np.int64).reshape(-1, 2)
+        cell_rings = np.maximum(np.abs(self._occupied[:, 0] - ci), np.abs(self._occupied[:, 1] - cj))
+        order = np.argsort(cell_rings, kind='stable')
+        order = order[cell_rings[order] >= ring]
+        last_ring = None
+        for cell, cell_ring in zip(self._occupied[order].tolist(), cell_rings[order].tolist()):
+            if len(found) >= self.n_candidates and cell_ring != last_ring:
+                break
+            found.extend(self._cells[tuple(cell)])
+            last_ring = cell_ring
+        return np.fromiter(found, dtype=np.intp, count=len(found))
+
+NEIGHBOR_BACKENDS = {'exact': ExactBackend, 'grid': GridBackend}
+
+# Snapshots: VolunteerIndex.save/load write the fitted index to one joblib file whose
+# arrays are memory-mapped on load. Bump SNAPSHOT_FORMAT when the layout changes.
+SNAPSHOT_FORMAT = 2
+
+def _synchronized(method):
+    """Run a VolunteerIndex method under the index lock (queries also update lazy structures)."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+def make_backend(backend=None, **options):
+    """Backend instance from a name in NEIGHBOR_BACKENDS (default 'exact') or an instance."""
+    if backend is None:
+        backend = 'exact'
+    if isinstance(backend, str):
+        if backend not in NEIGHBOR_BACKENDS:
+            raise ValueError(f"Unknown neighbor backend '{backend}'. Choose from {sorted(NEIGHBOR_BACKENDS)}")
+        return NEIGHBOR_BACKENDS[backend](**options)
+    return backend
+
+class VolunteerIndex:
+    """
+    Long-lived k-NN index over volunteer feature vectors.
+    Supports add/update/remove of single volunteers by id and answers queries
+    against the current state without rebuilding anything.
+
+    Distances are the Euclidean distances a freshly fitted StandardScaler would
+    give: centering does not change distances between points, so only the
+    per-column standard deviation is needed, and that is kept up to date from
+    running sums (numeric columns) and per-skill counts on every add/remove.
+    The skill part of each distance is computed from the sparse skill matrix
+    directly, ||q - v||^2 = q.Wq + v.Wv - 2 q.Wv with W the inverse variances.
+
+    `backend` picks the rows each query is ranked against (see make_backend);
+    `backend_options` are passed to the backend class when it is given by name.
+
+    The index is safe to share between threads; save/load persist it as a
+    versioned snapshot for warm starts.
+    """
+
+    def __init__(self, capacity=1024, taxonomy=None, backend=None, backend_options=None):
+        capacity = max(int(capacity), 1)
+        self.taxonomy = taxonomy if taxonomy is not None else skill_taxonomy
+        self.backend = make_backend(backend, **(backend_options or {}))
+        self.source_version = None # Version marker of the data the index was built from
+        self._lock = threading.RLock()
+        self._numeric = np.zeros((capacity, NUMERIC_DIM))
+        self._active = np.zeros(capacity, dtype=bool)
+        self._ids = [None] * capacity
+        self._volunteers = [None] * capacity
+        self._rows = {} # volunteer id -> row in the arrays above
+        self._free_rows = [] # Rows released by remove(), reused before growing
+        self._size = 0 # High-water mark of used rows
+        # Running sums of (x - shift) and (x - shift)^2 for the numeric columns.
+        # The shift (first volunteer added) keeps the variance numerically stable
+        # for columns like latitude whose mean is far from zero.
+        self._shift = None
+        self._sum = np.zeros(NUMERIC_DIM)
+        self._sumsq = np.zeros(NUMERIC_DIM)
+        # Skills: a CSR matrix built in bulk, plus the skill columns of rows changed
+        # since (row -> column array; empty for removed rows), and per-skill counts.
+        self._skills = sparse.csr_matrix((0, len(self.taxonomy)))
+        self._skill_pending = {}
+        self._skill_counts = np.zeros(len(self.taxonomy))
+        # Haversine BallTree over volunteer locations, built on first geo query
+        self._geo_tree = None # None until the first geo query (or while the index is empty)
+        self._geo_tree_rows = np.zeros(0, dtype=np.intp) # Tree point -> row
+        self._geo_pending = set() # Rows added/changed/removed since the tree was built
+        # Volunteer dicts of a loaded snapshot stay pickled until first requested
+        self._volunteer_blob = None
+        self._volunteer_offsets = None
+        # Scaled rows for exact scans, reused until the index changes (see _scaled_rows)
+        self._mutations = 0
+        self._scaled = None
+
+    @classmethod
+    def from_volunteers(cls, volunteers, ids=None, taxonomy=None, backend=None, backend_options=None):
+        """
+        Build an index from a list of volunteer dictionaries.
+        Volunteers are keyed by ids[i] if given, else by their 'id' field,
+        else by their position in the list. Volunteers whose features cannot
+        be extracted are skipped, as in build_feature_matrix.
+        """
+        if ids is None:
+            ids = [vol.get('id', i) for i, vol in enumerate(volunteers)]
+        index = cls(capacity=len(volunteers), taxonomy=taxonomy, backend=backend, backend_options=backend_options)
+        numeric, skills, valid_indices = _volunteer_parts(volunteers, taxonomy=index.taxonomy)
+        if not valid_indices:
+            return index
+        valid_ids = [ids[i] for i in valid_indices]
+        with phase_timer().phase("fit"):
+            if len(set(valid_ids)) < len(valid_ids):
+                # Duplicate ids: later entries replace earlier ones
+                for row, i in enumerate(valid_indices):
+                    index.remove(ids[i])
+                    index._insert(ids[i], volunteers[i], numeric[row], skills.indices[skills.indptr[row]:skills.indptr[row + 1]])
+            else:
+                index._insert_many(valid_ids, [volunteers[i] for i in valid_indices], numeric, skills)
+        return index
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, volunteer_id):
+        return volunteer_id in self._rows
+
+    @_synchronized
+    def ids(self):
+        """Ids of all indexed volunteers."""
+        return list(self._rows)
+
+    @_synchronized
+    def items(self):
+        """(id, volunteer dictionary) pairs for all indexed volunteers."""
+        return [(vid, self._volunteer_at(row)) for vid, row in self._rows.items()]
+
+    @_synchronized
+    def get(self, volunteer_id, default=None):
+        """Return the stored volunteer dictionary for an id."""
+        row = self._rows.get(volunteer_id)
+        return default if row is None else self._volunteer_at(row)
+
+    def _volunteer_at(self, row):
+        volunteer = self._volunteers[row]
+        if volunteer is None and self._volunteer_blob is not None and row < self._volunteer_offsets.shape[0] - 1:
+            start, end = self._volunteer_offsets[row], self._volunteer_offsets[row + 1]
+            volunteer = pickle.loads(self._volunteer_blob[start:end].tobytes())
+            self._volunteers[row] = volunteer
+        return volunteer
+
+    # --- Mutation ---
+    @_synchronized
+    def add(self, volunteer_id, volunteer_data):
+        """
+        Add a volunteer, or replace it if the id is already indexed.
+        Raises ValueError if features cannot be extracted from volunteer_data.
+        """
         try:
-            vol_features = extract_features_volunteer(vol)
-            features.append(vol_features)
-            valid_volunteers_indices.append(i)
+            numeric, skills, _ = _volunteer_parts([volunteer_data], strict=True, taxonomy=self.taxonomy)
         except Exception as e:
-            # Log error for the specific volunteer
-            print(f"Error extracting features for volunteer {vol.get('id', 'N/A')}: {e}")
-            # Skip this volunteer
-            continue
+            raise ValueError(f"Cannot extract features for volunteer {volunteer_id}: {e}")
+        if volunteer_id in self._rows:
+            self.remove(volunteer_id)
+        self._insert(volunteer_id, volunteer_data, numeric[0], skills.indices)
 
-    if not features: # If no volunteers could be processed
-        return None, [] # Return None for matrix, empty list for indices
+    def update(self, volunteer_id, volunteer_data):
+        """Replace the stored data and features of a volunteer (adds it if missing)."""
+        self.add(volunteer_id, volunteer_data)
 
-    # Return the matrix and the indices of the volunteers included in it
-    return np.vstack(features), valid_volunteers_indices
+    @_synchronized
+    def remove(self, volunteer_id):
+        """Remove a volunteer by id. Returns False if the id was not indexed."""
+        row = self._rows.pop(volunteer_id, None)
+        if row is None:
+            return False
+        self._ensure_writable()
+        self._mutations += 1
+        centered = self._numeric[row] - self._shift
+        self._sum -= centered
+        self._sumsq -= centered * centered
+        self._skill_counts[self._row_skills(row)] -= 1
+        self._skill_pending[row] = np.zeros(0, dtype=np.intp)
+        self._active[row] = False
+        self._ids[row] = None
+        self._volunteers[row] = None
+        self._free_rows.append(row)
+        self.backend.remove(row)
+        if self._geo_tree is not None:
+            self._geo_pending.add(row)
+        if not self._rows: # Start the running sums afresh once the index is empty
+            self._shift = None
+            self._sum[:] = 0.0
+            self._sumsq[:] = 0.0
+            self._skill_counts[:] = 0.0
+        return True
+
+    def _insert(self, volunteer_id, volunteer_data, numeric, skill_columns):
+        self._ensure_writable()
+        self._mutations += 1
+        if self._free_rows:
+            row = self._free_rows.pop()
+        else:
+            if self._size == self._numeric.shape[0]:
+                self._grow()
+            row = self._size
+            self._size += 1
+        if self._shift is None:
+            self._shift = np.array(numeric, dtype=float)
+        self._numeric[row] = numeric
+        self._active[row] = True
+        self._ids[row] = volunteer_id
+        self._volunteers[row] = volunteer_data
+        self._rows[volunteer_id] = row
+        self.backend.add(row, numeric[LAT], numeric[LON])
+        if self._geo_tree is not None:
+            self._geo_pending.add(row)
+        centered = self._numeric[row] - self._shift
+        self._sum += centered
+        self._sumsq += centered * centered
+        skill_columns = np.asarray(skill_columns, dtype=np.intp)
+        self._skill_pending[row] = skill_columns
+        self._count_skills(skill_columns)
+        if len(self._skill_pending) > max(_REBUILD_MIN, _REBUILD_FRACTION * len(self._rows)):
+            self._compact_skills()
+
+    def _insert_many(self, volunteer_ids, volunteers, numeric, skills):
+        """Append new (not yet indexed) volunteers as one block of rows."""
+        self._ensure_writable()
+        self._mutations += 1
+        self._compact_skills() # Skill matrix now covers exactly the existing rows
+        n = numeric.shape[0]
+        while self._size + n > self._numeric.shape[0]:
+            self._grow()
+        rows = np.arange(self._size, self._size + n)
+        self._size += n
+        if self._shift is None:
+            self._shift = numeric[0].copy()
+        self._numeric[rows] = numeric
+        self._active[rows] = True
+        self._ids[rows[0]:rows[-1] + 1] = volunteer_ids
+        self._volunteers[rows[0]:rows[-1] + 1] = volunteers
+        self._rows.update(zip(volunteer_ids, rows.tolist()))
+        self.backend.add(rows, numeric[:, LAT], numeric[:, LON])
+        centered = numeric - self._shift
+        self._sum += centered.sum(axis=0)
+        self._sumsq += (centered * centered).sum(axis=0)
+        self._count_skills(skills.indices)
+        # Stack the block under the existing skill matrix in one go
+        width = len(self.taxonomy)
+        base, block = self._skills, skills.copy()
+        base.resize((rows[0], width))
+        block.resize((n, width))
+        self._skills = sparse.vstack([base, block], format='csr')
+        if self._geo_tree is not None:
+            self._geo_pending.update(rows.tolist())
+
+    def _ensure_writable(self):
+        """Copy memory-mapped snapshot arrays before the first in-place change."""
+        if not self._numeric.flags.writeable:
+            self._numeric = np.array(self._numeric)
+        if not self._active.flags.writeable:
+            self._active = np.array(self._active)
+
+    def _grow(self):
+        capacity = self._numeric.shape[0] * 2
+        numeric = np.zeros((capacity, NUMERIC_DIM))
+        numeric[:self._size] = self._numeric[:self._size]
+        active = np.zeros(capacity, dtype=bool)
+        active[:self._size] = self._active[:self._size]
+        self._numeric, self._active = numeric, active
+        self._ids.extend([None] * (capacity - len(self._ids)))
+        self._volunteers.extend([None] * (capacity - len(self._volunteers)))
+
+    # --- Skill storage ---
+    def _count_skills(self, columns):
+        width = len(self.taxonomy)
+        if self._skill_counts.shape[0] < width: # Taxonomy was extended
+            self._skill_counts = np.pad(self._skill_counts, (0, width - self._skill_counts.shape[0]))
+        np.add.at(self._skill_counts, columns, 1)
+
+    def _row_skills(self, row):
+        """Skill columns currently held by a row."""
+        if row in self._skill_pending:
+            return self._skill_pending[row]
+        if row >= self._skills.shape[0]:
+            return np.zeros(0, dtype=np.intp)
+        return self._skills.indices[self._skills.indptr[row]:self._skills.indptr[row + 1]]
+
+    def _skill_matrix(self):
+        """The bulk-built CSR matrix, reshaped to the current rows and taxonomy width."""
+        shape = (self._size, len(self.taxonomy))
+        if self._skills.shape != shape:
+            self._skills.resize(shape)
+        return self._skills
+
+    def _compact_skills(self):
+        """Fold the rows changed since the last build into the CSR matrix."""
+        base = self._skill_matrix()
+        if not self._skill_pending:
+            return
+        rows = np.fromiter(self._skill_pending, dtype=np.intp, count=len(self._skill_pending))
+        keep = np.ones(base.shape[0])
+        keep[rows] = 0.0
+        base = (sparse.diags(keep) @ base).tocsr()
+        base.eliminate_zeros()
+        columns = [self._skill_pending[row] for row in rows]
+        lengths = np.fromiter((c.size for c in columns), dtype=np.intp, count=len(columns))
+        changed = sparse.csr_matrix(
+            (np.ones(lengths.sum()), (np.repeat(rows, lengths), np.concatenate(columns) if columns else [])),
+            shape=base.shape)
+        self._skills = (base + changed).tocsr()
+        self._skill_pending = {}
+
+    def _skill_terms(self, weighted_queries, rows=None):
+        """
+        Per-volunteer pieces of the skill distance for a block of queries.
+        weighted_queries holds w * q per query (w = inverse skill variances).
+        Returns (v.Wv per row, q.Wv per row and query) for `rows` (default: all rows).
+        """
+        return self._skill_norms(self._skill_weights(), rows), self._skill_cross(weighted_queries, rows)
+
+    def _pending_positions(self, rows):
+        """(positions in `rows`, row) of the rows whose skills changed since the last build."""
+        pending = np.fromiter(self._skill_pending, dtype=np.intp, count=len(self._skill_pending))
+        if rows is None:
+            return pending, pending
+        positions = np.flatnonzero(np.isin(rows, pending))
+        return positions, rows[positions]
+
+    def _skill_norms(self, weights, rows=None):
+        matrix = self._skill_matrix()
+        v_norm = (matrix if rows is None else matrix[rows]) @ weights
+        if self._skill_pending:
+            for pos, row in zip(*self._pending_positions(rows)):
+                v_norm[pos] = weights[self._skill_pending[row]].sum()
+        return v_norm
+
+    def _skill_cross(self, weighted_queries, rows=None):
+        matrix = self._skill_matrix()
+        cross = np.asarray((matrix if rows is None else matrix[rows]) @ weighted_queries.T)
+        if self._skill_pending:
+            for pos, row in zip(*self._pending_positions(rows)):
+                cross[pos] = weighted_queries[:, self._skill_pending[row]].sum(axis=1)
+        return cross
+
+    # --- Statistics ---
+    def _skill_variance(self):
+        n = len(self._rows)
+        width = len(self.taxonomy)
+        counts = np.zeros(width)
+        counts[:min(width, self._skill_counts.shape[0])] = self._skill_counts[:width]
+        if n == 0:
+            return np.zeros(width)
+        p = counts / n # Skill columns are 0/1, so var = p(1 - p)
+        return p * (1.0 - p)
+
+    def _skill_weights(self):
+        return 1.0 / _column_scale(self._skill_variance()) ** 2
 
-def get_best_matches(request_features, volunteers, k=3):
+    @property
+    def mean_(self):
+        """Per-column mean, as StandardScaler.mean_ would report it."""
+        n = len(self._rows)
+        width = len(self.taxonomy)
+        if n == 0:
+            return np.zeros(NUMERIC_DIM + width)
+        counts = np.zeros(width)
+        counts[:min(width, self._skill_counts.shape[0])] = self._skill_counts[:width]
+        return np.concatenate([self._shift + self._sum / n, counts / n])
+
+    @property
+    def scale_(self):
+        """Per-column standard deviation, with zero-variance columns set to 1 like StandardScaler."""
+        n = len(self._rows)
+        if n == 0:
+            return np.ones(NUMERIC_DIM + len(self.taxonomy))
+        mean = self._sum / n
+        numeric_var = self._sumsq / n - mean * mean
+        return _column_scale(np.concatenate([numeric_var, self._skill_variance()]))
+
+    # --- Geo stage ---
+    def _rebuild_geo_tree(self):
+        rows = np.flatnonzero(self._active[:self._size])
+        self._geo_tree_rows = rows
+        self._geo_tree = BallTree(np.radians(self._numeric[rows, :2]), metric='haversine') if rows.size else None
+        self._geo_pending = set()
+
+    @_synchronized
+    def geo_candidates(self, lat, lon, radius_km=None, max_candidates=None):
+        """
+        Volunteers near (lat, lon) by great-circle distance: those within
+        radius_km, and/or the nearest max_candidates. At least one limit must be given.
+        Returns (rows, distances_km) sorted nearest first.
+        """
+        if radius_km is None and max_candidates is None:
+            raise ValueError("geo_candidates needs radius_km and/or max_candidates")
+        stale = len(self._geo_pending) > max(_REBUILD_MIN, _REBUILD_FRACTION * len(self._rows))
+        if stale or (self._geo_tree is None and self._rows):
+            self._rebuild_geo_tree()
+
+        point = np.radians([[lat, lon]])
+        pending = np.fromiter(self._geo_pending, dtype=np.intp, count=len(self._geo_pending))
+        rows, dists = [], []
+        if self._geo_tree is not None:
+            if radius_km is not None:
+                tree_idx, tree_dist = self._geo_tree.query_radius(
+                    point, r=radius_km / EARTH_RADIUS_KM, return_distance=True)
+                tree_idx, tree_dist = tree_idx[0], tree_dist[0]
+            else:
+                # Over-fetch by the number of stale tree points that may get filtered out
+                n = min(int(max_candidates) + pending.size, self._geo_tree_rows.size)
+                tree_dist, tree_idx = self._geo_tree.query(point, k=n)
+                tree_idx, tree_dist = tree_idx[0], tree_dist[0]
+            tree_rows = self._geo_tree_rows[tree_idx]
+            keep = ~np.isin(tree_rows, pending) # Changed rows are re-checked below
+            rows.append(tree_rows[keep])
+            dists.append(tree_dist[keep] * EARTH_RADIUS_KM)
+        if pending.size:
+            pending = pending[self._active[pending]]
+            rows.append(pending)
+            dists.append(haversine_km(lat, lon, self._numeric[pending, LAT], self._numeric[pending, LON]))
+
+        rows = np.concatenate(rows) if rows else np.zeros(0, dtype=np.intp)
+        dists = np.concatenate(dists) if dists else np.zeros(0)
+        if radius_km is not None:
+            within = dists <= radius_km
+            rows, dists = rows[within], dists[within]
+        order = np.argsort(dists, kind='stable')
+        if max_candidates is not None:
+            order = order[:int(max_candidates)]
+        return rows[order], dists[order]
+
+    # --- Queries ---
+    @_synchronized
+    def kneighbors(self, request_features, k=3, radius_km=None, max_candidates=None):
+        """
+        Find the k nearest volunteers in standard-scaled feature space.
+        request_features may be one feature vector or a 2D array of them
+        (vectors built before a taxonomy extension are zero-padded).
+        Returns (distances, volunteer_ids) with one row per query, nearest first.
+
+        With radius_km and/or max_candidates set, each query first pulls its
+        geo candidates (see geo_candidates) and ranks only those, on the skill
+        and availability columns, with great-circle distance breaking ties.
+        Otherwise an approximate backend picks the candidates to rank.
+        Requests without a location (lat/lon both 0) are ranked against everyone.
+        """
+        Q = _fit_width(request_features, NUMERIC_DIM + len(self.taxonomy))
+        k = min(int(k), len(self._rows))
+        if k <= 0:
+            return np.zeros((Q.shape[0], 0)), [[] for _ in range(Q.shape[0])]
+        timer = phase_timer()
+        with timer.phase("scale"):
+            scale = self.scale_
+        with timer.phase("query"):
+            geo_stage = radius_km is not None or max_candidates is not None
+            if not geo_stage and self.backend.exact:
+                distances, ids = self._kneighbors_all(Q, k, scale)
+                scanned = [len(self._rows)] * Q.shape[0]
+            else:
+                distances, ids, scanned = self._kneighbors_each(Q, k, scale, geo_stage, radius_km, max_candidates)
+        for n in scanned:
+            MATCH_VOLUNTEERS_SCANNED.observe(n, phase="query")
+        return distances, ids
+
+    def _kneighbors_each(self, Q, k, scale, geo_stage, radius_km, max_candidates):
+        """kneighbors one query at a time through the geo stage or the backend; also returns rows ranked per query."""
+        all_distances, all_ids, scanned = [], [], []
+        for q in Q:
+            rows = None
+            if q[LAT] != 0.0 or q[LON] != 0.0:
+                if geo_stage:
+                    rows, km = self.geo_candidates(q[LAT], q[LON], radius_km, max_candidates)
+                    distances, ids = self._rank_rows(q, rows, k, scale, columns=[FLAG], tiebreak=km)
+                else:
+                    rows = self.backend.candidates(q[LAT], q[LON])
+                    if rows.size < k: # Too few nearby; rank everyone instead
+                        rows = None
+                    else:
+                        distances, ids = self._rank_rows(q, rows, k, scale, columns=[LAT, LON, FLAG])
+            if rows is None:
+                distances, ids = self._kneighbors_all(q[None, :], k, scale)
+                distances, ids = distances[0], ids[0]
+            all_distances.append(distances)
+            all_ids.append(ids)
+            scanned.append(len(self._rows) if rows is None else rows.size)
+        # Geo-filtered queries may return fewer than k matches; pad distances with NaN
+        distances = np.full((Q.shape[0], k), np.nan)
+        for i, d in enumerate(all_distances):
+            distances[i, :d.size] = d
+        return distances, all_ids, scanned
+
+    def _rank_rows(self, q, rows, k, scale, columns, tiebreak=None):
+        """Exact ranking of one query against the given rows, using the numeric `columns` plus all skills."""
+        weights = 1.0 / scale[NUMERIC_DIM:] ** 2
+        q_skills = q[NUMERIC_DIM:]
+        v_norm, cross = self._skill_terms((weights * q_skills)[None, :], rows)
+        diff = (self._numeric[np.ix_(rows, columns)] - q[columns]) / scale[columns]
+        d2 = np.einsum('ij,ij->i', diff, diff) + weights @ (q_skills * q_skills) + v_norm - 2.0 * cross[:, 0]
+        d2 = np.maximum(d2, 0.0)
+        order = np.lexsort((tiebreak, d2)) if tiebreak is not None else np.argsort(d2, kind='stable')
+        order = order[:k]
+        return np.sqrt(d2[order]), [self._ids[row] for row in rows[order]]
+
+    @_synchronized
+    def recall(self, request_features, k=3):
+        """
+        Recall of the configured backend against exact search: the mean fraction
+        of each query's exact k nearest volunteers that kneighbors also returns.
+        Always 1.0 for the exact backend.
+        """
+        Q = _fit_width(request_features, NUMERIC_DIM + len(self.taxonomy))
+        k = min(int(k), len(self._rows))
+        if k <= 0:
+            return 1.0
+        _, found = self.kneighbors(Q, k)
+        _, exact = self._kneighbors_all(Q, k)
+        return float(np.mean([len(set(f) & set(e)) / len(e) for f, e in zip(found, exact)]))
+
+    def _scaled_rows(self, scale):
+        """
+        (Xs, row norms) for an exact scan: the scaled numeric columns and, per row,
+        ||x||^2 + v.Wv (inf for released rows). Cached until the index changes or
+        the scale differs, so a query costs one pass over the rows, not a rebuild.
+        """
+        cached = self._scaled
+        if cached is not None and cached[0] == self._mutations and np.array_equal(cached[1], scale):
+            return cached[2], cached[3]
+        numeric_scale, weights = scale[:NUMERIC_DIM], 1.0 / scale[NUMERIC_DIM:] ** 2
+        Xs = self._numeric[:self._size] / numeric_scale
+        norms = np.einsum('ij,ij->i', Xs, Xs) + self._skill_norms(weights)
+        norms[~self._active[:self._size]] = np.inf # Released rows never match
+        self._scaled = (self._mutations, np.array(scale), Xs, norms)
+        return Xs, norms
+
+    def _dense_skills(self, lo, hi, pending):
+        """Skill columns of rows lo:hi as a dense 0/1 array; pending holds the sorted rows changed since the last build."""
+        skills = self._skill_matrix()[lo:hi].toarray()
+        for row in pending[np.searchsorted(pending, lo):np.searchsorted(pending, hi)]:
+            skills[row - lo] = 0.0
+            skills[row - lo, self._skill_pending[row]] = 1.0
+        return skills
+
+    def _kneighbors_all(self, Q, k, scale=None):
+        scale = self.scale_ if scale is None else scale
+        numeric_scale, weights = scale[:NUMERIC_DIM], 1.0 / scale[NUMERIC_DIM:] ** 2
+        Xs, norms = self._scaled_rows(scale)
+        pending = np.sort(np.fromiter(self._skill_pending, dtype=np.intp, count=len(self._skill_pending)))
+
+        # Queries go in blocks of up to _QUERY_CHUNK and volunteers in tiles sized so the
+        # block's distances and argpartition indices (queries x tile) plus the tile's
+        # dense features stay within _BLOCK_BYTES. Each tile's k nearest are merged into
+        # a running top k, so memory does not grow with the index.
+        m = min(Q.shape[0], _QUERY_CHUNK)
+        tile = max(k, _BLOCK_BYTES // (8 * (2 * m + Xs.shape[1] + weights.size)))
+        buffer = np.empty((m, min(tile, norms.size)))
+
+        distances, all_ids = np.empty((Q.shape[0], k)), []
+        for start in range(0, Q.shape[0], m):
+            block = Q[start:start + m]
+            Qs = block[:, :NUMERIC_DIM] / numeric_scale
+            q_skills = block[:, NUMERIC_DIM:]
+            # ||q - x||^2 = ||q||^2 + (||x||^2 - 2 q.x); only the bracket is needed to rank
+            queries = -2.0 * np.hstack([Qs, q_skills * weights])
+            top_d2 = np.zeros((block.shape[0], 0))
+            top = np.zeros((block.shape[0], 0), dtype=np.intp)
+            for lo in range(0, norms.size, tile):
+                hi = min(lo + tile, norms.size)
+                d2 = buffer[:block.shape[0], :hi - lo]
+                np.matmul(queries, np.hstack([Xs[lo:hi], self._dense_skills(lo, hi, pending)]).T, out=d2)
+                d2 += norms[lo:hi]
+                nearest = np.argpartition(d2, min(k, hi - lo) - 1, axis=1)[:, :k]
+                top_d2 = np.hstack([top_d2, np.take_along_axis(d2, nearest, axis=1)])
+                top = np.hstack([top, nearest + lo])
+                if top.shape[1] > k:
+                    keep = np.argpartition(top_d2, k - 1, axis=1)[:, :k]
+                    top_d2 = np.take_along_axis(top_d2, keep, axis=1)
+                    top = np.take_along_axis(top, keep, axis=1)
+            order = np.argsort(top_d2, axis=1, kind='stable')
+            top = np.take_along_axis(top, order, axis=1)
+            top_d2 = np.take_along_axis(top_d2, order, axis=1)
+            top_d2 += (np.einsum('ij,ij->i', Qs, Qs) + (q_skills * q_skills) @ weights)[:, None]
+            np.sqrt(np.maximum(top_d2, 0.0), out=distances[start:start + m])
+            all_ids.extend([self._ids[row] for row in rows] for rows in top)
+        return distances, all_ids
+
+    @_synchronized
+    def get_best_matches(self, request_features, k=3, radius_km=None, max_candidates=None):
+        """Return the volunteer dictionaries of the k best matches for one request."""
+        _, ids = self.kneighbors(request_features, k, radius_km, max_candidates)
+        return [self.get(vid) for vid in ids[0]]
+
+    @_synchronized
+    def get_best_matches_many(self, request_features, ks, radius_km=None, max_candidates=None):
+        """
+        Volunteer dictionaries of the best matches for a batch of requests, ks[i]
+        for request i, from one kneighbors call. The lookups run under the same lock
+        hold as the search, so a concurrent remove cannot leave a gap in the results.
+        """
+        _, ids = self.kneighbors(request_features, max(ks), radius_km, max_candidates)
+        return [[self.get(vid) for vid in row[:k]] for row, k in zip(ids, ks)]
+
+    # --- Snapshots ---
+    @_synchronized
+    def save(self, path, source_version=None):
+        """
+        Write the index to a snapshot file (atomically replacing any existing one).
+        source_version records which state of the volunteer data it reflects, so
+        load() can refuse a stale snapshot.
+        """
+        self._compact_skills()
+        size = self._size
+        pickled = [pickle.dumps(self._volunteer_at(row) if self._active[row] else None, protocol=pickle.HIGHEST_PROTOCOL)
+                   for row in range(size)]
+        offsets = np.zeros(size + 1, dtype=np.int64)
+        np.cumsum([len(p) for p in pickled], out=offsets[1:])
+        skills = self._skill_matrix()
+        payload = {
+            "format": SNAPSHOT_FORMAT,
+            "source_version": source_version,
+            "created_at": time.time(),
+            "taxonomy": self.taxonomy.names,
+            "ids": self._ids[:size],
+            "numeric": np.ascontiguousarray(self._numeric[:size]),
+            "active": np.ascontiguousarray(self._active[:size]),
+            "volunteer_blob": np.frombuffer(b"".join(pickled), dtype=np.uint8),
+            "volunteer_offsets": offsets,
+            "skills": (skills.data, skills.indices, skills.indptr, skills.shape),
+            "skill_counts": self._skill_counts,
+            "stats": (self._shift, self._sum, self._sumsq),
+            "free_rows": list(self._free_rows),
+            "backend": self.backend,
+            "geo": (self._geo_tree, self._geo_tree_rows, sorted(self._geo_pending)),
+        }
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        joblib.dump(payload, tmp_path)
+        os.replace(tmp_path, path)
+        self.source_version = source_version
+
+    @classmethod
+    def load(cls, path, source_version=None, taxonomy=None, mmap_mode='r'):
+        """
+        Load an index written by save(), memory-mapping its arrays.
+        Returns None (after printing why) if the file is missing, unreadable,
+        of another SNAPSHOT_FORMAT, built from another source_version (when one
+        is given), or built with skill columns that conflict with the taxonomy.
+        """
+        if not os.path.exists(path):
+            return None
+        try:
+            payload = joblib.load(path, mmap_mode=mmap_mode)
+        except Exception as e:
+            print(f"Warning: Could not read volunteer index snapshot '{path}': {e}")
+            return None
+        if not isinstance(payload, dict) or payload.get("format") != SNAPSHOT_FORMAT:
+            print(f"Warning: Volunteer index snapshot '{path}' has an unsupported format. Ignoring it.")
+            return None
+        if source_version is not None and payload["source_version"] != source_version:
+            print(f"Info: Volunteer index snapshot '{path}' is stale "
+                  f"({payload['source_version']} != {source_version}). Ignoring it.")
+            return None
+        index = cls(capacity=1, taxonomy=taxonomy, backend=payload["backend"])
+        if not index.taxonomy.extend_in_order(payload["taxonomy"]):
+            print(f"Warning: Volunteer index snapshot '{path}' uses different skill columns. Ignoring it.")
+            return None
+
+        ids = payload["ids"]
+        index.source_version = payload["source_version"]
+        index._numeric = payload["numeric"]
+        index._active = payload["active"]
+        index._size = len(ids)
+        index._ids = list(ids)
+        index._volunteers = [None] * len(ids)
+        index._volunteer_blob = payload["volunteer_blob"]
+        index._volunteer_offsets = payload["volunteer_offsets"]
+        index._rows = {vid: row for row, vid in enumerate(ids) if vid is not None}
+        index._free_rows = list(payload["free_rows"])
+        data, indices, indptr, shape = payload["skills"]
+        index._skills = sparse.csr_matrix((data, indices, indptr), shape=shape)
+        index._skill_counts = np.array(payload["skill_counts"])
+        shift, total, total_sq = payload["stats"]
+        index._shift = None if shift is None else np.array(shift)
+        index._sum, index._sumsq = np.array(total), np.array(total_sq)
+        index._geo_tree, index._geo_tree_rows, pending = payload["geo"]
+        index._geo_pending = set(pending)
+        return index
+
+def get_best_matches(request_features, volunteers, k=3, radius_km=None, max_candidates=None):
     """
     Production function: Uses KNN to find the top k matching volunteers.
     Returns a list of volunteer dictionaries for the best matches.
+    `volunteers` may be a list of volunteer dictionaries or a long-lived
+    VolunteerIndex; a list is indexed on the fly for this call only.
+    radius_km / max_candidates enable the geo stage (see VolunteerIndex.kneighbors).
     Handles cases where feature extraction fails for some/all volunteers.
     """
+    if isinstance(volunteers, VolunteerIndex):
+        return volunteers.get_best_matches(request_features, k, radius_km, max_candidates)
+
     if not volunteers:
         return []
 
-    # Build feature matrix, getting back only features for valid volunteers and their original indices
-    X, valid_indices = build_feature_matrix(volunteers)
-
-    if X is None or X.shape[0] == 0: # Check if matrix is None or empty
+    # Key volunteers by position so duplicate or missing ids are all kept
+    index = VolunteerIndex.from_volunteers(volunteers, ids=range(len(volunteers)))
+    if len(index) == 0:
         print("Warning: No valid volunteer features could be extracted.")
         return []
 
-    # Filter the original volunteers list to match the rows in X
-    valid_volunteers = [volunteers[i] for i in valid_indices]
-
-    # Scale features (only valid ones)
-    scaler_local = StandardScaler()
-    # Use try-except for scaling in case of issues (e.g., variance is zero)
-    try:
-        X_scaled = scaler_local.fit_transform(X)
-        req_scaled = scaler_local.transform([request_features])
-    except ValueError as e:
-        print(f"Error during scaling: {e}. Returning empty matches.")
-        return []
-
-
-    # Perform KNN
-    # Adjust k if there are fewer valid volunteers than requested
-    actual_k = min(k, X_scaled.shape[0])
-    if actual_k == 0:
-        return []
-
-    nn = NearestNeighbors(n_neighbors=actual_k, metric='euclidean')
-    nn.fit(X_scaled)
-    distances, indices = nn.kneighbors(req_scaled)
-
-    # Map indices from KNN (which refer to rows in X_scaled) back to the original volunteers list
-    # using the valid_volunteers list
-    matches = [valid_volunteers[i] for i in indices[0]]
-    return matches
+    return index.get_best_matches(request_features, k, radius_km, max_candidates)
 
 def get_best_matches_debug(request_features, volunteers, k=3):
     """
     Debug function: Similar to get_best_matches, but returns detailed matching info.
     Handles cases where feature extraction fails for some/all volunteers.
+    "timings_seconds" breaks the time down by phase (extract, scale, fit, query);
+    "data_quality" is the DataQualityReport summary of the match (including the
+    request's extraction when the caller collects it in the same report).
     """
+    with collect_data_quality("debug match") as report:
+        debug_output = _best_matches_debug(request_features, volunteers, k)
+        debug_output["data_quality"] = report.summary()
+    return debug_output
+
+def _best_matches_debug(request_features, volunteers, k):
+    timer = PhaseTimer() # Not recorded in the metrics: this path is not how production matches
     debug_output = {
         "request_features": request_features.tolist() if request_features is not None else [],
         "volunteer_features": [],
@@ -189,7 +1305,8 @@ def get_best_matches_debug(request_features, volunteers, k=3):
         "distances": [],
         "indices": [],
         "matched_volunteers": [],
-        "processing_warnings": []
+        "processing_warnings": [],
+        "timings_seconds": timer.timings, # Filled in as each phase completes
     }
 
     if not volunteers:
@@ -197,20 +1314,24 @@ def get_best_matches_debug(request_features, volunteers, k=3):
         return debug_output
 
     # Build feature matrix
-    X, valid_indices = build_feature_matrix(volunteers)
+    with timer.phase("extract"):
+        X, valid_indices = build_feature_matrix(volunteers)
 
     if X is None or X.shape[0] == 0:
         debug_output["processing_warnings"].append("No valid volunteer features could be extracted.")
         return debug_output
 
     valid_volunteers = [volunteers[i] for i in valid_indices]
+    X = X.toarray() # Debug output lists every column, so densify the sparse matrix
+    request_features = _fit_width(request_features, X.shape[1])[0]
     debug_output["volunteer_features"] = X.tolist() # Raw features of valid volunteers
 
     # Scale features
     scaler_local = StandardScaler()
     try:
-        X_scaled = scaler_local.fit_transform(X)
-        req_scaled = scaler_local.transform([request_features])
+        with timer.phase("scale"):
+            X_scaled = scaler_local.fit_transform(X)
+            req_scaled = scaler_local.transform([request_features])
         debug_output["X_scaled"] = X_scaled.tolist()
         debug_output["req_scaled"] = req_scaled[0].tolist()
     except ValueError as e:
@@ -224,8 +1345,10 @@ def get_best_matches_debug(request_features, volunteers, k=3):
          return debug_output
 
     nn = NearestNeighbors(n_neighbors=actual_k, metric='euclidean')
-    nn.fit(X_scaled)
-    distances, indices = nn.kneighbors(req_scaled)
+    with timer.phase("fit"):
+        nn.fit(X_scaled)
+    with timer.phase("query"):
+        distances, indices = nn.kneighbors(req_scaled)
 
     distances_list = distances[0].tolist()
     indices_list = indices[0].tolist() # Indices relative to X_scaled / valid_volunteers
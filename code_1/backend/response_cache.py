@@ -0,0 +1,83 @@
+# 1_code/response_cache.py
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+# Server-side cache of rendered GET responses for read-mostly collections.
+# Entries are keyed by (collection, query key) and carry an ETag so clients can
+# revalidate with If-None-Match. Writes made through the API invalidate their
+# collection; the TTL bounds how long writes made elsewhere (e.g.
+# populate_database.py, the Firebase console) can go unnoticed.
+
+CachedResponse = namedtuple("CachedResponse", ["body", "etag", "headers", "expires"])
+
+
+def make_etag(body):
+    """Strong ETag for a response body."""
+    return '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+
+
+def etag_matches(if_none_match, etag):
+    """True if an If-None-Match header value matches etag (weak comparison, as for GET)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+class ResponseCache:
+    """
+    LRU cache of rendered responses with a TTL and per-collection invalidation.
+
+    Readers that miss should take generation(collection) before querying and
+    pass it to put(), so a response computed before a concurrent write is not
+    cached after that write invalidated the collection.
+    """
+
+    def __init__(self, ttl=30.0, max_entries=256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict() # (collection, key) -> CachedResponse
+        self._generations = {} # collection -> number of invalidations
+        self._lock = threading.Lock()
+
+    def generation(self, collection):
+        with self._lock:
+            return self._generations.get(collection, 0)
+
+    def get(self, collection, key):
+        """The cached response, or None if missing or expired."""
+        with self._lock:
+            entry = self._entries.get((collection, key))
+            if entry is None or entry.expires <= time.monotonic():
+                self._entries.pop((collection, key), None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end((collection, key))
+            self.hits += 1
+            return entry
+
+    def put(self, collection, key, body, headers=None, generation=None):
+        """Cache a rendered body; returns the entry (which is not stored if the collection changed since `generation`)."""
+        entry = CachedResponse(body, make_etag(body), dict(headers or {}), time.monotonic() + self.ttl)
+        with self._lock:
+            if generation is not None and generation != self._generations.get(collection, 0):
+                return entry
+            self._entries[(collection, key)] = entry
+            self._entries.move_to_end((collection, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, collection):
+        """Drop every cached response for a collection (call after writing to it)."""
+        with self._lock:
+            self._generations[collection] = self._generations.get(collection, 0) + 1
+            for cache_key in [cache_key for cache_key in self._entries if cache_key[0] == collection]:
+                del self._entries[cache_key]
@@ -0,0 +1,560 @@
+# 1_code/storage.py
+
+import abc
+import asyncio
+import bisect
+import copy
+import datetime
+import json
+import os
+import secrets
+import sqlite3
+import string
+import threading
+from collections import namedtuple
+
+from firebase_admin import firestore
+
+# Storage layer behind the API. Handlers read and write documents through a
+# Storage instead of Firestore collection references, so the app can also run
+# (and be profiled or load-tested) without Firebase:
+#   - FirestoreStorage: Cloud Firestore (production).
+#   - MemoryStorage: dicts in this process; nothing is persisted.
+#   - SQLiteStorage: one SQLite file with an index for createdAt ordering; a
+#     cheap single-node deployment.
+# Documents are dicts keyed by id within named collections. Writes go through
+# commit(), which applies a list of set/update/delete writes atomically and
+# resolves firestore.SERVER_TIMESTAMP values to the commit time, as Firestore does.
+
+DocRef = namedtuple("DocRef", ["collection", "id"])
+WriteResult = namedtuple("WriteResult", ["update_time"])
+
+_ID_ALPHABET = string.ascii_letters + string.digits
+
+
+def new_document_id():
+    """Random 20-character id, like Firestore's auto ids."""
+    return "".join(secrets.choice(_ID_ALPHABET) for _ in range(20))
+
+
+class Document:
+    """A document read from storage (the subset of a Firestore DocumentSnapshot the app uses)."""
+
+    __slots__ = ("reference", "_data")
+
+    def __init__(self, reference, data):
+        self.reference = reference
+        self._data = data
+
+    @property
+    def id(self):
+        return self.reference.id
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+
+class Storage(abc.ABC):
+    """
+    Interface of the storage backends.
+
+    query()/stream() options:
+    order_by: field to order by (documents without it are left out, as in
+        Firestore); ties are broken by document id. None orders by id.
+    descending: reverse the order.
+    start_after: (order_by value, document id) of the document to start after.
+    limit: maximum number of documents.
+    fields: list of top-level fields to return (a projection); [] returns ids only.
+    """
+
+    name = None
+
+    def document(self, collection, doc_id=None):
+        """Reference to a document; a new random id when doc_id is None."""
+        return DocRef(collection, doc_id or new_document_id())
+
+    @abc.abstractmethod
+    async def get(self, collection, doc_id):
+        """The Document (whose .exists is False if there is none)."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def get_many(self, collection, doc_ids):
+        """Documents for many ids in one round trip (missing ones are left out)."""
+        raise NotImplementedError
+
+    async def query(self, collection, order_by=None, descending=False, start_after=None, limit=None, fields=None):
+        """List of Documents; see the class docstring for the options."""
+        return [doc async for doc in self.stream(collection, order_by, descending, start_after, limit, fields)]
+
+    @abc.abstractmethod
+    def stream(self, collection, order_by=None, descending=False, start_after=None, limit=None, fields=None):
+        """Async iterator over Documents; see the class docstring for the options."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def commit(self, writes):
+        """
+        Apply [(op, DocRef, data), ...] atomically; op is "set", "update" (the
+        document must exist) or "delete". Returns one WriteResult per write.
+        """
+        raise NotImplementedError
+
+    async def add(self, collection, data):
+        """Create a document with a new id; returns (DocRef, WriteResult)."""
+        ref = self.document(collection)
+        return ref, (await self.commit([("set", ref, data)]))[0]
+
+    # --- Synchronous reads, for the volunteer store's own thread ---
+    def sync_collection(self, collection):
+        """Object whose stream() returns every Document of a collection (a Firestore reference also has on_snapshot)."""
+        return _SyncCollection(self, collection)
+
+    @abc.abstractmethod
+    def get_sync(self, collection, doc_id):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def stream_sync(self, collection):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def count_sync(self, collection):
+        raise NotImplementedError
+
+
+class _SyncCollection:
+    def __init__(self, storage, collection):
+        self.storage = storage
+        self.id = collection
+
+    def stream(self):
+        return self.storage.stream_sync(self.id)
+
+
+def _project(data, fields):
+    return data if fields is None else {key: data[key] for key in fields if key in data}
+
+
+# ————— Firestore —————
+class FirestoreStorage(Storage):
+    """Cloud Firestore, through a synchronous and an async client."""
+
+    name = "firestore"
+
+    def __init__(self, client, async_client):
+        self.client = client
+        self.async_client = async_client
+
+    def _doc(self, ref):
+        return self.async_client.collection(ref.collection).document(ref.id)
+
+    @staticmethod
+    def _wrap(collection, snapshot):
+        return Document(DocRef(collection, snapshot.id), snapshot.to_dict() if snapshot.exists else None)
+
+    async def get(self, collection, doc_id):
+        return self._wrap(collection, await self.async_client.collection(collection).document(doc_id).get())
+
+    async def get_many(self, collection, doc_ids):
+        refs = [self.async_client.collection(collection).document(doc_id) for doc_id in dict.fromkeys(doc_ids)]
+        return [self._wrap(collection, snapshot) async for snapshot in self.async_client.get_all(refs)
+                if snapshot.exists]
+
+    def _query(self, collection, order_by, descending, start_after, limit, fields):
+        query = self.async_client.collection(collection)
+        direction = firestore.Query.DESCENDING if descending else firestore.Query.ASCENDING
+        if order_by is not None:
+            query = query.order_by(order_by, direction=direction)
+        # Ties are broken by document id ("__name__") so start_after is exact
+        query = query.order_by("__name__", direction=direction)
+        if start_after is not None:
+            value, doc_id = start_after
+            query = query.start_after({order_by: value, "__name__": doc_id} if order_by else {"__name__": doc_id})
+        if fields is not None:
+            query = query.select(fields)
+        if limit is not None:
+            query = query.limit(limit)
+        return query
+
+    async def query(self, collection, order_by=None, descending=False, start_after=None, limit=None, fields=None):
+        snapshots = await self._query(collection, order_by, descending, start_after, limit, fields).get()
+        return [self._wrap(collection, snapshot) for snapshot in snapshots]
+
+    async def stream(self, collection, order_by=None, descending=False, start_after=None, limit=None, fields=None):
+        async for snapshot in self._query(collection, order_by, descending, start_after, limit, fields).stream():
+            yield self._wrap(collection, snapshot)
+
+    async def commit(self, writes):
+        batch = self.async_client.batch()
+        for op, ref, data in writes:
+            if op == "delete":
+                batch.delete(self._doc(ref))
+            else:
+                getattr(batch, op)(self._doc(ref), data)
+        return await batch.commit()
+
+    def sync_collection(self, collection):
+        return self.client.collection(collection) # Supports on_snapshot listeners
+
+    def get_sync(self, collection, doc_id):
+        return self._wrap(collection, self.client.collection(collection).document(doc_id).get())
+
+    def stream_sync(self, collection):
+        return [self._wrap(collection, snapshot) for snapshot in self.client.collection(collection).stream()]
+
+    def count_sync(self, collection):
+        return self.client.collection(collection).count().get()[0][0].value
+
+
+# ————— Local backends —————
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+def _resolve(data, commit_time):
+    return {key: commit_time if value is firestore.SERVER_TIMESTAMP else value for key, value in data.items()}
+
+def _as_utc(value):
+    return value if value.tzinfo is not None else value.replace(tzinfo=datetime.timezone.utc)
+
+def sort_key(value):
+    """
+    Total order over field values, by type first as Firestore orders them
+    (null < booleans < numbers < timestamps < strings < everything else).
+    """
+    if value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (1, int(value))
+    if isinstance(value, (int, float)):
+        return (2, value)
+    if isinstance(value, datetime.datetime):
+        return (3, _as_utc(value).timestamp())
+    if isinstance(value, str):
+        return (4, value)
+    return (5, json.dumps(value, sort_keys=True, default=str))
+
+def _check_writes(writes, exists):
+    for op, ref, _ in writes:
+        if op not in ("set", "update", "delete"):
+            raise ValueError(f"Unknown write operation '{op}'")
+        if op == "update" and not exists(ref):
+            raise LookupError(f"No document to update: {ref.collection}/{ref.id}")
+
+
+class MemoryStorage(Storage):
+    """
+    Documents held in this process (lost on exit). Ordered queries use a sorted
+    (key, id) index per collection and field, built on first use and kept up to
+    date on writes, so a page costs a binary search rather than a sort.
+    """
+
+    name = "memory"
+
+    def __init__(self):
+        self._collections = {} # collection -> {id: data}
+        self._indexes = {} # (collection, field) -> sorted [(sort_key(value), id)]
+        self._lock = threading.RLock()
+
+    def _docs(self, collection):
+        return self._collections.setdefault(collection, {})
+
+    def _read(self, collection, doc_id, fields=None):
+        data = self._docs(collection).get(doc_id)
+        return Document(DocRef(collection, doc_id), None if data is None else copy.deepcopy(_project(data, fields)))
+
+    async def get(self, collection, doc_id):
+        return self.get_sync(collection, doc_id)
+
+    async def get_many(self, collection, doc_ids):
+        with self._lock:
+            docs = self._docs(collection)
+            return [self._read(collection, doc_id) for doc_id in dict.fromkeys(doc_ids) if doc_id in docs]
+
+    def _index(self, collection, field):
+        index = self._indexes.get((collection, field))
+        if index is None:
+            index = sorted((sort_key(data[field]), doc_id) for doc_id, data in self._docs(collection).items()
+                           if field in data)
+            self._indexes[(collection, field)] = index
+        return index
+
+    def _ordered_ids(self, collection, order_by, descending, start_after, limit):
+        if order_by is None:
+            keys = sorted((doc_id, doc_id) for doc_id in self._docs(collection))
+            after = None if start_after is None else (start_after[1], start_after[1])
+        else:
+            keys = self._index(collection, order_by)
+            after = None if start_after is None else (sort_key(start_after[0]), start_after[1])
+        if descending:
+            end = len(keys) if after is None else bisect.bisect_left(keys, after)
+            start = 0 if limit is None else max(end - limit, 0)
+            return [doc_id for _, doc_id in reversed(keys[start:end])]
+        start = 0 if after is None else bisect.bisect_right(keys, after)
+        end = len(keys) if limit is None else start + limit
+        return [doc_id for _, doc_id in keys[start:end]]
+
+    async def query(self, collection, order_by=None, descending=False, start_after=None, limit=None, fields=None):
+        with self._lock:
+            doc_ids = self._ordered_ids(collection, order_by, descending, start_after, limit)
+            return [self._read(collection, doc_id, fields) for doc_id in doc_ids]
+
+    async def stream(self, collection, order_by=None, descending=False, start_after=None, limit=None, fields=None):
+        with self._lock:
+            doc_ids = self._ordered_ids(collection, order_by, descending, start_after, limit)
+        for doc_id in doc_ids:
+            with self._lock:
+                doc = self._read(collection, doc_id, fields)
+            if doc.exists: # Skip documents deleted since the query ran
+                yield doc
+
+    async def commit(self, writes):
+        return self.commit_sync(writes)
+
+    def commit_sync(self, writes):
+        with self._lock:
+            _check_writes(writes, lambda ref: ref.id in self._docs(ref.collection))
+            commit_time = _now()
+            for op, ref, data in writes:
+                docs = self._docs(ref.collection)
+                old = docs.get(ref.id)
+                if op == "delete":
+                    new = None
+                elif op == "update":
+                    new = dict(old, **copy.deepcopy(_resolve(data, commit_time)))
+                else:
+                    new = copy.deepcopy(_resolve(data, commit_time))
+                if new is None:
+                    docs.pop(ref.id, None)
+                else:
+                    docs[ref.id] = new
+                self._reindex(ref, old, new)
+            return [WriteResult(commit_time) for _ in writes]
+
+    def _reindex(self, ref, old, new):
+        for (collection, field), index in self._indexes.items():
+            if collection != ref.collection:
+                continue
+            if old is not None and field in old:
+                entry = (sort_key(old[field]), ref.id)
+                position = bisect.bisect_left(index, entry)
+                if position < len(index) and index[position] == entry:
+                    del index[position]
+            if new is not None and field in new:
+                bisect.insort(index, (sort_key(new[field]), ref.id))
+
+    def get_sync(self, collection, doc_id):
+        with self._lock:
+            return self._read(collection, doc_id)
+
+    def stream_sync(self, collection):
+        with self._lock:
+            return [self._read(collection, doc_id) for doc_id in sorted(self._docs(collection))]
+
+    def count_sync(self, collection):
+        with self._lock:
+            return len(self._docs(collection))
+
+
+def _encode_value(value):
+    if isinstance(value, datetime.datetime):
+        return {"__datetime__": _as_utc(value).isoformat()}
+    raise TypeError(f"Object of type {type(value).__name__} cannot be stored")
+
+def _decode_object(obj):
+    if len(obj) == 1 and "__datetime__" in obj:
+        return datetime.datetime.fromisoformat(obj["__datetime__"])
+    return obj
+
+
+class SQLiteStorage(Storage):
+    """
+    Documents in one SQLite file, stored as JSON (datetimes tagged so they come
+    back as datetimes). The ORDER_FIELD (createdAt, the field every list
+    endpoint orders by) is also kept in indexed columns, so pages and cursors
+    are index range scans; ordering by any other field sorts in Python.
+    Calls run in a worker thread so they do not block the event loop.
+    """
+
+    name = "sqlite"
+    ORDER_FIELD = "createdAt"
+    STREAM_PAGE = 500 # Rows fetched per round trip when streaming
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " collection TEXT NOT NULL, id TEXT NOT NULL, data TEXT NOT NULL,"
+            " order_rank INTEGER, order_value,"
+            " PRIMARY KEY (collection, id))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS documents_order ON documents"
+                           " (collection, order_rank, order_value, id)")
+        self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # --- Encoding ---
+    @staticmethod
+    def _dumps(data):
+        return json.dumps(data, default=_encode_value, separators=(",", ":"))
+
+    @staticmethod
+    def _loads(text):
+        return json.loads(text, object_hook=_decode_object)
+
+    def _row(self, collection, doc_id, text, fields=None):
+        return Document(DocRef(collection, doc_id), None if text is None else _project(self._loads(text), fields))
+
+    # --- Reads ---
+    def get_sync(self, collection, doc_id):
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM documents WHERE collection = ? AND id = ?",
+                                     (collection, doc_id)).fetchone()
+        return self._row(collection, doc_id, row[0] if row else None)
+
+    async def get(self, collection, doc_id):
+        return await asyncio.to_thread(self.get_sync, collection, doc_id)
+
+    def _get_many_sync(self, collection, doc_ids):
+        doc_ids = list(dict.fromkeys(doc_ids))
+        rows = []
+        with self._lock:
+            for start in range(0, len(doc_ids), 500): # Stay under SQLite's bound-parameter limit
+                chunk = doc_ids[start:start + 500]
+                rows += self._conn.execute(
+                    f"SELECT id, data FROM documents WHERE collection = ? AND id IN ({','.join('?' * len(chunk))})",
+                    [collection, *chunk]).fetchall()
+        return [self._row(collection, doc_id, text) for doc_id, text in rows]
+
+    async def get_many(self, collection, doc_ids):
+        return await asyncio.to_thread(self._get_many_sync, collection, doc_ids)
+
+    def _query_sync(self, collection, order_by, descending, start_after, limit, fields):
+        if order_by not in (None, self.ORDER_FIELD):
+            return self._query_in_python(collection, order_by, descending, start_after, limit, fields)
+        direction = "DESC" if descending else "ASC"
+        compare = "<" if descending else ">"
+        sql = "SELECT id, data FROM documents WHERE collection = ?"
+        params = [collection]
+        if order_by is None:
+            if start_after is not None:
+                sql += f" AND id {compare} ?"
+                params.append(start_after[1])
+            sql += f" ORDER BY id {direction}"
+        else:
+            sql += " AND order_rank IS NOT NULL"
+            if start_after is not None:
+                rank, value = sort_key(start_after[0])
+                sql += f" AND (order_rank, order_value, id) {compare} (?, ?, ?)"
+                params += [rank, value, start_after[1]]
+            sql += f" ORDER BY order_rank {direction}, order_value {direction}, id {direction}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [self._row(collection, doc_id, text, fields) for doc_id, text in rows]
+
+    def _query_in_python(self, collection, order_by, descending, start_after, limit, fields):
+        with self._lock:
+            rows = self._conn.execute("SELECT id, data FROM documents WHERE collection = ?", (collection,)).fetchall()
+        keyed = []
+        for doc_id, text in rows:
+            data = self._loads(text)
+            if order_by in data:
+                keyed.append(((sort_key(data[order_by]), doc_id), doc_id, data))
+        keyed.sort(key=lambda entry: entry[0], reverse=descending)
+        if start_after is not None:
+            after = (sort_key(start_after[0]), start_after[1])
+            keyed = [entry for entry in keyed if (entry[0] < after if descending else entry[0] > after)]
+        keyed = keyed if limit is None else keyed[:limit]
+        return [Document(DocRef(collection, doc_id), _project(data, fields)) for _, doc_id, data in keyed]
+
+    async def query(self, collection, order_by=None, descending=False, start_after=None, limit=None, fields=None):
+        return await asyncio.to_thread(self._query_sync, collection, order_by, descending, start_after, limit, fields)
+
+    async def stream(self, collection, order_by=None, descending=False, start_after=None, limit=None, fields=None):
+        # Page through with a cursor so no more than STREAM_PAGE documents are held at once
+        remaining = limit
+        while remaining is None or remaining > 0:
+            page_size = self.STREAM_PAGE if remaining is None else min(self.STREAM_PAGE, remaining)
+            docs = await self.query(collection, order_by, descending, start_after, page_size)
+            for doc in docs:
+                yield Document(doc.reference, _project(doc._data, fields))
+            if len(docs) < page_size:
+                return
+            last = docs[-1]
+            start_after = (last._data.get(order_by) if order_by else None, last.id)
+            if remaining is not None:
+                remaining -= len(docs)
+
+    def stream_sync(self, collection):
+        with self._lock:
+            rows = self._conn.execute("SELECT id, data FROM documents WHERE collection = ? ORDER BY id",
+                                      (collection,)).fetchall()
+        return [self._row(collection, doc_id, text) for doc_id, text in rows]
+
+    def count_sync(self, collection):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM documents WHERE collection = ?",
+                                      (collection,)).fetchone()[0]
+
+    # --- Writes ---
+    def commit_sync(self, writes):
+        commit_time = _now()
+        with self._lock:
+            def exists(ref):
+                return self._conn.execute("SELECT 1 FROM documents WHERE collection = ? AND id = ?",
+                                          (ref.collection, ref.id)).fetchone() is not None
+            _check_writes(writes, exists)
+            try:
+                for op, ref, data in writes:
+                    if op == "delete":
+                        self._conn.execute("DELETE FROM documents WHERE collection = ? AND id = ?",
+                                           (ref.collection, ref.id))
+                        continue
+                    data = _resolve(data, commit_time)
+                    if op == "update":
+                        row = self._conn.execute("SELECT data FROM documents WHERE collection = ? AND id = ?",
+                                                 (ref.collection, ref.id)).fetchone()
+                        data = dict(self._loads(row[0]), **data)
+                    rank, value = sort_key(data[self.ORDER_FIELD]) if self.ORDER_FIELD in data else (None, None)
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO documents (collection, id, data, order_rank, order_value)"
+                        " VALUES (?, ?, ?, ?, ?)",
+                        (ref.collection, ref.id, self._dumps(data), rank, value))
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+        return [WriteResult(commit_time) for _ in writes]
+
+    async def commit(self, writes):
+        return await asyncio.to_thread(self.commit_sync, writes)
+
+
+def make_storage(backend="firestore", **options):
+    """
+    Storage backend by name: "firestore" (options: client, async_client),
+    "memory", or "sqlite" (option: path).
+    """
+    if backend == "firestore":
+        return FirestoreStorage(options["client"], options["async_client"])
+    if backend == "memory":
+        return MemoryStorage()
+    if backend == "sqlite":
+        return SQLiteStorage(options.get("path", ":memory:"))
+    raise ValueError(f"Unknown storage backend '{backend}' (expected firestore, memory or sqlite)")
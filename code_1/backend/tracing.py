@@ -0,0 +1,180 @@
+# 1_code/tracing.py
+
+import contextvars
+import logging
+import random
+import re
+import time
+import uuid
+from contextlib import contextmanager
+
+# Per-request tracing of datastore and Firebase Auth calls. TraceMiddleware gives
+# a sampled HTTP request a Trace; while it is served, every call made through a
+# Traced proxy (or inside span()) adds to the trace's count and time for that
+# call name. The trace id and a Server-Timing summary are added to the response
+# headers, and one line per request is logged once the body is sent:
+#   trace=3f2a9c1e04b7d615 POST /requests 201 6.2ms calls=1 storage.set=1/5.1ms
+# Unsampled requests cost one random() call; calls outside a trace (the
+# volunteer store's thread, background matching) are not recorded.
+
+TRACE_HEADER = "X-Trace-Id" # Sent back on traced responses; a request carrying one is always traced
+_TRACE_ID = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+
+_current = contextvars.ContextVar("trace", default=None)
+
+
+class Trace:
+    """Calls made while serving one request: name -> [count, seconds]."""
+
+    def __init__(self, trace_id):
+        self.trace_id = trace_id
+        self.spans = {}
+        self.started = time.perf_counter()
+
+    def record(self, name, seconds):
+        span = self.spans.get(name)
+        if span is None:
+            self.spans[name] = [1, seconds]
+        else:
+            span[0] += 1
+            span[1] += seconds
+
+    @property
+    def calls(self):
+        return sum(count for count, _ in self.spans.values())
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def summary(self):
+        """Compact one-line summary: "calls=N name=count/ms ..."."""
+        spans = " ".join(f"{name}={count}/{seconds * 1000:.1f}ms" for name, (count, seconds) in sorted(self.spans.items()))
+        return f"calls={self.calls} {spans}".rstrip()
+
+    def server_timing(self):
+        """Server-Timing header value: one metric per call name, plus the total so far."""
+        metrics = [f'{name};desc="{count} calls";dur={seconds * 1000:.2f}'
+                   for name, (count, seconds) in sorted(self.spans.items())]
+        metrics.append(f"total;dur={self.elapsed() * 1000:.2f}")
+        return ", ".join(metrics)
+
+
+def current_trace():
+    return _current.get()
+
+@contextmanager
+def span(name):
+    """Record the with-block as one `name` call of the current trace (if any)."""
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.record(name, time.perf_counter() - start)
+
+def untraced(fn, *args, **kwargs):
+    """Call fn outside the current trace, e.g. to create a background task that outlives the request."""
+    def run():
+        _current.set(None)
+        return fn(*args, **kwargs)
+    return contextvars.copy_context().run(run)
+
+
+class Traced:
+    """
+    Proxy that records each call of the listed coroutine `methods` (and the time
+    spent pulling items from the listed async-iterator `streams`) as a span named
+    "<prefix>.<method>". Every other attribute is passed through to the target.
+    """
+
+    def __init__(self, target, prefix, methods=(), streams=()):
+        self._target = target
+        for name in methods:
+            setattr(self, name, _traced_method(getattr(target, name), f"{prefix}.{name}"))
+        for name in streams:
+            setattr(self, name, _traced_stream(getattr(target, name), f"{prefix}.{name}"))
+
+    def __getattr__(self, name):
+        return getattr(self._target, name)
+
+def _traced_method(method, name):
+    async def call(*args, **kwargs):
+        if _current.get() is None:
+            return await method(*args, **kwargs)
+        with span(name):
+            return await method(*args, **kwargs)
+    return call
+
+def _traced_stream(method, name):
+    async def call(*args, **kwargs):
+        iterator = method(*args, **kwargs).__aiter__()
+        trace = _current.get()
+        if trace is None:
+            async for item in iterator:
+                yield item
+            return
+        # Only the time spent waiting on the backend counts, not the consumer's
+        seconds = 0.0
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = await iterator.__anext__()
+                except StopAsyncIteration:
+                    break
+                finally:
+                    seconds += time.perf_counter() - start
+                yield item
+        finally:
+            trace.record(name, seconds)
+    return call
+
+
+class TraceMiddleware:
+    """ASGI middleware tracing a `sample_rate` fraction of HTTP requests (and all that send X-Trace-Id)."""
+
+    def __init__(self, app, sample_rate=1.0, logger=None):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.logger = logger or logging.getLogger("trace")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        trace_id = None
+        for key, value in scope["headers"]:
+            if key == b"x-trace-id":
+                trace_id = value.decode("latin-1")
+                break
+        if trace_id is None or not _TRACE_ID.match(trace_id):
+            if trace_id is None and random.random() >= self.sample_rate:
+                return await self.app(scope, receive, send)
+            trace_id = uuid.uuid4().hex[:16]
+
+        trace = Trace(trace_id)
+        status = [None]
+
+        async def send_traced(message):
+            if message["type"] == "http.response.start":
+                # Calls made while a streamed body is sent are in the log line only
+                status[0] = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((TRACE_HEADER.lower().encode(), trace_id.encode()))
+                headers.append((b"server-timing", trace.server_timing().encode()))
+                message = dict(message, headers=headers)
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                self.log(scope, status[0], trace)
+
+        token = _current.set(trace)
+        try:
+            await self.app(scope, receive, send_traced)
+        finally:
+            _current.reset(token)
+
+    def log(self, scope, status, trace):
+        self.logger.info(f"trace={trace.trace_id} {scope['method']} {scope['path']} {status} "
+                         f"{trace.elapsed() * 1000:.1f}ms {trace.summary()}")
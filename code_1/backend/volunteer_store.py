@@ -0,0 +1,217 @@
+# 1_code/volunteer_store.py
+
+import threading
+import time
+
+from matching_ai import MATCH_PHASE_SECONDS, VolunteerIndex
+
+# Process-wide mirror of the volunteers collection for matching.
+# The store loads the collection once (from the on-disk index snapshot when it is
+# current, else with one full read) and then keeps its VolunteerIndex up to date
+# incrementally: from a Firestore snapshot listener when the collection supports
+# one, otherwise by polling the version marker and diffing the collection when it
+# changes. Match handlers read the index from here instead of streaming every
+# volunteer on every call.
+
+
+class StoreNotReady(Exception):
+    """Raised by VolunteerStore.index() while the initial load has not completed."""
+
+
+class VolunteerStore:
+    """
+    Keeps a VolunteerIndex in sync with a volunteers collection.
+
+    version_fn: returns the collection's version marker; used to validate the
+        snapshot and, in polling mode, to skip the diff while nothing changed.
+    snapshot_path: VolunteerIndex snapshot to warm start from and to save to.
+    poll_interval: seconds between polls when no listener is used.
+    max_staleness: seconds the mirror may lag behind before index() syncs
+        synchronously (a healthy listener is never stale).
+    use_listener: None to use a listener when the collection supports one.
+    retry_delay / max_retry_delay: seconds before retrying a failed initial load,
+        doubling after each failure up to max_retry_delay.
+    """
+
+    def __init__(self, collection_ref, version_fn=None, snapshot_path=None, backend=None, backend_options=None,
+                 poll_interval=30.0, max_staleness=120.0, use_listener=None, retry_delay=1.0, max_retry_delay=60.0):
+        self.collection_ref = collection_ref
+        self.version_fn = version_fn
+        self.snapshot_path = snapshot_path
+        self.backend = backend
+        self.backend_options = backend_options
+        self.poll_interval = poll_interval
+        self.max_staleness = max_staleness
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        if use_listener is None:
+            use_listener = hasattr(collection_ref, "on_snapshot")
+        self.mode = "listener" if use_listener else "poll"
+        self.state = "idle" # idle -> loading -> ready (or failed while the load is retried)
+        self.error = None
+        self.last_synced = None # time.monotonic() of the last successful sync
+        self._index = None
+        self._version = None
+        self._ready = threading.Event()
+        self._stop = threading.Event()
+        self._sync_lock = threading.Lock()
+        self._thread = None
+        self._watch = None
+        self._listener_primed = False
+
+    # --- Lifecycle ---
+    def start(self):
+        """Begin the initial load in the background (no-op if already started)."""
+        with self._sync_lock:
+            if self._thread is not None:
+                return
+            self.state = "loading"
+            self._thread = threading.Thread(target=self._run, name="volunteer-store", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def status(self):
+        """Readiness and freshness summary (for health checks)."""
+        return {
+            "state": self.state,
+            "mode": self.mode,
+            "volunteers": len(self._index) if self._index is not None else 0,
+            "staleness_seconds": None if self.last_synced is None else round(self._staleness(), 3),
+            "error": self.error,
+        }
+
+    # --- Reads ---
+    def index(self, wait=0.0):
+        """
+        Return the current VolunteerIndex.
+        Starts the store if needed and waits up to `wait` seconds for the initial
+        load; raises StoreNotReady if it has not completed by then. If the mirror
+        is older than max_staleness it is synced before returning.
+        """
+        self.start()
+        if not self._ready.wait(wait):
+            raise StoreNotReady(self.error or "Volunteer data is still loading")
+        if self._staleness() > self.max_staleness:
+            try:
+                self.sync()
+            except Exception as e: # Serve the last good state rather than failing the request
+                print(f"Warning: Volunteer store sync failed: {e}")
+        return self._index
+
+    def _staleness(self):
+        if self.mode == "listener" and self._watch is not None and getattr(self._watch, "is_active", True):
+            return 0.0
+        return time.monotonic() - self.last_synced
+
+    # --- Loading and syncing ---
+    def _run(self):
+        # A failed initial load (e.g. a transient Firestore error at boot) is retried
+        # with backoff; until one succeeds index() raises StoreNotReady with the error
+        delay = self.retry_delay
+        while True:
+            try:
+                self._load()
+                break
+            except Exception as e:
+                self.state = "failed"
+                self.error = f"Initial volunteer load failed: {e}"
+                print(f"Error: {self.error}. Retrying in {delay:g}s.")
+            if self._stop.wait(delay):
+                return
+            delay = min(delay * 2, self.max_retry_delay)
+        if self.mode == "listener":
+            try:
+                self._watch = self.collection_ref.on_snapshot(self._on_snapshot)
+                return
+            except Exception as e:
+                print(f"Warning: Volunteer listener unavailable ({e}); polling instead.")
+                self.mode = "poll"
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.sync()
+            except Exception as e:
+                print(f"Warning: Volunteer store sync failed: {e}")
+
+    def _load(self):
+        version = self.version_fn() if self.version_fn else None
+        index = None
+        if self.snapshot_path and version is not None:
+            index = VolunteerIndex.load(self.snapshot_path, source_version=version)
+        if index is None:
+            with MATCH_PHASE_SECONDS.time(phase="fetch"):
+                docs = list(self.collection_ref.stream())
+            index = VolunteerIndex.from_volunteers([d.to_dict() for d in docs], ids=[d.id for d in docs],
+                                                   backend=self.backend, backend_options=self.backend_options)
+            self._save(index, version)
+        with self._sync_lock:
+            self._index, self._version = index, version
+            self.last_synced = time.monotonic()
+        self.state = "ready"
+        self.error = None
+        self._ready.set()
+
+    def sync(self):
+        """Bring the mirror up to date with one diff of the collection (skipped if the version is unchanged)."""
+        with self._sync_lock:
+            started = time.monotonic()
+            version = self.version_fn() if self.version_fn else None
+            if version is not None and version == self._version:
+                self.last_synced = started
+                return 0
+            with MATCH_PHASE_SECONDS.time(phase="fetch"):
+                docs = {d.id: d.to_dict() for d in self.collection_ref.stream()}
+            changed = self._apply_full(docs)
+            self._version = version
+            self.last_synced = started
+            if changed:
+                self._save(self._index, version)
+            return changed
+
+    def _apply_full(self, docs):
+        changed = 0
+        for volunteer_id in set(self._index.ids()) - set(docs):
+            changed += self._index.remove(volunteer_id)
+        for volunteer_id, data in docs.items():
+            if self._index.get(volunteer_id) != data:
+                changed += self._put(volunteer_id, data)
+        return changed
+
+    def _put(self, volunteer_id, data):
+        try:
+            self._index.add(volunteer_id, data)
+        except ValueError as e:
+            print(f"Warning: {e}. Removing it from matching.")
+            self._index.remove(volunteer_id)
+        return 1
+
+    def _on_snapshot(self, docs, changes, read_time):
+        # The first callback carries the whole collection: reconcile the (possibly
+        # snapshot-loaded) index with it. Later callbacks carry only the changes.
+        with self._sync_lock:
+            if not self._listener_primed:
+                self._apply_full({d.id: d.to_dict() for d in docs})
+                self._listener_primed = True
+            else:
+                for change in changes:
+                    if change.type.name == "REMOVED":
+                        self._index.remove(change.document.id)
+                    else:
+                        self._put(change.document.id, change.document.to_dict())
+            self.last_synced = time.monotonic()
+
+    def _save(self, index, version):
+        if not self.snapshot_path or version is None:
+            return
+        try:
+            index.save(self.snapshot_path, source_version=version)
+        except Exception as e:
+            print(f"Warning: Could not save volunteer index snapshot to {self.snapshot_path}: {e}")
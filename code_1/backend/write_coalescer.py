@@ -0,0 +1,96 @@
+# 1_code/write_coalescer.py
+
+import asyncio
+from collections import namedtuple
+
+from firebase_admin import firestore
+
+# Coalesces concurrent writes into batch commits on a Storage (storage.py).
+# Each set()/update() call waits for the commit that carries its write and gets
+# that write's WriteResult (whose update_time is also the value any
+# SERVER_TIMESTAMP in the write resolved to). A batch is committed once it holds
+# max_batch writes or `linger` seconds after its first write, whichever comes
+# first. Batch commits are atomic, so if one fails its writes are retried one by
+# one and every caller gets its own result or error.
+
+MAX_FIRESTORE_BATCH = 500 # Firestore's limit on writes per batch commit
+
+_Write = namedtuple("_Write", ["op", "ref", "data", "future"])
+
+
+def resolve_server_timestamps(data, write_result):
+    """Copy of written data with SERVER_TIMESTAMP sentinels replaced by the commit time."""
+    return {key: write_result.update_time if value is firestore.SERVER_TIMESTAMP else value
+            for key, value in data.items()}
+
+
+class WriteCoalescer:
+    """Batches writes made through it on a Storage (one coalescer per event loop)."""
+
+    def __init__(self, storage, max_batch=MAX_FIRESTORE_BATCH, linger=0.005):
+        self.storage = storage
+        self.max_batch = max(1, min(int(max_batch), MAX_FIRESTORE_BATCH))
+        self.linger = linger
+        self.commits = 0 # Batch commits issued (including one-by-one retries)
+        self.writes = 0
+        self._pending = []
+        self._timer = None
+        self._tasks = set()
+
+    async def set(self, doc_ref, data):
+        return await self._enqueue("set", doc_ref, data)
+
+    async def update(self, doc_ref, data):
+        return await self._enqueue("update", doc_ref, data)
+
+    async def _enqueue(self, op, doc_ref, data):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append(_Write(op, doc_ref, data, future))
+        if len(self._pending) >= self.max_batch:
+            self.flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.linger, self.flush)
+        return await future
+
+    def flush(self):
+        """Commit the pending writes now."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        writes, self._pending = self._pending, []
+        if writes:
+            task = asyncio.get_running_loop().create_task(self._commit(writes))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _commit(self, writes):
+        try:
+            results = await self._commit_batch(writes)
+        except Exception as e:
+            if len(writes) == 1:
+                _settle(writes[0].future, error=e)
+                return
+            # One bad write fails the whole batch: isolate it by retrying each write alone
+            for write in writes:
+                try:
+                    _settle(write.future, (await self._commit_batch([write]))[0])
+                except Exception as write_e:
+                    _settle(write.future, error=write_e)
+            return
+        for write, result in zip(writes, results):
+            _settle(write.future, result)
+
+    async def _commit_batch(self, writes):
+        self.commits += 1
+        self.writes += len(writes)
+        return await self.storage.commit([(write.op, write.ref, write.data) for write in writes])
+
+
+def _settle(future, result=None, error=None):
+    if future.done(): # The caller went away (e.g. the request was cancelled)
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)